@@ -1,208 +1,72 @@
 #!/usr/bin/env python3
-"""Tone Police - Filters hostile/profane language from user prompts."""
+"""Tone Police - Filters hostile/profane language from user prompts.
+
+Hook entry point. When a filter daemon is running (``--serve``) the prompt is
+forwarded to it; otherwise it is filtered in-process by tone_police.pipeline.
+``TONE_POLICE_TRACE`` always filters in-process; see tone_police/tracing.py.
+"""
 
-import json
 import os
-import re
 import sys
-from pathlib import Path
-
-
-def load_config():
-    """Load config, checking project override first, then plugin default."""
-    plugin_root = Path(
-        os.environ.get("CLAUDE_PLUGIN_ROOT", Path(__file__).parent.parent.parent)
-    )
-    project_dir = os.environ.get("CLAUDE_PROJECT_DIR", "")
-
-    # Check for project-level override
-    if project_dir:
-        override = Path(project_dir) / ".claude" / "tone-police.config.json"
-        if override.exists():
-            with open(override) as f:
-                return json.load(f), plugin_root
-
-    # Fall back to default config
-    default = plugin_root / "config" / "default-config.json"
-    if default.exists():
-        with open(default) as f:
-            return json.load(f), plugin_root
-
-    # Hardcoded fallback
-    return {
-        "intensity": "moderate",
-        "languages": ["en"],
-        "enabled": True,
-        "preserve_code_blocks": True,
-        "log_transforms": False,
-    }, plugin_root
-
-
-def load_dictionary(plugin_root, language):
-    """Load a language dictionary file."""
-    dict_path = plugin_root / "dictionaries" / f"{language}.json"
-    if dict_path.exists():
-        with open(dict_path) as f:
-            return json.load(f)
-    return None
-
-
-def load_common_patterns(plugin_root):
-    """Load cross-language common patterns."""
-    path = plugin_root / "dictionaries" / "common-patterns.json"
-    if path.exists():
-        with open(path) as f:
-            return json.load(f)
-    return None
-
-
-def protect_code_blocks(text):
-    """Extract and replace code blocks with placeholders."""
-    blocks = []
-    pattern = re.compile(r"(```[\s\S]*?```|`[^`\n]+`)")
-
-    def replacer(match):
-        blocks.append(match.group(0))
-        return f"__CODE_BLOCK_{len(blocks) - 1}__"
-
-    protected = pattern.sub(replacer, text)
-    return protected, blocks
-
-
-def restore_code_blocks(text, blocks):
-    """Restore code blocks from placeholders."""
-    for i, block in enumerate(blocks):
-        text = text.replace(f"__CODE_BLOCK_{i}__", block)
-    return text
-
-
-def get_intensity_patterns(dictionary, intensity):
-    """Get cumulative patterns for the given intensity level."""
-    patterns_by_category = {}
-    levels = ["light", "moderate", "strict"]
-    target_idx = levels.index(intensity) if intensity in levels else 1
-
-    for level in levels[: target_idx + 1]:
-        level_patterns = dictionary.get("patterns", {}).get(level, {})
-        for category, pattern_list in level_patterns.items():
-            if category not in patterns_by_category:
-                patterns_by_category[category] = []
-            patterns_by_category[category].extend(pattern_list)
-
-    return patterns_by_category
-
-
-def apply_common_patterns(text, common):
-    """Apply cross-language normalization patterns."""
-    if not common:
-        return text
-
-    patterns = common.get("patterns", {})
-
-    # ALL CAPS normalization (4+ chars)
-    caps_config = patterns.get("caps_normalization", {})
-    if caps_config:
-        caps_pattern = caps_config.get("pattern", r"\b([A-Z]{4,})\b")
-        text = re.sub(caps_pattern, lambda m: m.group(0).lower(), text)
-
-    # Excessive punctuation
-    punct_config = patterns.get("excessive_punctuation", {})
-    if punct_config:
-        for p in punct_config.get("patterns", []):
-            text = re.sub(p["pattern"], p["replacement"], text)
-
-    # Repeated characters
-    repeat_config = patterns.get("repeated_characters", {})
-    if repeat_config:
-        text = re.sub(
-            repeat_config.get("pattern", r"(\w)\1{2,}"),
-            repeat_config.get("replacement", r"\1\1"),
-            text,
-        )
-
-    return text
-
-
-def apply_language_patterns(text, patterns_by_category):
-    """Apply language-specific replacement patterns."""
-    for category, pattern_list in patterns_by_category.items():
-        for entry in pattern_list:
-            regex = entry["pattern"]
-            replacement = entry["replacement"]
-            flags = re.IGNORECASE if "i" in entry.get("flags", "i") else 0
-            text = re.sub(regex, replacement, text, flags=flags)
-    return text
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def main():
-    try:
-        input_data = json.loads(sys.stdin.read())
-    except (json.JSONDecodeError, EOFError):
-        sys.exit(0)
+from tone_police import client  # noqa: E402
 
-    user_prompt = input_data.get("prompt", "")
-    if not user_prompt:
-        sys.exit(0)
+
+def __getattr__(name):
+    # The pipeline functions (load_config, apply_language_patterns, ...) used
+    # to live in this file. Resolve them lazily so the daemon fast path never
+    # imports the pipeline at all.
+    from tone_police import pipeline
 
     try:
-        config, plugin_root = load_config()
-    except Exception as e:
-        # Output error as context so we can debug
-        print(
-            json.dumps(
-                {"additionalContext": f"[TONE-POLICE ERROR] Config load failed: {e}"}
-            )
-        )
-        sys.exit(0)
+        return getattr(pipeline, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Command-line modes other than the hook itself: flag -> tone_police module.
+COMMANDS = {
+    "--serve": "daemon",
+    "--build-dictionaries": "artifact",
+    "--build-zipapp": "bundle",
+    "--filter": "stream",
+    "--ndjson": "ndjson",
+    "--bench": "bench",
+    "--redos": "redos",
+    "--result-cache": "resultcache",
+    "--fuzz": "fuzz",
+    "--profile-rules": "ruleprof",
+    "--audit-transcripts": "transcripts",
+    "--metrics": "metrics",
+    "--preview": "preview",
+}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        import importlib
+
+        command = importlib.import_module("tone_police." + COMMANDS[sys.argv[1]])
+        sys.exit(command.main(sys.argv[2:]))
 
-    if not config.get("enabled", True):
+    raw = sys.stdin.read()
+    if not raw.strip():
         sys.exit(0)
+    if os.environ.get("TONE_POLICE_TRACE"):
+        # In-process, so the trace shows the imports a cold hook pays for.
+        from tone_police import tracing
 
-    intensity = config.get("intensity", "moderate")
-    languages = config.get("languages", ["en"])
-    preserve_code = config.get("preserve_code_blocks", True)
-
-    text = user_prompt
-
-    # Protect code blocks
-    blocks = []
-    if preserve_code:
-        text, blocks = protect_code_blocks(text)
-
-    # Apply common patterns
-    common = load_common_patterns(plugin_root)
-    text = apply_common_patterns(text, common)
-
-    # Apply language-specific patterns
-    for lang in languages:
-        dictionary = load_dictionary(plugin_root, lang)
-        if dictionary:
-            patterns = get_intensity_patterns(dictionary, intensity)
-            text = apply_language_patterns(text, patterns)
-
-    # Restore code blocks
-    if preserve_code and blocks:
-        text = restore_code_blocks(text, blocks)
-
-    # Output only if text was modified
-    if text != user_prompt:
-        mode = config.get("mode", "rewrite")
-        if mode == "block":
-            result = {
-                "decision": "block",
-                "reason": (
-                    "Your message was blocked by tone-police. "
-                    f'Suggested rephrasing: "{text}"'
-                ),
-            }
-            print(json.dumps(result))
-        else:
-            # Plain text stdout is injected as additional context
-            print(
-                f"[TONE-POLICE] The user's original message contained hostile/profane language. "
-                f"Rewritten for tone (original intent preserved): {text}"
-            )
+        reply = tracing.run_hook(raw, tracing.from_environ(os.environ))
+        sys.stdout.write(reply)
+        sys.exit(0)
+    reply = client.request(raw)
+    if reply is None:
+        from tone_police import pipeline
 
+        reply = pipeline.handle(raw)
+    sys.stdout.write(reply)
     sys.exit(0)
 
 
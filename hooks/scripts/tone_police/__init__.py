@@ -0,0 +1,19 @@
+"""Tone Police - Filters hostile/profane language from user prompts.
+
+The hook entry point imports this package on every prompt, so it is kept
+import-light on purpose: submodules are only loaded by the code paths that
+actually need them.
+"""
+
+__version__ = "1.0.0"
+
+# Public embedding API, loaded on first use.
+_SERVICE = ("FilterResult", "Registry", "ScanResult", "ToneFilter")
+
+
+def __getattr__(name):
+    if name in _SERVICE:
+        from . import service
+
+        return getattr(service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,956 @@
+"""Static analysis of dictionary regexes.
+
+Most dictionary rules are "linear": a sequence of single-character atoms
+(literals, classes, ``\\w``) each repeated between min and max times, with
+``\\b``/``\\B`` assertions between them. Those are turned into small NFAs over
+a finite representative alphabet, which is enough to decide questions like
+"can a match of A ever share a character with a match of B?" exactly.
+Anything else (backreferences, alternation, lookarounds, ...) is *opaque*
+and every question about it gets the conservative answer.
+
+This module is only imported when a rule set is built from source; the
+results are stored in the dictionary artifact.
+"""
+
+import re
+
+try:
+    from re import _constants as sre_c
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants as sre_c
+    import sre_parse
+
+from .folding import fold
+
+# Atoms repeated more than this many times are treated as opaque rather than
+# unrolled into NFA states.
+MAX_UNROLL = 64
+
+_preimage = None
+
+
+def fold_preimage(key):
+    """Every (BMP) character that folds to ``key``."""
+    global _preimage
+    if _preimage is None:
+        _preimage = {}
+        for cp in range(0x10000):
+            if 0xD800 <= cp <= 0xDFFF:
+                continue
+            ch = chr(cp)
+            _preimage.setdefault(fold(ch), []).append(ch)
+    return _preimage.get(key, [key])
+
+
+def is_word(ch):
+    return ch.isalnum() or ch == "_"
+
+
+_CATEGORIES = {
+    sre_c.CATEGORY_WORD: is_word,
+    sre_c.CATEGORY_NOT_WORD: lambda ch: not is_word(ch),
+    sre_c.CATEGORY_DIGIT: str.isdecimal,
+    sre_c.CATEGORY_NOT_DIGIT: lambda ch: not ch.isdecimal(),
+    sre_c.CATEGORY_SPACE: str.isspace,
+    sre_c.CATEGORY_NOT_SPACE: lambda ch: not ch.isspace(),
+}
+
+# Characters that stand in for "anything not mentioned by a pattern", by
+# category. One unclaimed candidate per category joins the alphabet.
+_FILLERS = (
+    "жѫꙮqxz",  # word, not a digit
+    "7٣",  # decimal digit
+    " \t\x0b\x0c　",  # whitespace, not newline
+    "\n",
+    "#§\x00~",  # neither word nor space
+)
+
+
+class CharSet:
+    """What one regex character item (literal, class, ``\\w``, ``.``) accepts."""
+
+    __slots__ = ("keys", "ranges", "categories", "negate", "ignorecase", "any")
+
+    def __init__(
+        self,
+        keys=(),
+        ranges=(),
+        categories=(),
+        negate=False,
+        ignorecase=False,
+        any=False,
+    ):
+        self.keys = frozenset(keys)
+        self.ranges = tuple(ranges)
+        self.categories = tuple(categories)
+        self.negate = negate
+        self.ignorecase = ignorecase
+        self.any = any
+
+    def matches(self, ch):
+        if self.any:
+            return ch != "\n"
+        key = fold(ch) if self.ignorecase else ch
+        hit = key in self.keys
+        if not hit:
+            cp = ord(ch)
+            hit = any(lo <= cp <= hi for lo, hi in self.ranges)
+        if not hit:
+            hit = any(test(ch) for test in self.categories)
+        return hit != self.negate
+
+    def samples(self):
+        """Characters this set singles out, for building an alphabet."""
+        out = set()
+        for key in self.keys:
+            if self.ignorecase:
+                out.update(fold_preimage(key))
+            else:
+                out.add(key)
+        for lo, hi in self.ranges:
+            out.update(chr(cp) for cp in range(lo, hi + 1))
+        return out
+
+    def literal_chars(self):
+        """The exact characters accepted, or None if that set is open-ended."""
+        if self.negate or self.any or self.categories or self.ranges:
+            return None
+        return self.samples()
+
+
+def _charset(op, av, ignorecase):
+    if op is sre_c.LITERAL:
+        ch = chr(av)
+        return CharSet(keys=[fold(ch) if ignorecase else ch], ignorecase=ignorecase)
+    if op is sre_c.NOT_LITERAL:
+        ch = chr(av)
+        return CharSet(
+            keys=[fold(ch) if ignorecase else ch], negate=True, ignorecase=ignorecase
+        )
+    if op is sre_c.ANY:
+        return CharSet(any=True)
+    if op is sre_c.IN:
+        keys, ranges, categories, negate = [], [], [], False
+        for item_op, item_av in av:
+            if item_op is sre_c.NEGATE:
+                negate = True
+            elif item_op is sre_c.LITERAL:
+                ch = chr(item_av)
+                keys.append(fold(ch) if ignorecase else ch)
+            elif item_op is sre_c.RANGE:
+                lo, hi = item_av
+                if ignorecase:
+                    if hi - lo > 512:
+                        return None
+                    keys.extend(fold(chr(cp)) for cp in range(lo, hi + 1))
+                else:
+                    ranges.append((lo, hi))
+            elif item_op is sre_c.CATEGORY and item_av in _CATEGORIES:
+                categories.append(_CATEGORIES[item_av])
+            else:
+                return None
+        return CharSet(keys, ranges, categories, negate, ignorecase)
+    return None
+
+
+class Atom:
+    __slots__ = ("chars", "min", "max")
+
+    def __init__(self, chars, min, max):
+        self.chars = chars
+        self.min = min
+        self.max = max  # None means unbounded
+
+
+BOUNDARY = "b"
+NOT_BOUNDARY = "B"
+
+
+def linear_form(pattern, flags=0):
+    """Parse a pattern into a list of Atoms and assertion markers.
+
+    Returns None when the pattern is not linear (see module docstring) or
+    uses inline flags that would not survive being embedded in another regex.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    unicode = sre_c.SRE_FLAG_UNICODE
+    if parsed.state.flags & ~unicode != flags & ~unicode:
+        return None
+    if parsed.state.groupdict:
+        return None  # names could clash once embedded in a merged layer
+    ignorecase = bool(flags & re.IGNORECASE)
+    items = []
+
+    def walk(seq):
+        for op, av in seq:
+            if op is sre_c.AT:
+                if av is sre_c.AT_BOUNDARY:
+                    items.append(BOUNDARY)
+                elif av is sre_c.AT_NON_BOUNDARY:
+                    items.append(NOT_BOUNDARY)
+                else:
+                    return False
+            elif op is sre_c.SUBPATTERN:
+                _, add_flags, del_flags, sub = av
+                if add_flags or del_flags or not walk(sub):
+                    return False
+            elif op in (sre_c.MAX_REPEAT, sre_c.MIN_REPEAT):
+                lo, hi, sub = av
+                if len(sub) != 1:
+                    return False
+                chars = _charset(sub[0][0], sub[0][1], ignorecase)
+                if chars is None or lo > MAX_UNROLL:
+                    return False
+                if hi is sre_c.MAXREPEAT:
+                    hi = None
+                elif hi > MAX_UNROLL:
+                    return False
+                items.append(Atom(chars, lo, hi))
+            else:
+                chars = _charset(op, av, ignorecase)
+                if chars is None:
+                    return False
+                items.append(Atom(chars, 1, 1))
+        return True
+
+    if not walk(list(parsed)):
+        return None
+    if not any(isinstance(item, Atom) and item.min > 0 for item in items):
+        return None  # could match the empty string
+    return items
+
+
+def literal_form(text):
+    """Linear form that matches exactly ``text``, case-sensitively."""
+    return [Atom(CharSet(keys=[ch]), 1, 1) for ch in text]
+
+
+# Upper bound on the alternatives one anchor may have (e.g. [!?]{3,} needs 8).
+MAX_ANCHOR_ALTERNATIVES = 32
+
+
+def required_literals(items):
+    """Folded strings at least one of which occurs in every match.
+
+    Runs of consecutive non-optional atoms over small literal character
+    sets spell out strings every match must contain; ``f+u+c+k+`` gives
+    "fu", "uc" and "ck", ``\\bshut up\\b`` gives "shut up". The most
+    selective run (longest shortest alternative, then fewest alternatives)
+    wins.
+
+    Returns:
+        A sorted tuple of alternatives, or None when no run exists.
+    """
+    best = None
+    best_score = None
+
+    def consider(run):
+        nonlocal best, best_score
+        if run == {""}:
+            return
+        score = (min(len(s) for s in run), -len(run))
+        if best_score is None or score > best_score:
+            best, best_score = run, score
+
+    run = {""}
+    for item in items:
+        if isinstance(item, str):
+            continue  # assertions consume nothing
+        chars = item.chars.literal_chars() if item.min else None
+        strings = None
+        if chars is not None:
+            folded = {fold(ch) for ch in chars}
+            strings = {""}
+            for _ in range(item.min):
+                strings = {s + ch for s in strings for ch in folded}
+                if len(strings) > MAX_ANCHOR_ALTERNATIVES:
+                    strings = None
+                    break
+        if strings is None:
+            consider(run)
+            run = {""}
+            continue
+        joined = {r + s for r in run for s in strings}
+        if len(joined) > MAX_ANCHOR_ALTERNATIVES:
+            consider(run)
+            joined = strings
+        run = joined
+        if item.max != item.min:
+            # Only the last ``min`` copies are known to touch what follows.
+            consider(run)
+            run = strings
+    consider(run)
+    return tuple(sorted(best)) if best else None
+
+
+def rule_anchors(rule):
+    """required_literals() for a Rule, or None when it has to run always."""
+    items = linear_form(rule.pattern, rule.flags)
+    if items is None:
+        return None
+    return required_literals(items)
+
+
+def line_local(pattern, flags=0):
+    """Whether every match of ``pattern`` lies within one line.
+
+    True when the pattern can neither match the empty string nor consume,
+    look at, or anchor to anything that needs a newline or the start or end
+    of the whole string. Such a rule gives the same result on text cut just
+    after a newline as on the whole text; see stream.py.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return False
+    if parsed.getwidth()[0] == 0:
+        return False
+    # No character folds to a newline, so case-insensitivity never matters.
+    ignorecase = bool(flags & re.IGNORECASE)
+    line_anchors = [sre_c.AT_BOUNDARY, sre_c.AT_NON_BOUNDARY]
+    if parsed.state.flags & re.MULTILINE:
+        line_anchors += [sre_c.AT_BEGINNING, sre_c.AT_END]
+
+    def walk(seq, dotall):
+        for op, av in seq:
+            if op is sre_c.AT:
+                if av not in line_anchors:
+                    return False
+            elif op is sre_c.ANY:
+                if dotall:
+                    return False
+            elif op in (sre_c.LITERAL, sre_c.NOT_LITERAL, sre_c.IN):
+                chars = _charset(op, av, ignorecase)
+                if chars is None or chars.matches("\n"):
+                    return False
+            elif op is sre_c.SUBPATTERN:
+                _, add_flags, del_flags, sub = av
+                scoped = (dotall or add_flags & re.DOTALL) and not del_flags & re.DOTALL
+                if not walk(sub, scoped):
+                    return False
+            elif op in (sre_c.MAX_REPEAT, sre_c.MIN_REPEAT):
+                if not walk(av[2], dotall):
+                    return False
+            elif op is sre_c.BRANCH:
+                if not all(walk(sub, dotall) for sub in av[1]):
+                    return False
+            elif op in (sre_c.ASSERT, sre_c.ASSERT_NOT):
+                if not walk(av[1], dotall):
+                    return False
+            elif op is sre_c.GROUPREF_EXISTS:
+                _, yes, no = av
+                if not walk(yes, dotall) or (no is not None and not walk(no, dotall)):
+                    return False
+            elif op is not sre_c.GROUPREF:
+                return False  # backreferences repeat text that passed the walk
+        return True
+
+    return walk(list(parsed), bool(parsed.state.flags & re.DOTALL))
+
+
+# ---------------------------------------------------------------------------
+# NFA
+# ---------------------------------------------------------------------------
+
+_CHAR, _SPLIT, _ASSERT, _ACCEPT = range(4)
+
+
+class NFA:
+    """Thompson NFA for a linear form.
+
+    ``nodes[i]`` is one of (CHAR, charset, next), (SPLIT, a, b),
+    (ASSERT, kind, next) or (ACCEPT,); ``start`` is the entry node.
+    """
+
+    def __init__(self, items):
+        self.nodes = []
+        self.start = self._build(items)
+
+    def _add(self, node):
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _build(self, items):
+        # Built back to front so every node already knows its successor.
+        nxt = self._add((_ACCEPT,))
+        for item in reversed(items):
+            if isinstance(item, str):
+                nxt = self._add((_ASSERT, item, nxt))
+                continue
+            if item.max is None:
+                loop = self._add(None)
+                char = self._add((_CHAR, item.chars, loop))
+                self.nodes[loop] = (_SPLIT, char, nxt)
+                nxt = char if item.min else loop
+                required = max(item.min - 1, 0)
+            else:
+                for _ in range(item.max - item.min):
+                    char = self._add((_CHAR, item.chars, nxt))
+                    nxt = self._add((_SPLIT, char, nxt))
+                required = item.min
+            for _ in range(required):
+                nxt = self._add((_CHAR, item.chars, nxt))
+        return nxt
+
+
+def _closure(nodes, states, prev_word, next_word):
+    """Expand splits and assertions; ``next_word`` None means end of text."""
+    seen = set()
+    stack = list(states)
+    while stack:
+        i = stack.pop()
+        if i in seen:
+            continue
+        seen.add(i)
+        node = nodes[i]
+        kind = node[0]
+        if kind == _SPLIT:
+            stack.append(node[1])
+            stack.append(node[2])
+        elif kind == _ASSERT:
+            at_boundary = prev_word != bool(next_word)
+            if at_boundary == (node[1] == BOUNDARY):
+                stack.append(node[2])
+    return seen
+
+
+def matches_inside(nfa, text, lo, hi):
+    """Whether the NFA has a match lying entirely within ``text[lo:hi]``.
+
+    Characters outside the span still count for ``\\b``.
+    """
+    nodes = nfa.nodes
+    for start in range(lo, hi):
+        states = {nfa.start}
+        for pos in range(start, hi + 1):
+            prev_word = pos > 0 and is_word(text[pos - 1])
+            next_word = is_word(text[pos]) if pos < len(text) else None
+            closed = _closure(nodes, states, prev_word, next_word)
+            if any(nodes[i][0] == _ACCEPT for i in closed):
+                return True
+            if pos == hi:
+                break
+            ch = text[pos]
+            states = {
+                nodes[i][2]
+                for i in closed
+                if nodes[i][0] == _CHAR and nodes[i][1].matches(ch)
+            }
+            if not states:
+                break
+    return False
+
+
+class Alphabet:
+    """Finite stand-in alphabet: every character a pattern singles out, plus
+    one filler per character category nothing singles out."""
+
+    def __init__(self, forms, extra_text=""):
+        chars = set(extra_text)
+        for items in forms:
+            for item in items:
+                if isinstance(item, Atom):
+                    chars.update(item.chars.samples())
+        for candidates in _FILLERS:
+            for ch in candidates:
+                if ch not in chars:
+                    chars.add(ch)
+                    break
+        self.chars = sorted(chars)
+        self.word_mask = 0
+        for i, ch in enumerate(self.chars):
+            if is_word(ch):
+                self.word_mask |= 1 << i
+        self.all_mask = (1 << len(self.chars)) - 1
+        self._masks = {}
+
+    def mask(self, charset):
+        """Bitmask of alphabet characters accepted by ``charset``."""
+        key = id(charset)
+        cached = self._masks.get(key)
+        if cached is None:
+            cached = 0
+            for i, ch in enumerate(self.chars):
+                if charset.matches(ch):
+                    cached |= 1 << i
+            self._masks[key] = (charset, cached)
+            return cached
+        return cached[1]
+
+
+def _fixed_chars(items):
+    """Folded characters of a form matching one fixed string, else None."""
+    chars = []
+    for item in items:
+        if isinstance(item, str):
+            continue
+        if item.min != item.max or item.chars.literal_chars() is None:
+            return None
+        if len(item.chars.keys) != 1:
+            return None
+        (key,) = item.chars.keys
+        if not item.chars.ignorecase:
+            key = fold(key)
+        chars.extend(key * item.min)
+    return chars
+
+
+def _alignments(x, y):
+    """Whether fixed strings ``x`` and ``y`` can overlap in any alignment."""
+    for shift in range(1 - len(y), len(x)):
+        lo, hi = max(0, shift), min(len(x), shift + len(y))
+        if all(x[k] == y[k - shift] for k in range(lo, hi)):
+            return True
+    return False
+
+
+_PRE, _DONE = "pre", "done"
+
+
+class Automaton:
+    """An NFA bound to an alphabet, with masks instead of charsets."""
+
+    def __init__(self, items, alphabet):
+        nfa = NFA(items)
+        self.nodes = []
+        for node in nfa.nodes:
+            if node[0] == _CHAR:
+                node = (_CHAR, alphabet.mask(node[1]), node[2])
+            self.nodes.append(node)
+        self.nfa = nfa
+        self.fixed = _fixed_chars(items)
+        self.start = nfa.start
+        self.alphabet = alphabet
+        self.initial = frozenset([nfa.start])
+        self._moves = {}
+        self._options = {}
+
+    def closure(self, states, prev_word, next_word):
+        return _closure(self.nodes, states, prev_word, next_word)
+
+    def char_mask(self, closed):
+        mask = 0
+        for i in closed:
+            node = self.nodes[i]
+            if node[0] == _CHAR:
+                mask |= node[1]
+        return mask
+
+    def accepts(self, closed):
+        return any(self.nodes[i][0] == _ACCEPT for i in closed)
+
+    def step(self, closed, bit):
+        return frozenset(
+            self.nodes[i][2]
+            for i in closed
+            if self.nodes[i][0] == _CHAR and self.nodes[i][1] & bit
+        )
+
+    def move(self, state, prev_word, bit):
+        """(accepts before ``bit``, states after consuming ``bit``), memoized.
+
+        ``state`` is a frozenset of node ids; ``bit`` 0 means end of text.
+        """
+        key = (state, prev_word, bit)
+        hit = self._moves.get(key)
+        if hit is None:
+            next_word = bool(bit & self.alphabet.word_mask) if bit else None
+            closed = self.closure(state, prev_word, next_word)
+            hit = (self.accepts(closed), self.step(closed, bit) if bit else None)
+            self._moves[key] = hit
+        return hit
+
+    def options(self, state, prev_word, bit):
+        """Every (next state, consumed) for ``state`` meeting symbol ``bit``.
+
+        ``state`` is _PRE (match not started yet), _DONE (match over) or a
+        frozenset of node ids; ``bit`` 0 means end of text.
+        """
+        key = (state, prev_word, bit)
+        hit = self._options.get(key)
+        if hit is None:
+            hit = []
+            if state is _DONE:
+                hit.append((_DONE, False))
+            else:
+                if state is _PRE:
+                    hit.append((_PRE, False))
+                    state = self.initial
+                accepts, nxt = self.move(state, prev_word, bit)
+                if accepts:
+                    hit.append((_DONE, False))
+                if nxt:
+                    hit.append((nxt, True))
+            hit = self._options[key] = tuple(hit)
+        return hit
+
+    def first_mask(self):
+        """Characters a match can start with (assertions ignored)."""
+        closed = set()
+        for prev in (False, True):
+            for nxt in (False, True):
+                closed |= self.closure([self.start], prev, nxt)
+        return self.char_mask(closed)
+
+    def last_mask(self):
+        """Characters a match can end with (assertions ignored)."""
+        mask = 0
+        for i, node in enumerate(self.nodes):
+            if node[0] != _CHAR:
+                continue
+            for prev in (False, True):
+                for nxt in (False, True, None):
+                    if self.accepts(self.closure([node[2]], prev, nxt)):
+                        mask |= node[1]
+        return mask
+
+
+def _blocks(alphabet, automata):
+    """Partition the alphabet into classes no automaton can tell apart."""
+    blocks = [alphabet.all_mask]
+    masks = {alphabet.word_mask}
+    for automaton in automata:
+        for node in automaton.nodes:
+            if node[0] == _CHAR:
+                masks.add(node[1])
+    for mask in masks:
+        refined = []
+        for block in blocks:
+            inside, outside = block & mask, block & ~mask
+            if inside:
+                refined.append(inside)
+            if outside:
+                refined.append(outside)
+        blocks = refined
+    return [block & -block for block in blocks]
+
+
+def can_overlap(a, b):
+    """Whether some text has a match of ``a`` and a match of ``b`` that share
+    at least one character. Both are Automatons over the same alphabet."""
+    if not a.char_mask(range(len(a.nodes))) & b.char_mask(range(len(b.nodes))):
+        return False
+    if a.fixed is not None and b.fixed is not None:
+        if not _alignments(a.fixed, b.fixed):
+            return False
+    alphabet = a.alphabet
+    symbols = _blocks(alphabet, (a, b)) + [0]
+    word = alphabet.word_mask
+
+    start = [(_PRE, _PRE, prev, False) for prev in (False, True)]
+    seen = set(start)
+    queue = list(start)
+    while queue:
+        sa, sb, prev_word, overlapped = queue.pop()
+        for bit in symbols:
+            options_a = a.options(sa, prev_word, bit)
+            options_b = b.options(sb, prev_word, bit)
+            next_word = bool(bit & word)
+            for na, used_a in options_a:
+                for nb, used_b in options_b:
+                    shared = overlapped or (used_a and used_b)
+                    if na is _DONE and nb is _DONE:
+                        if shared:
+                            return True
+                        continue
+                    if not bit:
+                        continue
+                    # Once one side has finished without sharing a character
+                    # the other can no longer overlap it.
+                    if not shared and (na is _DONE or nb is _DONE):
+                        continue
+                    if na is _PRE and nb is _PRE:
+                        continue
+                    state = (na, nb, next_word, shared)
+                    if state not in seen:
+                        seen.add(state)
+                        queue.append(state)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Rule-level questions
+# ---------------------------------------------------------------------------
+
+
+class RuleInfo:
+    """Analysis results for one rule."""
+
+    __slots__ = ("rule", "items", "replacement", "automaton", "first", "last")
+
+    def __init__(self, rule, items):
+        self.rule = rule
+        self.items = items
+        self.replacement = None
+        self.automaton = None
+        self.first = 0
+        self.last = 0
+
+    @property
+    def mergeable(self):
+        """Linear pattern with a plain-text replacement."""
+        return self.items is not None and self.replacement is not None
+
+
+def analyze(rules):
+    """Analyze rules (in execution order) over one shared alphabet.
+
+    Returns:
+        One RuleInfo per rule; equal rules share a RuleInfo.
+    """
+    from .rules import ACTION_SUB
+
+    infos = {}
+    for rule in rules:
+        if id(rule) not in infos:
+            items = linear_form(rule.pattern, rule.flags)
+            infos[id(rule)] = RuleInfo(rule, items)
+            repl = rule.replacement
+            if items is not None and rule.action == ACTION_SUB and "\\" not in repl:
+                infos[id(rule)].replacement = repl
+
+    mergeable = [info for info in infos.values() if info.mergeable]
+    forms = [info.items for info in mergeable]
+    forms += [literal_form(info.replacement) for info in mergeable]
+    alphabet = Alphabet(forms)
+    for info in mergeable:
+        info.automaton = Automaton(info.items, alphabet)
+        info.first = info.automaton.first_mask()
+        info.last = info.automaton.last_mask()
+    return [infos[id(rule)] for rule in rules], alphabet
+
+
+class _Checker:
+    """Memoized pairwise questions for one analyze() run."""
+
+    def __init__(self, alphabet):
+        self.alphabet = alphabet
+        self._overlap = {}
+        self._literal = {}
+
+    def literal(self, text):
+        auto = self._literal.get(text)
+        if auto is None:
+            auto = self._literal[text] = Automaton(literal_form(text), self.alphabet)
+        return auto
+
+    def overlap(self, a, b):
+        key = (id(a), id(b))
+        hit = self._overlap.get(key)
+        if hit is None:
+            hit = self._overlap[key] = can_overlap(a, b)
+        return hit
+
+    def keeps_edges(self, info):
+        """Rewriting a match of ``info`` never changes whether the characters
+        around it see a word boundary."""
+        repl = info.replacement
+        if not repl:
+            return False
+        word = self.alphabet.word_mask
+        for mask, ch in ((info.first, repl[0]), (info.last, repl[-1])):
+            if is_word(ch):
+                if mask & ~word:
+                    return False
+            elif mask & word:
+                return False
+        return True
+
+    def can_follow_in_layer(self, earlier, later):
+        """Whether ``later`` may share a single scan with ``earlier``.
+
+        Sequentially ``later`` runs on ``earlier``'s output; in a merged scan
+        both see the original text. The two agree when their matches can
+        never overlap, ``later`` can never match across ``earlier``'s
+        replacement text, and that replacement keeps the word/non-word
+        character class at both edges.
+        """
+        return (
+            self.keeps_edges(earlier)
+            and not self.overlap(earlier.automaton, later.automaton)
+            and not self.overlap(later.automaton, self.literal(earlier.replacement))
+        )
+
+
+def fixed_text(items):
+    """The single (folded) string a linear form matches, with its edges.
+
+    Returns:
+        (text, lead, trail) where lead/trail are the assertion markers right
+        before the first and after the last character (or None), or None
+        when the form can match more than one string (up to case).
+    """
+    chars = []
+    lead = trail = None
+    for item in items:
+        if isinstance(item, str):
+            if chars:
+                trail = item
+            else:
+                lead = item
+            continue
+        keys = item.chars.literal_chars()
+        if item.min != item.max or keys is None:
+            return None
+        if len({fold(ch) for ch in keys} if item.chars.ignorecase else keys) != 1:
+            return None
+        chars.append(next(iter(item.chars.keys)) * item.min)
+        trail = None
+    return "".join(chars), lead, trail
+
+
+def _edge_contexts(marker, ch):
+    """Stand-in neighbours for a span edge next to ``ch``."""
+    word, other = ("x", " ") if is_word(ch) else (" ", "x")
+    if marker == BOUNDARY:
+        return [other]
+    if marker == NOT_BOUNDARY:
+        return [word]
+    return [word, other]
+
+
+def always_contains(outer, inner):
+    """Whether every match of ``outer`` contains a match of ``inner``.
+
+    Only decided for ``outer`` forms that match one fixed string; anything
+    else answers False.
+    """
+    fixed = fixed_text(outer.items)
+    if fixed is None or not fixed[0]:
+        return False
+    if outer.rule.flags & re.IGNORECASE and not inner.rule.flags & re.IGNORECASE:
+        return False
+    text, lead, trail = fixed
+    nfa = inner.automaton.nfa
+    for before in _edge_contexts(lead, text[0]):
+        for after in _edge_contexts(trail, text[-1]):
+            padded = before + text + after
+            if not matches_inside(nfa, padded, 1, 1 + len(text)):
+                return False
+    return True
+
+
+DUPLICATE = "duplicate"
+SHADOWED = "shadowed"
+
+
+def find_redundant(rules):
+    """Executions in a rule sequence that can never change the text.
+
+    A later run of a rule is a *duplicate* when nothing in between (nor the
+    rule's own replacement) can create a new match for it. A rule is
+    *shadowed* when it only matches fixed text that always contains a match
+    of an earlier rule, so the earlier rule has already rewritten it, and
+    nothing in between can bring such text back.
+
+    Args:
+        rules: Rules in execution order (repeats allowed).
+
+    Returns:
+        Dict of position -> (DUPLICATE or SHADOWED, earlier position).
+    """
+    infos, alphabet = analyze(rules)
+    checker = _Checker(alphabet)
+    found = {}
+    for j, later in enumerate(infos):
+        if not later.mergeable:
+            continue
+        for i in range(j - 1, -1, -1):
+            if i in found:
+                continue  # never runs
+            earlier = infos[i]
+            # Anything that runs before ``later`` must not be able to
+            # produce a fresh match for it.
+            if (
+                not earlier.mergeable
+                or not checker.keeps_edges(earlier)
+                or checker.overlap(
+                    later.automaton, checker.literal(earlier.replacement)
+                )
+            ):
+                break
+            if earlier.rule.key == later.rule.key:
+                found[j] = (DUPLICATE, i)
+                break
+            if always_contains(later, earlier) and not checker.overlap(
+                earlier.automaton, checker.literal(earlier.replacement)
+            ):
+                found[j] = (SHADOWED, i)
+                break
+    return found
+
+
+def plan_layers(rules):
+    """Group an execution sequence into layers that can each run as one scan.
+
+    Args:
+        rules: Rules in execution order (repeats allowed).
+
+    Returns:
+        A list of layers; each layer is a list of positions into ``rules``.
+        Applying the layers in order, each as a single leftmost scan over
+        the alternation of its rules, gives exactly the same text as
+        applying every rule's ``re.sub`` in sequence.
+    """
+    infos, alphabet = analyze(rules)
+    checker = _Checker(alphabet)
+    layers = []
+    current = []
+    for pos, info in enumerate(infos):
+        if not info.mergeable:
+            if current:
+                layers.append(current)
+                current = []
+            layers.append([pos])
+            continue
+        if current and all(
+            checker.can_follow_in_layer(infos[p], info) for p in current
+        ):
+            current.append(pos)
+        else:
+            if current:
+                layers.append(current)
+            current = [pos]
+    if current:
+        layers.append(current)
+    return layers, infos, alphabet
+
+
+def layer_source(infos, alphabet):
+    """Regex source for one merged layer; alternative k is group ``r{k}``.
+
+    A shared ``\\b`` and a lookahead on the possible first characters are
+    hoisted in front of the alternation so most positions are rejected
+    before any alternative is tried.
+    """
+    guard = ""
+    if all(info.items and info.items[0] == BOUNDARY for info in infos):
+        guard = r"\b"
+    first_chars = set()
+    for info in infos:
+        atoms = [item for item in info.items if isinstance(item, Atom)]
+        literal = atoms[0].chars.literal_chars() if atoms[0].min else None
+        if literal is None:
+            first_chars = None
+            break
+        first_chars |= literal
+    if first_chars:
+        cls = "".join(_class_escape(ch) for ch in sorted(first_chars))
+        guard += f"(?=[{cls}])"
+    alternatives = []
+    for k, info in enumerate(infos):
+        scoped = "(?i:" if info.rule.flags & re.IGNORECASE else "(?-i:"
+        alternatives.append(f"(?P<r{k}>{scoped}{info.rule.pattern}))")
+    return guard + "(?:" + "|".join(alternatives) + ")"
+
+
+def _class_escape(ch):
+    if ch in "\\]^-[":
+        return "\\" + ch
+    if ch.isprintable() and not ch.isspace():
+        return ch
+    return f"\\u{ord(ch):04x}" if ord(ch) <= 0xFFFF else f"\\U{ord(ch):08x}"
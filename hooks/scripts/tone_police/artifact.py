@@ -0,0 +1,388 @@
+"""Precompiled dictionary artifacts.
+
+Building a RuleSet means parsing common-patterns.json plus every configured
+language dictionary and flattening the cumulative intensity levels. The
+result depends only on those files and on (languages, intensity), so it is
+written once to a compact binary file per combination and mapped back in
+with mmap on later runs.
+
+Layout (little-endian)::
+
+    header    magic "TPDA", u16 version, u16 flags, 32-byte source digest,
+              u32 string count, u32 rule count, u32 pass count,
+              u32 layer count
+    strings   u32 (offset, length) per string, then the UTF-8 blob
+    rules     RULE records; text fields (anchors NUL-joined) are string-table
+              indices
+    passes    per pass: u32 name, u32 count, then count u32 rule indices
+    layers    per layer: u32 merged source (or NO_STRING), u32 count, then
+              count u32 rule indices
+
+The only flag is FLAG_LINE_LOCAL, RuleSet.line_local saved with the rules:
+the analysis behind it costs more than loading the whole artifact.
+
+String 0 is the source stat signature. When it matches the files on disk the
+artifact is used without reading the sources at all; otherwise the source
+bytes are hashed and compared with the digest, so a touched-but-unchanged
+dictionary does not force a rebuild.
+"""
+
+import mmap
+import os
+import struct
+
+from . import rules as rules_mod
+from .paths import cache_dir, source_files, stat_signature
+
+MAGIC = b"TPDA"
+VERSION = 4
+
+HEADER = struct.Struct("<4sHH32sIIII")
+SPAN = struct.Struct("<II")
+RULE = struct.Struct("<IIIIIIIBBH")
+U32 = struct.Struct("<I")
+
+NO_STRING = 0xFFFFFFFF
+NO_LEVEL = 0xFF
+
+FLAG_LINE_LOCAL = 1
+
+# (plugin_root, languages, intensity) -> (stat signature, RuleSet), so a
+# long-lived process keeps its compiled regexes between prompts.
+_loaded = {}
+
+
+def source_digest(paths, languages, intensity):
+    """Content hash of the sources and the config values that shape the rules."""
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=32)
+    h.update(f"v{VERSION}\0{intensity}\0{','.join(languages)}\0".encode())
+    for path in paths:
+        h.update(os.path.basename(path).encode() + b"\0")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            h.update(b"missing\0")
+        else:
+            h.update(U32.pack(len(data)))
+            h.update(data)
+    return h.digest()
+
+
+def artifact_path(directory, plugin_root, languages, intensity):
+    """File name for one (languages, intensity) combination of a checkout.
+
+    A short hash of the resolved plugin root keeps two checkouts sharing a
+    cache directory from overwriting each other's artifacts on every prompt.
+    """
+    import hashlib
+
+    name = "+".join(languages) or "none"
+    if not all(c.isalnum() or c in "+-_" for c in name + intensity):
+        # Config values end up in a file name; don't let them pick the path.
+        name = hashlib.blake2b(name.encode(), digest_size=8).hexdigest()
+        intensity = hashlib.blake2b(intensity.encode(), digest_size=4).hexdigest()
+    root = os.path.realpath(str(plugin_root))
+    checkout = hashlib.blake2b(os.fsencode(root), digest_size=4).hexdigest()
+    return os.path.join(directory, f"{name}.{intensity}.{checkout}.tpdict")
+
+
+def _join_anchors(anchors):
+    if not anchors or any("\0" in anchor for anchor in anchors):
+        return None
+    return "\0".join(anchors)
+
+
+def _split_anchors(joined):
+    return tuple(joined.split("\0")) if joined else None
+
+
+def serialize(ruleset, digest, signature):
+    """Encode a RuleSet as artifact bytes."""
+    strings = [signature]
+    string_index = {signature: 0}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        idx = string_index.get(value)
+        if idx is None:
+            idx = string_index[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    rule_records = []
+    for rule in ruleset.rules:
+        level = (
+            rules_mod.LEVELS.index(rule.level) if rule.level is not None else NO_LEVEL
+        )
+        rule_records.append(
+            RULE.pack(
+                intern(rule.id),
+                intern(rule.language),
+                intern(rule.category),
+                intern(rule.pattern),
+                intern(rule.replacement),
+                intern(_join_anchors(rule.anchors)),
+                rule.flags,
+                level,
+                rule.action,
+                0,
+            )
+        )
+
+    pass_records = []
+    for name, indices in ruleset.passes:
+        pass_records.append(U32.pack(intern(name)) + U32.pack(len(indices)))
+        pass_records.extend(U32.pack(i) for i in indices)
+
+    layer_records = []
+    for source, indices in ruleset.layers or ():
+        layer_records.append(U32.pack(intern(source)) + U32.pack(len(indices)))
+        layer_records.extend(U32.pack(i) for i in indices)
+
+    encoded = [s.encode() for s in strings]
+    spans = []
+    offset = 0
+    for blob in encoded:
+        spans.append(SPAN.pack(offset, len(blob)))
+        offset += len(blob)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        FLAG_LINE_LOCAL if ruleset.line_local else 0,
+        digest,
+        len(strings),
+        len(rule_records),
+        len(ruleset.passes),
+        len(ruleset.layers or ()),
+    )
+    return b"".join(
+        [header] + spans + encoded + rule_records + pass_records + layer_records
+    )
+
+
+class _Reader:
+    """Decodes an artifact straight out of a mapped buffer."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        (
+            magic,
+            version,
+            self.flags,
+            self.digest,
+            self.n_strings,
+            self.n_rules,
+            self.n_passes,
+            self.n_layers,
+        ) = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a current tone-police artifact")
+        self.spans_at = HEADER.size
+        self.blob_at = self.spans_at + SPAN.size * self.n_strings
+        last_offset, last_len = (
+            SPAN.unpack_from(buf, self.spans_at + SPAN.size * (self.n_strings - 1))
+            if self.n_strings
+            else (0, 0)
+        )
+        self.rules_at = self.blob_at + last_offset + last_len
+
+    def string(self, idx):
+        if idx == NO_STRING:
+            return None
+        offset, length = SPAN.unpack_from(self.buf, self.spans_at + SPAN.size * idx)
+        start = self.blob_at + offset
+        return str(self.buf[start : start + length], "utf-8")
+
+    def _index_lists(self, at, count):
+        """Decode ``count`` (u32 string, u32 n, n * u32) records from ``at``."""
+        records = []
+        for _ in range(count):
+            name = self.string(U32.unpack_from(self.buf, at)[0])
+            n = U32.unpack_from(self.buf, at + 4)[0]
+            at += 8
+            records.append((name, list(struct.unpack_from(f"<{n}I", self.buf, at))))
+            at += 4 * n
+        return records, at
+
+    def ruleset(self, languages, intensity):
+        rules = []
+        at = self.rules_at
+        for _ in range(self.n_rules):
+            fields = RULE.unpack_from(self.buf, at)
+            at += RULE.size
+            (
+                rid,
+                lang,
+                category,
+                pattern,
+                replacement,
+                anchors,
+                flags,
+                level,
+                action,
+                _,
+            ) = fields
+            rules.append(
+                rules_mod.Rule(
+                    self.string(rid),
+                    self.string(lang),
+                    rules_mod.LEVELS[level] if level != NO_LEVEL else None,
+                    self.string(category),
+                    self.string(pattern),
+                    self.string(replacement),
+                    flags,
+                    action,
+                    _split_anchors(self.string(anchors)),
+                )
+            )
+        passes, at = self._index_lists(at, self.n_passes)
+        layers, at = self._index_lists(at, self.n_layers)
+        return rules_mod.RuleSet(
+            languages,
+            intensity,
+            rules,
+            passes,
+            layers if layers else None,
+            bool(self.flags & FLAG_LINE_LOCAL),
+        )
+
+
+def read_artifact(path, languages, intensity, signature, sources):
+    """Map an artifact and decode its RuleSet.
+
+    Returns:
+        (RuleSet, fresh) where ``fresh`` is False when the stat signature was
+        out of date but the content digest still matched, or (None, False)
+        when the artifact is missing, stale or corrupt.
+    """
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                reader = _Reader(buf)
+                fresh = reader.string(0) == signature
+                if not fresh and reader.digest != source_digest(
+                    sources, languages, intensity
+                ):
+                    return None, False
+                return reader.ruleset(languages, intensity), fresh
+    except (OSError, ValueError, struct.error, IndexError):
+        return None, False
+
+
+def write_artifact(path, data):
+    """Atomically replace ``path`` with ``data`` (best effort)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def build(plugin_root, languages, intensity, directory=None):
+    """Build and write the artifact for one combination; return (path, RuleSet)."""
+    languages = tuple(languages)
+    sources = source_files(plugin_root, languages)
+    signature = stat_signature(sources)
+    ruleset = rules_mod.build_ruleset(plugin_root, languages, intensity)
+    digest = source_digest(sources, languages, intensity)
+    path = artifact_path(directory or cache_dir(), plugin_root, languages, intensity)
+    write_artifact(path, serialize(ruleset, digest, signature))
+    return path, ruleset
+
+
+def load_ruleset(plugin_root, languages, intensity, directory=None):
+    """Return the RuleSet for a combination, preferring a fresh artifact.
+
+    Falls back to parsing the JSON dictionaries (and refreshing the artifact)
+    when the artifact is missing or stale. Results are memoized per process
+    and revalidated with a stat of each source file.
+    """
+    languages = tuple(languages)
+    sources = source_files(plugin_root, languages)
+    signature = stat_signature(sources)
+    memo_key = (str(plugin_root), languages, intensity)
+    cached = _loaded.get(memo_key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    path = artifact_path(directory or cache_dir(), plugin_root, languages, intensity)
+    ruleset, fresh = read_artifact(path, languages, intensity, signature, sources)
+    if ruleset is None:
+        _, ruleset = build(plugin_root, languages, intensity, directory)
+    elif not fresh:
+        # Sources were touched but not changed: record the new signature so
+        # the next run skips hashing again.
+        digest = source_digest(sources, languages, intensity)
+        write_artifact(path, serialize(ruleset, digest, signature))
+    _loaded[memo_key] = (signature, ruleset)
+    return ruleset
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --build-dictionaries``."""
+    import argparse
+
+    from . import pipeline
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --build-dictionaries",
+        description="Precompile dictionary artifacts for faster hook start-up.",
+    )
+    parser.add_argument(
+        "--languages",
+        help="comma-separated language codes (default: from the active config)",
+    )
+    parser.add_argument(
+        "--intensity",
+        action="append",
+        choices=rules_mod.LEVELS,
+        help="level(s) to build (default: all three)",
+    )
+    parser.add_argument("--cache-dir", help="output directory")
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="list dictionary entries left out as duplicate or shadowed",
+    )
+    args = parser.parse_args(argv)
+
+    config, plugin_root = pipeline.load_config()
+    if args.languages:
+        combinations = [[code for code in args.languages.split(",") if code]]
+    else:
+        languages = pipeline.configured_languages(config, plugin_root)
+        combinations = [languages]
+        if config.get("languages") == "auto":
+            # Detection can pick any subset of the candidates.
+            import itertools
+
+            combinations = [
+                list(subset)
+                for n in range(1, len(languages) + 1)
+                for subset in itertools.combinations(languages, n)
+            ]
+    for languages in combinations:
+        for intensity in args.intensity or rules_mod.LEVELS:
+            path, ruleset = build(plugin_root, languages, intensity, args.cache_dir)
+            executed = len(ruleset.sequence)
+            print(
+                f"{path}: {len(ruleset.rules)} unique rules, {executed} executed "
+                f"in {len(ruleset.layers)} scans, {len(ruleset.redundant)} dropped"
+            )
+            if args.report:
+                for kind, rule, earlier in ruleset.redundant:
+                    print(f"  {kind}: {rule.id} {rule.pattern!r} (by {earlier.id})")
+    return 0
@@ -0,0 +1,417 @@
+"""Transform audit log, enabled with ``"log_transforms": true``.
+
+Every rewritten prompt becomes one JSON line: when, which project, mode and
+intensity, the rule IDs and categories that fired, and the character spans
+that changed. The log is written without fsync, in one append per flush,
+and rotated by size (``transforms.jsonl`` -> ``transforms.jsonl.1`` -> ...).
+Rotation is not coordinated between processes; at worst two hooks rotating
+at once lose a backup generation.
+
+Flushing is bounded in time: the changed spans are worked out and the
+records encoded on a helper thread that the caller waits on for at most
+``log_time_budget_ms``. A batch that runs late is left to finish and
+appended by the next flush; at exit the hook waits one more budget for it
+and then drops it, so a huge prompt costs its record rather than pushing the
+hook toward its timeout. The helper never writes: every append is one
+``O_APPEND`` write from the flushing thread, so exiting mid-flush cannot
+leave half a line behind.
+
+Config keys:
+    log_path: Log file (default: ``$XDG_STATE_HOME/tone-police/transforms.jsonl``).
+    log_max_bytes: Rotate once the file would grow past this (default 5 MiB).
+    log_backups: Rotated files to keep (default 3).
+    log_redact: Record offsets and a keyed BLAKE2b of the prompt, not the text.
+    log_time_budget_ms: Longest a flush may hold up the caller (default 50).
+"""
+
+import os
+import threading
+import time
+
+from .paths import state_dir
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+DEFAULT_TIME_BUDGET_MS = 50
+
+# A long-lived daemon batches records for up to FLUSH_INTERVAL seconds or
+# FLUSH_BYTES of JSON; a one-shot hook flushes its single record at once.
+FLUSH_INTERVAL = 1.0
+FLUSH_BYTES = 64 * 1024
+
+# After a difference, the two texts count as back in step once this many
+# tokens agree again; the next such point is looked for at most
+# RESYNC_WINDOW tokens ahead (both texts together).
+RESYNC_TOKENS = 6
+RESYNC_WINDOW = 32
+
+# Length of the key that redacted prompt hashes are made with.
+KEY_BYTES = 32
+
+_logs = {}
+_logs_lock = threading.Lock()
+_keys = {}  # key file -> its contents
+_token_regex = None
+
+
+def log_path(config, environ=None):
+    path = config.get("log_path")
+    if path:
+        return os.path.expanduser(path)
+    return os.path.join(state_dir(environ), "transforms.jsonl")
+
+
+def changed_spans(before, after):
+    """Regions that differ between ``before`` and ``after``.
+
+    Rules rewrite short phrases in place, so the texts fall back in step a
+    few tokens after each difference. The walk takes the nearest point where
+    RESYNC_TOKENS tokens agree; if there is none within RESYNC_WINDOW, the
+    rest is one span less its common suffix. Linear in the length of the
+    texts, unlike a general diff.
+
+    Returns:
+        List of (start, end, new_start, new_end) character offsets, aligned
+        to word boundaries.
+    """
+    global _token_regex
+    if _token_regex is None:
+        import re
+
+        _token_regex = re.compile(r"\w+|\W")
+    old = _token_regex.findall(before)
+    new = _token_regex.findall(after)
+
+    def offsets(tokens):
+        out = [0]
+        for token in tokens:
+            out.append(out[-1] + len(token))
+        return out
+
+    old_at = offsets(old)
+    new_at = offsets(new)
+    n, m = len(old), len(new)
+    spans = []
+    i = j = 0
+    while i < n and j < m:
+        if old[i] == new[j]:
+            i += 1
+            j += 1
+            continue
+        found = _resync(old, new, i, j)
+        if found is None:
+            break
+        spans.append((old_at[i], old_at[found[0]], new_at[j], new_at[found[1]]))
+        i, j = found
+    if i < n or j < m:
+        k = 0
+        while k < n - i and k < m - j and old[n - 1 - k] == new[m - 1 - k]:
+            k += 1
+        spans.append((old_at[i], old_at[n - k], new_at[j], new_at[m - k]))
+    return spans
+
+
+def _resync(old, new, i, j):
+    """The nearest (i2, j2) past a difference where the tokens agree again."""
+    n, m = len(old), len(new)
+    for distance in range(1, RESYNC_WINDOW + 1):
+        for skip in range(distance + 1):
+            a = i + skip
+            b = j + distance - skip
+            if a > n or b > m:
+                continue
+            if old[a : a + RESYNC_TOKENS] == new[b : b + RESYNC_TOKENS]:
+                return a, b
+    return None
+
+
+def redact_key(environ=None):
+    """This install's secret for hashing redacted prompts, made on first use.
+
+    A plain hash of a short prompt ("shut up") is undone by hashing guesses;
+    keyed with 32 random bytes kept next to the state (``audit.key``, 0600),
+    the same prompt still hashes alike across records but guesses can't be
+    checked without the key.
+    """
+    path = os.path.join(state_dir(environ), "audit.key")
+    key = _keys.get(path)
+    if key is not None:
+        return key
+    try:
+        with open(path, "rb") as f:
+            key = f.read()
+    except FileNotFoundError:
+        key = b""
+    if len(key) != KEY_BYTES:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, os.urandom(KEY_BYTES))
+        finally:
+            os.close(fd)
+        try:
+            if key:
+                os.replace(tmp, path)  # damaged: start over
+            else:
+                os.link(tmp, path)  # fails if another hook got there first
+        except FileExistsError:
+            pass
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        with open(path, "rb") as f:
+            key = f.read()
+    _keys[path] = key
+    return key
+
+
+def make_entry(config, project, prompt, text, hits, spans=True, environ=None):
+    """The log record for ``prompt`` rewritten to ``text`` by rules ``hits``.
+
+    With ``spans=False`` the changed spans, the costly part, are left as
+    None for add_spans(). ``environ`` locates redact_key().
+    """
+    import datetime
+
+    redact = config.get("log_redact", False)
+    entry = {
+        "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "project": project or None,
+        "mode": config.get("mode", "rewrite"),
+        "intensity": config.get("intensity", "moderate"),
+        "languages": config.get("languages", ["en"]),
+        "rules": sorted({rule.id for rule in hits}),
+        "categories": sorted({rule.category for rule in hits}),
+        "spans": None,
+    }
+    if redact:
+        import hashlib
+
+        entry["prompt_blake2b"] = hashlib.blake2b(
+            prompt.encode(), key=redact_key(environ), digest_size=32
+        ).hexdigest()
+    else:
+        entry["prompt"] = prompt
+        entry["rewritten"] = text
+    if spans:
+        add_spans(entry, prompt, text, redact)
+    return entry
+
+
+def add_spans(entry, prompt, text, redact=False):
+    """Fill in the ``"spans"`` of a make_entry() record."""
+    spans = entry["spans"] = []
+    for start, end, new_start, new_end in changed_spans(prompt, text):
+        if redact:
+            spans.append({"start": start, "end": end, "length": new_end - new_start})
+        else:
+            spans.append(
+                {
+                    "start": start,
+                    "end": end,
+                    "before": prompt[start:end],
+                    "after": text[new_start:new_end],
+                }
+            )
+    return entry
+
+
+class AuditLog:
+    """Buffered, size-rotated JSONL file with a time cap on every flush.
+
+    Attributes:
+        path: The live log file.
+        max_bytes: Size that triggers rotation before an append.
+        backups: Rotated generations to keep.
+        time_budget: Seconds a flush may block its caller.
+        late: Flushes whose batch outlasted the time budget.
+        dropped: Late batches still unfinished at close(), never written.
+    """
+
+    def __init__(self, path, max_bytes, backups, time_budget):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.time_budget = time_budget
+        self.late = 0
+        self.dropped = 0
+        self._lines = []
+        self._size = 0
+        self._last_flush = 0.0
+        self._timer = None
+        self._encoders = []  # threads still encoding batches that ran late
+        self._ready = []  # encoded batches waiting to be appended
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def record(self, entry, finish=None):
+        """Queue one record; flush if the buffer is old or large enough.
+
+        ``finish(entry)``, if given, completes the record on the encoder
+        thread, so its cost falls under the time budget.
+        """
+        size = len(repr(entry))  # close enough to the JSON for batching
+        with self._lock:
+            self._lines.append((entry, finish))
+            self._size += size
+            due = (
+                self._size >= FLUSH_BYTES
+                or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+            )
+            if not due and self._timer is None:
+                self._timer = threading.Timer(FLUSH_INTERVAL, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Write out the buffer; False if encoding it outlasted the time budget.
+
+        The batch is encoded on a helper thread and appended by the caller.
+        One that runs late is appended by a later flush, or by close().
+        """
+        with self._lock:
+            records = self._lines
+            self._lines = []
+            self._size = 0
+            self._last_flush = time.monotonic()
+        on_time = True
+        if records:
+            encoder = threading.Thread(
+                target=self._encode, args=(records,), daemon=True
+            )
+            encoder.start()
+            encoder.join(self.time_budget)
+            if encoder.is_alive():
+                on_time = False
+                with self._lock:
+                    self.late += 1
+                    self._encoders.append(encoder)
+        with self._lock:
+            ready = self._ready
+            self._ready = []
+            self._encoders = [t for t in self._encoders if t.is_alive()]
+        if ready:
+            self._append(b"".join(ready))
+        return on_time
+
+    def close(self):
+        """Flush, then wait up to the time budget for batches that ran late.
+
+        Runs at exit. Batches still encoding after that are dropped; the
+        encoders never touch the file, so nothing is left half-written.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+        deadline = time.monotonic() + self.time_budget
+        for encoder in list(self._encoders):
+            encoder.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            self._encoders = [t for t in self._encoders if t.is_alive()]
+            self.dropped += len(self._encoders)
+        self.flush()
+        with self._write_lock:
+            pass  # let an append on the timer thread finish
+
+    def _encode(self, records):
+        import json
+
+        try:
+            lines = []
+            for entry, finish in records:
+                if finish is not None:
+                    finish(entry)
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+        except (OSError, ValueError):
+            return  # the audit log must never take the hook down with it
+        data = "".join(lines).encode()
+        with self._lock:
+            self._ready.append(data)
+
+    def _append(self, data):
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                try:
+                    size = os.stat(self.path).st_size
+                except FileNotFoundError:
+                    size = 0
+                if size and size + len(data) > self.max_bytes:
+                    self._rotate()
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    # One O_APPEND write per batch, so lines from concurrent
+                    # hooks never interleave; a short write is only finished.
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view) :]
+                finally:
+                    os.close(fd)
+        except OSError:
+            pass
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.unlink(self.path)
+            return
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def get_log(config, environ=None):
+    """The process-wide AuditLog for the config's log settings."""
+    key = (
+        log_path(config, environ),
+        int(config.get("log_max_bytes", DEFAULT_MAX_BYTES)),
+        int(config.get("log_backups", DEFAULT_BACKUPS)),
+        float(config.get("log_time_budget_ms", DEFAULT_TIME_BUDGET_MS)) / 1000,
+    )
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            if not _logs:
+                import atexit
+
+                atexit.register(flush_all)
+            log = _logs[key] = AuditLog(*key)
+    return log
+
+
+def flush_all():
+    for log in list(_logs.values()):
+        log.close()
+
+
+def log_transform(config, environ, prompt, text, hits):
+    """Record that ``prompt`` was rewritten to ``text``.
+
+    ``text`` is None for a prompt that block mode stopped without writing a
+    suggestion; its record names the rules but has no rewrite or spans.
+    """
+    if environ is None:
+        environ = os.environ
+    project = environ.get("CLAUDE_PROJECT_DIR")
+    try:
+        entry = make_entry(config, project, prompt, text, hits, False, environ)
+    except OSError:
+        return  # no key to redact with: better no record than a guessable one
+    if text is None:
+        get_log(config, environ).record(entry)
+        return
+    redact = config.get("log_redact", False)
+    get_log(config, environ).record(
+        entry, lambda entry: add_spans(entry, prompt, text, redact)
+    )
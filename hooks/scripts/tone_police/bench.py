@@ -0,0 +1,330 @@
+"""Benchmark suite for the filter pipeline.
+
+``tone-filter.py --bench`` times each pipeline stage over synthetic corpora
+(clean, hostile, code-heavy, multi-language) of increasing size, plus the
+hook end to end in a subprocess. Results are JSON, keyed
+``stage/corpus/size``; pass ``--baseline`` to compare against a stored run
+and exit non-zero when a stage got slower than the allowed threshold::
+
+    python3 hooks/scripts/tone-filter.py --bench --save-baseline
+    python3 hooks/scripts/tone-filter.py --bench --baseline benchmarks/baseline.json
+
+Timings are machine-specific: save the baseline on the machine that checks it.
+"""
+
+import os
+import sys
+
+from . import pipeline
+
+BASELINE = os.path.join(pipeline.DEFAULT_PLUGIN_ROOT, "benchmarks", "baseline.json")
+
+CORPORA = ("clean", "hostile", "code", "multilang")
+SIZES = (1024, 16 * 1024, 256 * 1024)
+LANGUAGES = ("en", "es", "fr", "de")
+
+# A stage regresses when its best time grows by more than THRESHOLD, and by
+# at least MIN_DELTA_MS, so sub-microsecond jitter never fails a run.
+THRESHOLD = 0.25
+MIN_DELTA_MS = 0.05
+
+_PROSE = (
+    "The parser drops the last token when the input ends without a newline.",
+    "Could you refactor this function so the retry logic lives in one place?",
+    "I reran the migration twice and the index still points at the old table.",
+    "Please add tests for empty lists, nested brackets and unicode names.",
+    "The build passes locally but CI times out on the integration stage.",
+)
+_HOSTILE = (
+    "What the FUCK is wrong with this STUPID code?!!!",
+    "Who the hell wrote this garbage? It sucks.",
+    "This shit keeps crashing, you idiot... fix it........",
+    "Shut up and fix the damn tests, this is sooooo annoying!!!",
+    "I hate this crappy piece of junk, what a moron.",
+)
+_MULTILANG = (
+    "Esto es una mierda, joder. ¿Quién escribió este código de mierda?",
+    "Putain, c'est de la merde, quel con a écrit ça ?",
+    "Was zur Hölle ist das für ein Scheiß, du Idiot!",
+    "Este código es una basura y el que lo hizo es un idiota.",
+    "Ce code est nul, merde, je déteste ce truc.",
+)
+_CODE = (
+    "```python\ndef fuck_it(shit):\n    return shit or 'WTF!!!'\n```",
+    "```\nERROR damn_handler: FATAL crap in module hell.py line 42\n```",
+    "Check `shit_count` and `fuck_flag` before calling `hell()`.",
+)
+
+
+def corpus(kind, size, seed=0):
+    """Deterministic synthetic prompt of ``kind`` and at least ``size`` chars."""
+    import random
+
+    rng = random.Random(f"{kind}-{size}-{seed}")
+    mix = {
+        "clean": [_PROSE],
+        "hostile": [_PROSE, _HOSTILE],
+        "code": [_PROSE, _HOSTILE, _CODE, _CODE],
+        "multilang": [_PROSE, _HOSTILE, _MULTILANG, _MULTILANG],
+    }[kind]
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(rng.choice(mix))
+        parts.append(part)
+        length += len(part) + 1
+    return "\n".join(parts) if kind == "code" else " ".join(parts)
+
+
+def _time(fn, runs):
+    """Best and median wall time of ``runs`` calls, in milliseconds."""
+    import time
+
+    fn()  # warm up
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        "best_ms": round(times[0], 4),
+        "median_ms": round(times[len(times) // 2], 4),
+    }
+
+
+def _project_dir(config):
+    """Temporary project whose override config pins the benchmark config."""
+    import json
+    import tempfile
+
+    project = tempfile.mkdtemp(prefix="tone-police-bench-")
+    os.makedirs(os.path.join(project, ".claude"))
+    path = os.path.join(project, ".claude", "tone-police.config.json")
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return project
+
+
+def run(
+    plugin_root=None,
+    corpora=CORPORA,
+    sizes=SIZES,
+    runs=5,
+    intensity="strict",
+    subprocess_runs=3,
+):
+    """Run the suite.
+
+    Args:
+        plugin_root: Plugin checkout to benchmark; defaults to this one.
+        corpora: Corpus kinds to generate.
+        sizes: Corpus sizes in characters.
+        runs: Timed calls per in-process measurement.
+        intensity: Intensity for every stage; all four languages are loaded.
+        subprocess_runs: Timed hook invocations per corpus and size; 0 skips
+            the end-to-end stage.
+
+    Returns:
+        Dict of ``stage`` or ``stage/corpus/size`` -> {"best_ms", "median_ms"}.
+    """
+    import json
+    import shutil
+    import subprocess
+
+    from . import artifact
+
+    plugin_root = str(plugin_root or pipeline.DEFAULT_PLUGIN_ROOT)
+    config = {
+        "intensity": intensity,
+        "languages": list(LANGUAGES),
+        "mode": "rewrite",
+        "enabled": True,
+        "preserve_code_blocks": True,
+    }
+    project = _project_dir(config)
+    environ = {"CLAUDE_PLUGIN_ROOT": plugin_root, "CLAUDE_PROJECT_DIR": project}
+
+    def load_dictionaries():
+        pipeline._json_cache.clear()
+        pipeline.load_common_patterns(plugin_root)
+        for lang in LANGUAGES:
+            pipeline.load_dictionary(plugin_root, lang)
+
+    def load_ruleset():
+        artifact._loaded.clear()
+        artifact.load_ruleset(plugin_root, LANGUAGES, intensity)
+
+    results = {}
+    try:
+        results["load_config"] = _time(lambda: pipeline.load_config(environ), runs)
+        results["load_dictionaries"] = _time(load_dictionaries, runs)
+        results["load_ruleset"] = _time(load_ruleset, runs)
+
+        ruleset = pipeline.load_rules(config, plugin_root)
+        common = pipeline.load_common_patterns(plugin_root)
+        patterns = [
+            pipeline.get_intensity_patterns(
+                pipeline.load_dictionary(plugin_root, lang), intensity
+            )
+            for lang in LANGUAGES
+        ]
+
+        def apply_language_patterns(text):
+            for by_category in patterns:
+                text = pipeline.apply_language_patterns(text, by_category)
+            return text
+
+        # "languages": "auto" over the same four: detection, then only the
+        # detected languages' rules. Compare with ruleset_apply.
+        auto = dict(config, languages="auto", auto_languages=list(LANGUAGES))
+
+        def ruleset_apply_auto(text):
+            return pipeline.load_rules(auto, plugin_root, text).apply(text)
+
+        stages = {
+            "split_code_blocks": pipeline.split_code_blocks,
+            "apply_common_patterns": lambda t: pipeline.apply_common_patterns(
+                t, common
+            ),
+            "apply_language_patterns": apply_language_patterns,
+            "ruleset_apply": ruleset.apply,
+            "detect_languages": lambda t: pipeline.select_languages(
+                auto, plugin_root, t
+            ),
+            "ruleset_apply_auto": ruleset_apply_auto,
+            "filter_text": lambda t: pipeline.filter_text(
+                t, config, plugin_root, ruleset
+            ),
+        }
+        script = os.path.join(plugin_root, "hooks", "scripts", "tone-filter.py")
+        env = dict(os.environ, TONE_POLICE_DAEMON="0", **environ)
+        for kind in corpora:
+            for size in sizes:
+                text = corpus(kind, size)
+                for stage, fn in stages.items():
+                    key = f"{stage}/{kind}/{size}"
+                    results[key] = _time(lambda: fn(text), runs)
+                if subprocess_runs:
+                    payload = json.dumps({"prompt": text}).encode()
+                    results[f"subprocess/{kind}/{size}"] = _time(
+                        lambda: subprocess.run(
+                            [sys.executable, script],
+                            input=payload,
+                            env=env,
+                            capture_output=True,
+                            check=True,
+                        ),
+                        subprocess_runs,
+                    )
+    finally:
+        shutil.rmtree(project, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD, min_delta_ms=MIN_DELTA_MS):
+    """Stages slower than the baseline allows.
+
+    Returns:
+        List of (key, baseline best ms, current best ms), sorted by key.
+        Keys missing from either side are ignored.
+    """
+    regressions = []
+    for key in sorted(results.keys() & baseline.keys()):
+        before = baseline[key]["best_ms"]
+        after = results[key]["best_ms"]
+        if after > before * (1 + threshold) and after - before >= min_delta_ms:
+            regressions.append((key, before, after))
+    return regressions
+
+
+def report(results):
+    import platform
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --bench``."""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --bench",
+        description="Time the filter pipeline stage by stage.",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in SIZES),
+        help="comma-separated corpus sizes in characters (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--corpora",
+        default=",".join(CORPORA),
+        help="comma-separated corpus kinds (default: %(default)s)",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="timed calls per stage")
+    parser.add_argument(
+        "--subprocess-runs",
+        type=int,
+        default=3,
+        help="timed hook runs per corpus and size; 0 skips them",
+    )
+    parser.add_argument("--intensity", default="strict", help="intensity level")
+    parser.add_argument("--output", help="write the JSON report here, not stdout")
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=BASELINE,
+        help="fail on regressions against this report (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="allowed slowdown as a fraction (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=BASELINE,
+        metavar="PATH",
+        help="also store the report as the baseline (default: %(const)s)",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        corpora=[kind for kind in args.corpora.split(",") if kind],
+        sizes=[int(size) for size in args.sizes.split(",") if size],
+        runs=args.runs,
+        intensity=args.intensity,
+        subprocess_runs=args.subprocess_runs,
+    )
+    text = json.dumps(report(results), indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after in regressions:
+            print(
+                f"REGRESSION {key}: {before:.3f} ms -> {after:.3f} ms "
+                f"(+{(after / before - 1) * 100:.0f}%)",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
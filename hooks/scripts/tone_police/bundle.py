@@ -0,0 +1,203 @@
+"""Single-file zipapp build of the hook.
+
+``tone-filter.py --build-zipapp`` packs the entry script (as ``__main__``),
+the tone_police package with precompiled bytecode, the dictionaries and the
+default config into one ``.pyz`` file::
+
+    python3 -S dist/tone-police.pyz < payload.json
+
+The bytecode is written as unchecked-hash ``.pyc`` files next to the sources
+inside the archive, so zipimport loads it without compiling or stat()ing
+anything; a different Python version simply falls back to the sources.
+"""
+
+import os
+import sys
+
+ARCHIVE_NAME = "tone-police.pyz"
+INTERPRETER = "/usr/bin/env python3"
+
+# Plugin directories embedded in the archive, relative to the plugin root.
+EMBEDDED = ("config", "dictionaries")
+
+
+def unpacked_root(archive):
+    """Plugin root holding the archive's embedded config and dictionaries.
+
+    They are extracted once per archive build into the cache directory, so
+    artifacts can stat() and mmap them like files in a checkout.
+    """
+    from .paths import cache_dir
+
+    st = os.stat(archive)
+    target = os.path.join(cache_dir(), f"bundle-{st.st_size:x}-{st.st_mtime_ns:x}")
+    if not os.path.isdir(target):
+        _unpack(archive, target)
+    return target
+
+
+def _unpack(archive, target):
+    import shutil
+    import zipfile
+
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(archive) as zf:
+        for name in zf.namelist():
+            if name.split("/", 1)[0] in EMBEDDED:
+                zf.extract(name, tmp)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another hook process unpacked the same build first.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _stage(staging, plugin_root, compile):
+    import py_compile
+    import shutil
+
+    scripts = os.path.join(plugin_root, "hooks", "scripts")
+    package = os.path.join(scripts, "tone_police")
+    os.makedirs(os.path.join(staging, "tone_police"))
+    sources = [(os.path.join(scripts, "tone-filter.py"), "__main__.py")]
+    for name in sorted(os.listdir(package)):
+        if name.endswith(".py"):
+            sources.append((os.path.join(package, name), f"tone_police/{name}"))
+    for src, rel in sources:
+        dest = os.path.join(staging, rel)
+        shutil.copyfile(src, dest)
+        if compile:
+            py_compile.compile(
+                dest,
+                cfile=dest + "c",
+                dfile=rel,
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+    for directory in EMBEDDED:
+        src_dir = os.path.join(plugin_root, directory)
+        for name in sorted(os.listdir(src_dir)):
+            if name.endswith(".json"):
+                os.makedirs(os.path.join(staging, directory), exist_ok=True)
+                shutil.copyfile(
+                    os.path.join(src_dir, name), os.path.join(staging, directory, name)
+                )
+
+
+def build(output, plugin_root=None, compile=True):
+    """Write the zipapp to ``output`` and return its path."""
+    import tempfile
+    import zipapp
+
+    from . import pipeline
+
+    plugin_root = str(plugin_root or pipeline.DEFAULT_PLUGIN_ROOT)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with tempfile.TemporaryDirectory() as staging:
+        _stage(staging, plugin_root, compile)
+        tmp = f"{output}.{os.getpid()}.tmp"
+        zipapp.create_archive(staging, tmp, interpreter=INTERPRETER)
+        os.replace(tmp, output)
+    return output
+
+
+# Payloads for the start-up comparison: nothing to do, nothing to change,
+# and a rewrite.
+MEASURE_PAYLOADS = (
+    ("empty prompt", ""),
+    ("clean prompt", "Please refactor the parser and add tests for it."),
+    ("hostile prompt", "What the FUCK is wrong with this STUPID code?!!!"),
+)
+
+
+def measure(commands, plugin_root, runs=20, environ=None):
+    """Time hook start-up for each command line.
+
+    Args:
+        commands: List of (label, argv) to compare.
+        plugin_root: Passed as CLAUDE_PLUGIN_ROOT.
+        runs: Invocations per (command, payload); the best run is kept.
+        environ: Base environment; defaults to os.environ.
+
+    Returns:
+        Dict of (payload label, command label) -> best wall time in ms.
+    """
+    import json
+    import subprocess
+    import time
+
+    env = dict(os.environ if environ is None else environ)
+    env["CLAUDE_PLUGIN_ROOT"] = str(plugin_root)
+    env["TONE_POLICE_DAEMON"] = "0"
+    results = {}
+    for payload_label, prompt in MEASURE_PAYLOADS:
+        payload = json.dumps({"prompt": prompt}).encode()
+        for label, argv in commands:
+            # One untimed run warms bytecode and dictionary artifact caches.
+            subprocess.run(argv, input=payload, env=env, capture_output=True)
+            best = None
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(argv, input=payload, env=env, capture_output=True)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[(payload_label, label)] = best * 1000
+    return results
+
+
+def format_measurements(results, commands):
+    labels = [label for label, _ in commands]
+    width = max(len(label) for label, _ in MEASURE_PAYLOADS)
+    lines = [" " * width + "".join(f"  {label:>16}" for label in labels)]
+    for payload_label, _ in MEASURE_PAYLOADS:
+        cells = "".join(
+            f"  {results[(payload_label, label)]:>13.1f} ms" for label in labels
+        )
+        lines.append(f"{payload_label:<{width}}{cells}")
+    return "\n".join(lines)
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --build-zipapp``."""
+    import argparse
+
+    from . import pipeline
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --build-zipapp",
+        description="Build a single-file zipapp of the hook.",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(pipeline.DEFAULT_PLUGIN_ROOT, "dist", ARCHIVE_NAME),
+        help="where to write the archive (default: dist/%(default)s)",
+    )
+    parser.add_argument(
+        "--no-compile",
+        action="store_true",
+        help="ship sources only, without precompiled bytecode",
+    )
+    parser.add_argument(
+        "--measure",
+        type=int,
+        nargs="?",
+        const=20,
+        metavar="RUNS",
+        help="compare start-up time with tone-filter.py (default: 20 runs)",
+    )
+    args = parser.parse_args(argv)
+
+    output = build(args.output, compile=not args.no_compile)
+    print(f"wrote {output} ({os.path.getsize(output)} bytes)")
+    if args.measure:
+        script = os.path.join(
+            pipeline.DEFAULT_PLUGIN_ROOT, "hooks", "scripts", "tone-filter.py"
+        )
+        commands = [
+            ("tone-filter.py", [sys.executable, script]),
+            ("zipapp", [sys.executable, output]),
+            ("zipapp -S", [sys.executable, "-S", output]),
+        ]
+        results = measure(commands, pipeline.DEFAULT_PLUGIN_ROOT, args.measure)
+        print(format_measurements(results, commands))
+    return 0
@@ -0,0 +1,141 @@
+"""Thin client for the filter daemon.
+
+This runs on every prompt before anything else is imported, so it only
+touches ``os`` and the C-level ``_socket`` module (``socket`` would drag in
+``enum`` and ``selectors``). Any failure to reach the daemon returns None and
+the caller filters in-process instead.
+
+The socket is only used when it and its directory belong to the current
+user and the directory is private (mode 0700, not a symlink). The fallback
+directory lives in ``/tmp``, and a local user who created it first could
+otherwise read every prompt and answer with hook output of their own.
+"""
+
+import os
+import stat  # already imported by os
+
+import _socket
+
+PROTOCOL = b"TP1"
+
+# Environment variables forwarded to the daemon so it resolves the same
+# config the hook process would have.
+FORWARDED_PREFIXES = ("CLAUDE_", "TONE_POLICE_")
+
+CONNECT_TIMEOUT = 0.25
+REPLY_TIMEOUT = 5.0
+
+
+def socket_path(environ=None):
+    """Return the daemon socket path for the current user."""
+    if environ is None:
+        environ = os.environ
+    explicit = environ.get("TONE_POLICE_SOCKET")
+    if explicit:
+        return explicit
+    runtime_dir = environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join("/tmp", f"tone-police-{os.getuid()}")
+    return os.path.join(runtime_dir, "tone-police.sock")
+
+
+def private_directory(path):
+    """Whether ``path`` is a real directory of ours that nobody else can use."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(st.st_mode)
+        and st.st_uid == os.getuid()
+        and stat.S_IMODE(st.st_mode) == 0o700
+    )
+
+
+def trusted_socket(path):
+    """Whether ``path`` is our own socket, in a private_directory()."""
+    if not private_directory(os.path.dirname(path) or "."):
+        return False
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+def encode_request(raw, environ):
+    """Frame a hook payload and its environment for the daemon.
+
+    The frame is ``TP1\\0``, then ``KEY=VALUE\\0`` per forwarded variable,
+    an empty entry, and finally the untouched stdin payload.
+    """
+    parts = [PROTOCOL, b"\0"]
+    for key, value in environ.items():
+        if key.startswith(FORWARDED_PREFIXES):
+            parts.append(f"{key}={value}".encode() + b"\0")
+    parts.append(b"\0")
+    parts.append(raw.encode())
+    return b"".join(parts)
+
+
+def decode_request(data):
+    """Split a request frame into (raw payload, environ dict)."""
+    header, _, rest = data.partition(b"\0")
+    if header != PROTOCOL:
+        raise ValueError(f"unsupported protocol {header!r}")
+    environ = {}
+    while True:
+        entry, sep, rest = rest.partition(b"\0")
+        if not sep:
+            raise ValueError("truncated request")
+        if not entry:
+            break
+        key, _, value = entry.decode().partition("=")
+        environ[key] = value
+    return rest.decode(), environ
+
+
+def request(raw, environ=None):
+    """Send a hook payload to the daemon and return its stdout text.
+
+    Returns:
+        The text the daemon produced (possibly empty), or None if no daemon
+        answered and the caller should fall back to filtering in-process.
+    """
+    if environ is None:
+        environ = os.environ
+    if environ.get("TONE_POLICE_DAEMON", "1") == "0":
+        return None
+    family = getattr(_socket, "AF_UNIX", None)
+    if family is None:
+        return None
+
+    path = socket_path(environ)
+    if not trusted_socket(path):
+        return None
+    try:
+        payload = encode_request(raw, environ)
+        sock = _socket.socket(family, _socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(path)
+            sock.settimeout(REPLY_TIMEOUT)
+            sock.sendall(payload)
+            sock.shutdown(_socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            sock.close()
+    except (OSError, ValueError):
+        return None
+
+    reply = b"".join(chunks)
+    # The daemon prefixes every reply with "ok\0"; a bare close (crash or
+    # shutdown mid-request) must not be mistaken for "prompt was clean".
+    if not reply.startswith(b"ok\0"):
+        return None
+    return reply[3:].decode()
@@ -0,0 +1,126 @@
+"""Long-lived filter server listening on a Unix domain socket.
+
+Start it once per login session (``tone-filter.py --serve``) and every hook
+invocation becomes a connect/send/receive instead of a cold Python start that
+re-reads config and dictionaries and recompiles every regex. Config and
+dictionary files are re-parsed only when their mtime or size changes, and the
+compiled patterns stay in the ``re`` module cache for the life of the process.
+"""
+
+import errno
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+from . import client, pipeline
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        try:
+            raw, environ = client.decode_request(b"".join(chunks))
+        except ValueError:
+            # Unknown framing: close without "ok" so the client falls back.
+            return
+        reply = pipeline.handle(raw, environ)
+        self.request.sendall(b"ok\0" + reply.encode())
+
+
+class FilterServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def handle_timeout(self):
+        self.idle = True
+
+
+def _claim_socket(path):
+    """Remove a stale socket file, refusing to evict a live daemon."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        if e.errno != errno.ECONNREFUSED:
+            raise
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"a tone-police daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def make_server(path):
+    """Bind a FilterServer on ``path``, replacing a stale socket file.
+
+    Raises:
+        RuntimeError: The directory is not private to this user (see
+            client.private_directory()), or a daemon is already listening.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not client.private_directory(directory):
+        raise RuntimeError(
+            f"refusing to listen in {directory}: it must be a directory owned "
+            "by you with mode 0700, not a symlink"
+        )
+    _claim_socket(path)
+    old_umask = os.umask(0o177)
+    try:
+        return FilterServer(path, _Handler)
+    finally:
+        os.umask(old_umask)
+
+
+def serve(path=None, idle_timeout=None):
+    """Serve filter requests until interrupted or idle for ``idle_timeout`` s."""
+    if path is None:
+        path = client.socket_path()
+    server = make_server(path)
+    server.timeout = idle_timeout
+    server.idle = False
+    try:
+        while not server.idle:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --serve [--socket PATH] [--idle SECS]``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --serve",
+        description="Run the tone-police filter daemon.",
+    )
+    parser.add_argument("--socket", help="socket path (default: per-user runtime dir)")
+    parser.add_argument(
+        "--idle",
+        type=float,
+        default=None,
+        help="exit after this many seconds without a request",
+    )
+    args = parser.parse_args(argv)
+    # Turn SIGTERM into a normal exit so the socket file gets removed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve(args.socket, args.idle)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
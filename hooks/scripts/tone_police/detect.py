@@ -0,0 +1,111 @@
+"""Per-prompt language detection for ``"languages": "auto"``.
+
+Every dictionary can carry a ``detect`` block: a few dozen stopwords no other
+dictionary lists, and the letters only its language uses (``ñ¿¡`` for
+Spanish, ``äöüß`` for German). A prompt scores one point per stopword and per
+distinctive letter in its first SAMPLE_CHARS characters. Languages are then
+taken best first until they account for ``language_confidence`` of the
+points; only their dictionaries run.
+
+When there is too little evidence (fewer than MIN_EVIDENCE points, typical of
+"wtf" or a bare stack trace) every candidate language runs, exactly as with
+an explicit list. Profanity in a language the rest of the prompt does not
+use can slip through; list languages explicitly where that matters.
+"""
+
+from . import pipeline
+
+DEFAULT_CONFIDENCE = 0.9
+MIN_EVIDENCE = 3
+SAMPLE_CHARS = 1024
+
+_PUNCTUATION = ".,;:!?¿¡()[]{}<>\"'«»„“”`*-"
+
+_profiles = {}
+
+
+def available_languages(plugin_root):
+    """Codes of every language dictionary under ``plugin_root``, sorted."""
+    import os
+
+    directory = os.path.join(str(plugin_root), "dictionaries")
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(
+        name[: -len(".json")]
+        for name in names
+        if name.endswith(".json") and name != "common-patterns.json"
+    )
+
+
+def profiles(plugin_root, languages):
+    """Detection tables: ({stopword: language}, {language: distinctive letters}).
+
+    Languages without a ``detect`` block are left out; they are never chosen
+    on evidence, only by the fall-back. Memoized while the dictionaries are.
+    """
+    dictionaries = [
+        pipeline.load_dictionary(plugin_root, language) or {}
+        for language in languages
+    ]
+    key = (str(plugin_root), tuple(languages))
+    cached = _profiles.get(key)
+    if cached is not None and all(
+        a is b for a, b in zip(cached[0], dictionaries)
+    ):
+        return cached[1]
+    words, letters = {}, {}
+    for language, dictionary in zip(languages, dictionaries):
+        spec = dictionary.get("detect")
+        if spec:
+            for word in spec.get("stopwords", ()):
+                words.setdefault(word.lower(), language)
+            letters[language] = spec.get("characters", "")
+    _profiles[key] = (dictionaries, (words, letters))
+    return words, letters
+
+
+def scores(text, profiles):
+    """Evidence points per language for ``text``."""
+    words, letters = profiles
+    sample = text[:SAMPLE_CHARS].lower()
+    out = dict.fromkeys(letters, 0)
+    get = words.get
+    # str.split plus strip is several times faster than a Unicode \w regex.
+    for token in sample.split():
+        language = get(token) or get(token.strip(_PUNCTUATION))
+        if language:
+            out[language] += 1
+    for language, characters in letters.items():
+        for ch in characters:
+            out[language] += sample.count(ch)
+    return out
+
+
+def detect(text, profiles, confidence=DEFAULT_CONFIDENCE):
+    """Languages ``text`` is written in, or None when unsure.
+
+    Args:
+        text: The prompt.
+        profiles: From profiles().
+        confidence: Share of the evidence the chosen languages must cover.
+
+    Returns:
+        A tuple of languages in candidate order, or None.
+    """
+    points = scores(text, profiles)
+    total = sum(points.values())
+    if total < MIN_EVIDENCE:
+        return None
+    chosen = set()
+    covered = 0
+    for language in sorted(points, key=points.get, reverse=True):
+        if not points[language]:
+            break
+        chosen.add(language)
+        covered += points[language]
+        if covered >= confidence * total:
+            break
+    return tuple(language for language in profiles[1] if language in chosen)
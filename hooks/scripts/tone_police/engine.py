@@ -0,0 +1,212 @@
+"""Merged rule layers.
+
+Running every dictionary rule as its own ``re.sub`` scans the prompt once
+per rule (171 times at strict with four languages). The build step
+(analysis.plan_layers) groups consecutive rules whose combined effect
+provably does not depend on their order into a *layer*; each layer is
+compiled into one alternation with a named group per rule and applied in a
+single scan, dispatching on ``match.lastgroup``.
+
+Rules that cannot be merged (backreferences, callables, non-linear
+patterns) get a layer of their own and run exactly as before.
+
+Most dictionary rules are not really regular expressions: ``\bterrible\b``
+and ``\bshut up\b`` are a literal word and phrase between word boundaries.
+Detection (scan.py) never rewrites, so every rule sees the prompt as given
+and those rules can be answered from a LiteralIndex: the prompt is folded
+and cut into words once, single words are keys of a hash map and phrases
+hang off their first word. Only the rules left over (``f+u+c+k+``, caps,
+punctuation) are searched with ``re``, through ``Layer.rest``. Rewriting
+keeps the merged alternations: every layer that changes the text changes
+its words, and cutting it up again costs more than the scans it saves.
+"""
+
+import functools
+import re
+
+from .folding import fold_text
+
+# \b, then a literal starting and ending with a word character, then \b.
+_LITERAL = re.compile(r"\\b(\w(?:[^\\.^$*+?{}\[\]()|]*\w)?)\\b\Z")
+_WORDS = re.compile(r"\w+")
+_WORD_CHAR = re.compile(r"\w")
+
+# The one character re counts as a non-word character that folds onto a word
+# character; a text containing it is not cut into words by its folded form.
+_NONWORD_FOLDING_TO_WORD = "\u0345"
+
+
+def literal(rule):
+    """The case-folded word or phrase ``rule`` matches, or None.
+
+    A rule qualifies when its pattern is ``\\b<literal>\\b`` with nothing in
+    between that ``re`` would read as syntax, and it is case-insensitive, as
+    dictionary rules are.
+    """
+    return _literal(rule.pattern, rule.flags)
+
+
+@functools.lru_cache(maxsize=None)
+def _literal(pattern, flags):
+    if flags != re.IGNORECASE:
+        return None
+    m = _LITERAL.match(pattern)
+    return fold_text(m.group(1)) if m else None
+
+
+class LiteralIndex:
+    """The literal rules of a rule set, keyed by the first word they match.
+
+    Attributes:
+        entries: {folded first word: [(folded literal, Rule), ...]}; for a
+            single-word rule the literal is the word itself.
+    """
+
+    __slots__ = ("entries", "_keys")
+
+    def __init__(self, rules):
+        self.entries = {}
+        for rule in rules:
+            string = literal(rule)
+            if string is not None:
+                first = _WORDS.match(string).group()
+                self.entries.setdefault(first, []).append((string, rule))
+        self._keys = frozenset(self.entries)
+
+    def find(self, text, folded=None, wanted=None):
+        """(start, end, rule) for every match of a literal rule in ``text``.
+
+        Each rule's matches are the ones its regex would find; matches of
+        different rules may overlap.
+
+        Args:
+            text: The text.
+            folded: fold_text(text), if the caller has it.
+            wanted: Optional predicate; other rules are not looked for.
+        """
+        if folded is None:
+            folded = fold_text(text)
+        if _NONWORD_FOLDING_TO_WORD in text:
+            present = self._keys
+        else:
+            present = self._keys.intersection(_WORDS.findall(folded))
+        size = len(text)
+
+        def boundary(i):
+            before = i > 0 and _WORD_CHAR.match(text, i - 1) is not None
+            return before != (i < size and _WORD_CHAR.match(text, i) is not None)
+
+        for key in present:
+            for string, rule in self.entries[key]:
+                if wanted is not None and not wanted(rule):
+                    continue
+                i = folded.find(string)
+                while i >= 0:
+                    end = i + len(string)
+                    if boundary(i) and boundary(end):
+                        yield i, end, rule
+                        i = folded.find(string, end)
+                    else:
+                        i = folded.find(string, i + 1)
+
+
+class Layer:
+    """One scan over the text.
+
+    Attributes:
+        source: Merged regex source, or None for a single-rule layer.
+        rules: The Rule objects; alternative ``r{k}`` belongs to ``rules[k]``.
+        anchors: Every rule's anchors, deduplicated, or None when some rule
+            has none (the layer can then never be skipped).
+    """
+
+    __slots__ = ("source", "rules", "anchors", "_regex", "_replacements", "_rest")
+
+    def __init__(self, source, rules):
+        self.source = source
+        self.rules = rules
+        self.anchors = None
+        if all(rule.anchors for rule in rules):
+            self.anchors = tuple(
+                sorted({anchor for rule in rules for anchor in rule.anchors})
+            )
+        self._regex = None
+        self._replacements = None
+        self._rest = None
+
+    def __repr__(self):
+        return f"Layer({[rule.id for rule in self.rules]!r})"
+
+    @property
+    def regex(self):
+        if self._regex is None:
+            # _replacements first: a thread that sees _regex set reads both.
+            self._replacements = {
+                f"r{k}": rule.replacement for k, rule in enumerate(self.rules)
+            }
+            self._regex = re.compile(self.source)
+        return self._regex
+
+    @property
+    def rest(self):
+        """A regex for the rules of a merged layer that are not literal().
+
+        Alternative ``r{k}`` still belongs to ``rules[k]``. None for a
+        single-rule layer or one whose rules are all literal.
+        """
+        if self._rest is None and self.source is not None:
+            alternatives = [
+                f"(?P<r{k}>{'(?i:' if rule.flags & re.IGNORECASE else '(?-i:'}"
+                f"{rule.pattern}))"
+                for k, rule in enumerate(self.rules)
+                if literal(rule) is None
+            ]
+            if len(alternatives) == len(self.rules):
+                self._rest = self.regex
+            elif alternatives:
+                # The hoisted guard holds for any subset of the alternatives.
+                guard = self.source[: self.source.index("(?:(?P<r0>")]
+                self._rest = re.compile(guard + "(?:" + "|".join(alternatives) + ")")
+            else:
+                self._rest = False
+        return self._rest or None
+
+    def apply(self, text, hits=None):
+        if self.source is None:
+            return self.rules[0].apply(text, hits)
+        regex = self.regex
+        replacements = self._replacements
+        if hits is None:
+            return regex.sub(lambda m: replacements[m.lastgroup], text)
+        rules = self.rules
+
+        def replace(m):
+            group = m.lastgroup
+            hits.add(rules[int(group[1:])])
+            return replacements[group]
+
+        return regex.sub(replace, text)
+
+
+def build_layers(rules, sequence):
+    """Plan the layers for an execution sequence.
+
+    Args:
+        rules: The RuleSet's unique rules.
+        sequence: Rule indices in execution order, repeats included.
+
+    Returns:
+        List of (merged source or None, [rule index, ...]).
+    """
+    from . import analysis
+
+    ordered = [rules[i] for i in sequence]
+    plan, infos, alphabet = analysis.plan_layers(ordered)
+    layers = []
+    for positions in plan:
+        indices = [sequence[p] for p in positions]
+        source = None
+        if len(positions) > 1:
+            source = analysis.layer_source([infos[p] for p in positions], alphabet)
+        layers.append((source, indices))
+    return layers
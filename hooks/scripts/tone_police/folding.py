@@ -0,0 +1,61 @@
+"""Case folding that agrees with re.IGNORECASE.
+
+Kept separate from analysis.py so the hook can fold prompt text without
+loading the build-time pattern analysis.
+"""
+
+import re
+
+# Pairs re.IGNORECASE treats as equal although str.lower() keeps them apart
+# (mirrors re._casefix), folded onto one representative. U+0130 is listed
+# because its str.lower() is two characters while re folds it to "i".
+_FOLD_EXTRA = {
+    "İ": "i",
+    "ı": "i",
+    "ſ": "s",
+    "µ": "μ",
+    "ͅ": "ι",
+    "ι": "ι",
+    "ΐ": "ΐ",
+    "ΰ": "ΰ",
+    "ϐ": "β",
+    "ϵ": "ε",
+    "ϑ": "θ",
+    "ϰ": "κ",
+    "ϖ": "π",
+    "ϱ": "ρ",
+    "ς": "σ",
+    "ϕ": "φ",
+    "ᲀ": "в",
+    "ᲁ": "д",
+    "ᲂ": "о",
+    "ᲃ": "с",
+    "ᲄ": "т",
+    "ᲅ": "т",
+    "ᲆ": "ъ",
+    "ᲇ": "ѣ",
+    "ᲈ": "ꙋ",
+    "ẛ": "ṡ",
+    "ﬅ": "ﬆ",
+}
+_POST_FOLD = str.maketrans({k: v for k, v in _FOLD_EXTRA.items() if k != "İ"})
+# str.translate is slow on non-ASCII text; only pay for it when one of the
+# rare characters above is actually present.
+_NEEDS_POST_FOLD = re.compile("[" + "".join(k for k in _FOLD_EXTRA if k != "İ") + "]")
+
+
+def fold(ch):
+    """Case-fold one character the way re.IGNORECASE compares it."""
+    return _FOLD_EXTRA.get(ch) or ch.lower().translate(_POST_FOLD)
+
+
+def fold_text(text):
+    """Case-fold a whole string; the result has the same length as ``text``."""
+    if text.isascii():
+        return text.lower()
+    if "İ" in text:
+        text = text.replace("İ", "i")
+    text = text.lower()
+    if _NEEDS_POST_FOLD.search(text):
+        text = text.translate(_POST_FOLD)
+    return text
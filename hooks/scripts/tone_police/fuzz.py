@@ -0,0 +1,405 @@
+"""Differential fuzzing of the filter engines against the reference pipeline.
+
+Every optimization so far (merged layers, deduplicated rule sets, mmap
+artifacts, anchors, streaming, incremental records, previews) promises the
+output of the original rule-by-rule pipeline: apply_common_patterns(), then
+apply_language_patterns() per language, straight from the dictionary JSON.
+This module generates prompts that mix dictionary words (stretched,
+capitalized), code fences, inline backticks, punctuation runs and awkward
+Unicode, runs them through the reference and through each engine, and
+shrinks any mismatch to a minimal repro.
+
+The reference filters prose between code blocks, as apply_rules() has since
+placeholders were dropped. ``placeholders=True`` compares with the older
+``protect_code_blocks`` -> rules -> ``restore_code_blocks`` pipeline byte for
+byte instead; it differs by design where a code span touches a word or
+another code span.
+
+``tone-filter.py --fuzz`` runs a seeded corpus and exits 1 on a mismatch;
+the test suite runs a smaller fixed-seed corpus on every run.
+"""
+
+import random
+import re
+
+from . import pipeline
+
+DEFAULT_SEED = 0
+DEFAULT_CASES = 2000
+
+# Steps of the shrinker before it settles for what it has.
+MAX_SHRINK_STEPS = 5000
+
+_UNICODE = [
+    "ſhit",
+    "İdiot",
+    "Scheiße",
+    "SCHEISSE",
+    "ｆｕｃｋ",
+    "crap\u0301",
+    "é",
+    "ß",
+    "K",
+    "ﬀ",
+    "😡",
+    "\u200b",
+    "ı",
+]
+_SEPARATORS = [" ", " ", " ", "", "\n", ", ", "-", "_", "\t", ". "]
+_QUANTIFIERS = re.compile(r"\\[bBwWsSdD]|[+*?]|\{\d*,?\d*\}|[()\[\]^$|]")
+
+_rulesets = {}
+
+
+def vocabulary(plugin_root, languages):
+    """Words and phrases the dictionaries match or write, for the generator."""
+    words = set()
+    for language in languages:
+        dictionary = pipeline.load_dictionary(plugin_root, language) or {}
+        for categories in dictionary.get("patterns", {}).values():
+            for entries in categories.values():
+                for entry in entries:
+                    literal = _QUANTIFIERS.sub("", entry["pattern"]).strip()
+                    if literal:
+                        words.add(literal)
+                    words.add(entry["replacement"])
+    return sorted(words)
+
+
+def _stretch(rng, word):
+    i = rng.randrange(len(word))
+    return word[:i] + word[i] * rng.randint(2, 5) + word[i:]
+
+
+def generate(rng, words, max_parts=12):
+    """One random prompt built from ``words`` and the usual troublemakers."""
+    parts = []
+    for _ in range(rng.randint(1, max_parts)):
+        kind = rng.random()
+        word = rng.choice(words)
+        if kind < 0.45:
+            part = word
+        elif kind < 0.55:
+            part = _stretch(rng, word)
+        elif kind < 0.65:
+            part = word.upper()
+        elif kind < 0.73:
+            part = rng.choice("!?.") * rng.randint(1, 6) + rng.choice(["", "?!", "!?"])
+        elif kind < 0.8:
+            part = f"`{word}`"
+        elif kind < 0.85:
+            part = f"```\n{word} {rng.choice(words)}\n```"
+        elif kind < 0.93:
+            part = rng.choice(_UNICODE)
+        else:
+            part = rng.choice(["`", "```", "__CODE_BLOCK_0__", "''", '"'])
+        parts.append(part)
+        parts.append(rng.choice(_SEPARATORS))
+    return "".join(parts[:-1])
+
+
+def reference(
+    text, plugin_root, languages, intensity, preserve_code=True, placeholders=False
+):
+    """What the original pipeline makes of ``text``, rule by rule."""
+    common = pipeline.load_common_patterns(plugin_root)
+    tables = []
+    for language in languages:
+        dictionary = pipeline.load_dictionary(plugin_root, language)
+        if dictionary:
+            tables.append(pipeline.get_intensity_patterns(dictionary, intensity))
+
+    def run(prose):
+        prose = pipeline.apply_common_patterns(prose, common)
+        for patterns in tables:
+            prose = pipeline.apply_language_patterns(prose, patterns)
+        return prose
+
+    if not preserve_code:
+        return run(text)
+    if placeholders:
+        protected, blocks = pipeline.protect_code_blocks(text)
+        return pipeline.restore_code_blocks(run(protected), blocks)
+    segments = pipeline.split_code_blocks(text)
+    segments[::2] = [run(prose) if prose else prose for prose in segments[::2]]
+    return "".join(segments)
+
+
+def _built(plugin_root, languages, intensity):
+    """build_ruleset(), memoized: the analysis dominates a short run."""
+    from .rules import build_ruleset
+
+    key = (str(plugin_root), tuple(languages), intensity)
+    ruleset = _rulesets.get(key)
+    if ruleset is None:
+        ruleset = _rulesets[key] = build_ruleset(plugin_root, languages, intensity)
+    return ruleset
+
+
+def _layers(plugin_root, languages, intensity, preserve_code):
+    ruleset = _built(plugin_root, languages, intensity)
+    return lambda text: pipeline.apply_rules(text, ruleset, preserve_code)
+
+
+def _sequential(plugin_root, languages, intensity, preserve_code):
+    from .rules import RuleSet
+
+    built = _built(plugin_root, languages, intensity)
+    # Without layers, apply() runs apply_sequential().
+    ruleset = RuleSet(built.languages, intensity, built.rules, built.passes)
+    return lambda text: pipeline.apply_rules(text, ruleset, preserve_code)
+
+
+def _artifact(plugin_root, languages, intensity, preserve_code):
+    from .artifact import load_ruleset
+
+    ruleset = load_ruleset(plugin_root, languages, intensity)
+    return lambda text: pipeline.apply_rules(text, ruleset, preserve_code)
+
+
+def _stream(plugin_root, languages, intensity, preserve_code):
+    from .artifact import load_ruleset
+    from .stream import StreamFilter
+
+    ruleset = load_ruleset(plugin_root, languages, intensity)
+
+    def run(text):
+        stream = StreamFilter(ruleset, preserve_code, chunk_size=8)
+        out = [stream.feed(text[i : i + 5]) for i in range(0, len(text), 5)]
+        out.append(stream.close())
+        return "".join(out)
+
+    return run
+
+
+def _incremental(plugin_root, languages, intensity, preserve_code):
+    from .artifact import load_ruleset
+    from .incremental import Record
+
+    ruleset = load_ruleset(plugin_root, languages, intensity)
+    record = Record(min_piece=8, max_piece=64)
+
+    def run(text):
+        # The second round is answered from the record left by the first.
+        for _ in range(2):
+            record.scan(text, ruleset, preserve_code)
+            out = record.filter(text, ruleset, preserve_code)
+            record.save()
+        return out
+
+    return run
+
+
+def _preview(plugin_root, languages, intensity, preserve_code):
+    from .preview import evaluate
+
+    def run(text):
+        result = evaluate(text, plugin_root, languages, preserve_code, False)
+        return result[intensity][0]
+
+    return run
+
+
+def _service(plugin_root, languages, intensity, preserve_code):
+    from .service import ToneFilter
+
+    engine = ToneFilter(
+        {
+            "languages": list(languages),
+            "intensity": intensity,
+            "preserve_code_blocks": preserve_code,
+            "normalize_obfuscation": False,
+        },
+        plugin_root,
+    )
+    return lambda text: engine.filter(text).text
+
+
+# Engine name -> factory(plugin_root, languages, intensity, preserve_code)
+# returning a text -> text function. Register new engines here to fuzz them.
+ENGINES = {
+    "layers": _layers,
+    "sequential": _sequential,
+    "artifact": _artifact,
+    "stream": _stream,
+    "incremental": _incremental,
+    "preview": _preview,
+    "service": _service,
+}
+
+
+def shrink(text, fails, max_steps=MAX_SHRINK_STEPS):
+    """A smaller ``text`` that still ``fails``, by delta debugging.
+
+    Whitespace-separated tokens are removed first, then single characters;
+    finally the whole text is tried in lower case.
+    """
+    steps = 0
+    for split in (re.compile(r"\s+|\S+").findall, list):
+        items = split(text)
+        n = 2
+        while len(items) > 1 and steps < max_steps:
+            size = -(-len(items) // n)
+            for i in range(0, len(items), size):
+                candidate = items[:i] + items[i + size :]
+                steps += 1
+                if candidate and fails("".join(candidate)):
+                    items = candidate
+                    n = max(n - 1, 2)
+                    break
+            else:
+                if size == 1:
+                    break
+                n = min(2 * n, len(items))
+        text = "".join(items)
+    if text != text.lower() and fails(text.lower()):
+        text = text.lower()
+    return text
+
+
+class Mismatch:
+    """An engine disagreeing with the reference.
+
+    Attributes:
+        engine: Engine name.
+        intensity: Intensity level.
+        case: Index of the generated prompt within the run.
+        text: The shrunk prompt.
+        expected: The reference output for ``text``.
+        actual: The engine output for ``text``.
+    """
+
+    def __init__(self, engine, intensity, case, text, expected, actual):
+        self.engine = engine
+        self.intensity = intensity
+        self.case = case
+        self.text = text
+        self.expected = expected
+        self.actual = actual
+
+    def __repr__(self):
+        return f"Mismatch({self.engine!r}, {self.intensity!r}, {self.text!r})"
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def run(
+    plugin_root,
+    languages,
+    intensities=None,
+    engines=None,
+    seed=DEFAULT_SEED,
+    cases=DEFAULT_CASES,
+    preserve_code=True,
+    placeholders=False,
+):
+    """Fuzz ``engines`` against the reference.
+
+    Args:
+        plugin_root: Where the dictionaries are read from.
+        languages: Language codes, in config order.
+        intensities: Levels to fuzz (default: all).
+        engines: ENGINES names or {name: factory} (default: all of ENGINES).
+        seed: Seed for the generator; the same seed gives the same prompts.
+        cases: Prompts per intensity.
+        preserve_code: Leave code blocks alone, like the config option.
+        placeholders: Compare with the placeholder pipeline; see above.
+
+    Returns:
+        A list of Mismatch, at most one per engine and intensity, shrunk.
+    """
+    from .rules import LEVELS
+
+    if engines is None:
+        engines = ENGINES
+    elif not isinstance(engines, dict):
+        engines = {name: ENGINES[name] for name in engines}
+    languages = tuple(languages)
+    words = vocabulary(plugin_root, languages)
+    mismatches = []
+    for intensity in intensities or LEVELS:
+        rng = random.Random(f"{seed}:{intensity}")
+        prompts = [generate(rng, words) for _ in range(cases)]
+
+        def expect(text):
+            return reference(
+                text, plugin_root, languages, intensity, preserve_code, placeholders
+            )
+
+        expected = [expect(text) for text in prompts]
+        for name, factory in engines.items():
+            engine = factory(plugin_root, languages, intensity, preserve_code)
+            for case, (text, want) in enumerate(zip(prompts, expected)):
+                if engine(text) == want:
+                    continue
+                text = shrink(text, lambda t: engine(t) != expect(t))
+                mismatches.append(
+                    Mismatch(name, intensity, case, text, expect(text), engine(text))
+                )
+                break
+    return mismatches
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --fuzz``."""
+    import argparse
+    import json
+
+    from .rules import LEVELS
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --fuzz",
+        description="Compare the filter engines with the reference pipeline.",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--cases",
+        type=int,
+        default=DEFAULT_CASES,
+        help="prompts per intensity (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--engine",
+        action="append",
+        choices=sorted(ENGINES),
+        help="engine to fuzz; repeatable (default: all)",
+    )
+    parser.add_argument(
+        "--intensity", action="append", choices=LEVELS, help="repeatable"
+    )
+    parser.add_argument(
+        "--languages",
+        default="en,es,fr,de",
+        help="comma-separated, in config order (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-preserve-code", action="store_true", help="filter code blocks too"
+    )
+    parser.add_argument(
+        "--placeholders",
+        action="store_true",
+        help="compare with the placeholder pipeline (expect code-edge diffs)",
+    )
+    args = parser.parse_args(argv)
+
+    _, plugin_root = pipeline.load_config()
+    mismatches = run(
+        plugin_root,
+        args.languages.split(","),
+        args.intensity,
+        args.engine,
+        args.seed,
+        args.cases,
+        not args.no_preserve_code,
+        args.placeholders,
+    )
+    for mismatch in mismatches:
+        print(json.dumps(mismatch.to_dict(), ensure_ascii=False))
+    engines = len(args.engine or ENGINES)
+    levels = len(args.intensity or LEVELS)
+    print(
+        f"{len(mismatches)} mismatches in {args.cases} prompts x {levels} "
+        f"intensities x {engines} engines (seed {args.seed})"
+    )
+    return 1 if mismatches else 0
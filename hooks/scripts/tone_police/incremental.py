@@ -0,0 +1,341 @@
+"""Incremental re-filtering of edited prompts, enabled with ``"incremental": true``.
+
+In block mode the usual next prompt is the last one, lightly edited after
+reading the suggestion. The hook keeps a record per session (keyed by the
+payload's ``session_id``) of the last prompt, cut into pieces, and of what
+each piece gave: its first match, its rewrite and the rules that fired. The
+next prompt is cut the same way. A piece seen last time reuses its results,
+and only the new ones are scanned or rewritten.
+
+A rule like ``f+u+c+k+`` has no longest match, so no margin around an edit
+is wide enough. Pieces end instead just after a newline outside code
+blocks, as stream.py cuts chunks. When every rule matches within one line
+(analysis.line_local), each piece filters exactly as it does inside the whole
+prompt, so the margin is simply the rest of the edited line. With a rule
+that can span lines the record is not used.
+
+Where a piece ends depends only on its own lines. After at least MIN_PIECE
+characters, a line whose CRC is a multiple of SPREAD ends it, and MAX_PIECE
+characters always end it. An insertion therefore changes the piece it lands
+in, and the pieces after it stay the same. Reuse looks pieces up by text, so
+moved or repeated paragraphs are reused too. A prompt without newlines is a
+single piece and gains nothing.
+
+The record is one JSON file (0600, in a 0700 directory) under
+``$XDG_CACHE_HOME/tone-police/sessions``. It is only consulted for prompts
+of at least ``incremental_min_chars``, because below that a full pass costs
+less than reading the file. It carries a fingerprint of the config and the
+dictionaries, and a record made under other settings is ignored. Block mode
+without ``block_suggestion`` may name the category of a different first
+match than a full scan would.
+
+Config keys:
+    incremental: Turn the record on (default false; it holds prompt text).
+    incremental_min_chars: Smallest prompt to use it for (default 4096).
+"""
+
+import os
+
+from . import pipeline
+
+DEFAULT_MIN_CHARS = 4096
+
+# Piece sizes, in characters; see the module docstring.
+MIN_PIECE = 512
+MAX_PIECE = 8192
+SPREAD = 4
+
+# Records of sessions untouched for this long are removed.
+SESSION_TTL = 24 * 3600
+
+# Bump when the record changes shape or meaning.
+FORMAT_VERSION = 3
+
+
+def split(text, preserve_code=True, min_piece=MIN_PIECE, max_piece=MAX_PIECE):
+    """Cut ``text`` into pieces that filter independently.
+
+    Returns:
+        A list of strings; ``"".join()`` gives ``text`` back.
+    """
+    from zlib import crc32
+
+    segments = pipeline.split_code_blocks(text) if preserve_code else [text]
+    out = []
+    start = pos = 0  # piece start and scan position, in ``text``
+    for i, segment in enumerate(segments):
+        end = pos + len(segment)
+        if i % 2 == 0:
+            newline = text.find("\n", pos, end)
+            while newline != -1:
+                line_end = newline + 1
+                size = line_end - start
+                if size >= max_piece or (
+                    size >= min_piece
+                    and not crc32(text[pos:line_end].encode("utf-8", "surrogatepass"))
+                    % SPREAD
+                ):
+                    out.append(text[start:line_end])
+                    start = line_end
+                pos = line_end
+                newline = text.find("\n", pos, end)
+        pos = end
+    if start < len(text) or not out:
+        out.append(text[start:])
+    return out
+
+
+class Record:
+    """A session's last prompt as pieces with their results.
+
+    Attributes:
+        path: The record file, or None to keep it in memory only.
+        settings: Fingerprint of the config; a record made under other
+            settings is ignored.
+        pieces: {piece: entry} of the last prompt. An entry has ``"m"``,
+            the first match in the piece as ``[[start, end, rule id]]`` (or
+            ``[]``), and/or ``"r"`` and ``"h"``, its rewrite and the ids of
+            the rules that fired in it.
+        reused: Pieces whose results came from the record.
+        fresh: Pieces scanned or rewritten anew.
+    """
+
+    def __init__(
+        self, path=None, settings=None, min_piece=MIN_PIECE, max_piece=MAX_PIECE
+    ):
+        self.path = path
+        self.settings = settings
+        self.min_piece = min_piece
+        self.max_piece = max_piece
+        self.pieces = {}
+        self.reused = 0
+        self.fresh = 0
+        self._rules = None
+        self._ruleset = None
+        self._by_id = {}
+        self._current = {}
+        self._split = None
+
+    def load(self):
+        from . import jsonlite
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = jsonlite.loads(f.read())
+        except (OSError, ValueError):
+            return self
+        if (
+            isinstance(data, dict)
+            and data.get("version") == FORMAT_VERSION
+            and data.get("settings") == self.settings
+        ):
+            self._rules = data.get("rules")
+            self.pieces = data.get("pieces") or {}
+        return self
+
+    def save(self):
+        """Keep the pieces of the prompt just handled, and only those.
+
+        Errors are ignored: the record is only a shortcut.
+        """
+        self.pieces = self._current
+        self._current = {}
+        self._split = None
+        if self.path is None:
+            return
+        import json
+        import threading
+
+        fresh = not os.path.exists(self.path)
+        data = {
+            "version": FORMAT_VERSION,
+            "settings": self.settings,
+            "rules": self._rules,
+            "pieces": self.pieces,
+        }
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except (OSError, ValueError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        if fresh:
+            prune(os.path.dirname(self.path))
+
+    def _bind(self, ruleset):
+        """Forget pieces filtered with other rules ("auto" languages)."""
+        rules = [list(ruleset.languages), ruleset.intensity]
+        if rules != self._rules:
+            self._rules = rules
+            self.pieces = {}
+            self._current = {}
+        if self._ruleset is not ruleset:
+            self._ruleset = ruleset
+            self._by_id = {rule.id: rule for rule in ruleset.rules}
+
+    def _pieces(self, text, preserve_code):
+        if self._split is None or self._split[0] != text:
+            pieces = split(text, preserve_code, self.min_piece, self.max_piece)
+            self._split = (text, pieces)
+        return self._split[1]
+
+    def _entry(self, piece):
+        entry = self._current.get(piece)
+        if entry is None:
+            entry = self.pieces.get(piece)
+            if entry is not None:
+                self.reused += 1
+                entry = self._current[piece] = dict(entry)
+        return entry
+
+    def _rule_ids_known(self, ids):
+        return all(rule_id in self._by_id for rule_id in ids)
+
+    def scan(self, text, ruleset, preserve_code=True, normalize=False, severity=None):
+        """scan.scan(first=True), reusing the pieces seen last time.
+
+        A known piece with a match decides without any search; otherwise the
+        new pieces are scanned in order until one matches.
+        """
+        from .scan import Match, scan
+
+        if not ruleset.line_local:
+            return scan(text, ruleset, preserve_code, normalize, severity, True)
+        self._bind(ruleset)
+        pieces = self._pieces(text, preserve_code)
+        offsets = []
+        offset = 0
+        fresh = []
+        for piece in pieces:
+            offsets.append(offset)
+            offset += len(piece)
+        for piece, offset in zip(pieces, offsets):
+            entry = self._entry(piece)
+            found = None if entry is None else entry.get("m")
+            if found is None or not self._rule_ids_known(m[2] for m in found):
+                fresh.append((piece, offset))
+            elif found:
+                start, end, rule_id = found[0]
+                start += offset
+                end += offset
+                return [Match(self._by_id[rule_id], start, end, text[start:end])]
+        for piece, offset in fresh:
+            self.fresh += 1
+            matches = scan(piece, ruleset, preserve_code, normalize, severity, True)
+            entry = self._current.setdefault(piece, {})
+            entry["m"] = [[m.start, m.end, m.rule.id] for m in matches]
+            if matches:
+                m = matches[0]
+                start = m.start + offset
+                end = m.end + offset
+                return [Match(m.rule, start, end, text[start:end])]
+        return []
+
+    def filter(
+        self,
+        text,
+        ruleset,
+        preserve_code=True,
+        normalize=False,
+        hits=None,
+        clean_known=True,
+    ):
+        """pipeline.apply_rules(), reusing the pieces seen last time.
+
+        ``clean_known`` lets a piece the scan found nothing in pass through
+        untouched; only true when the scan covered every rule (no severity).
+        """
+        if not ruleset.line_local:
+            return pipeline.apply_rules(text, ruleset, preserve_code, hits, normalize)
+        self._bind(ruleset)
+        out = []
+        for piece in self._pieces(text, preserve_code):
+            entry = self._entry(piece)
+            if entry is None:
+                entry = self._current[piece] = {}
+            if "r" in entry and self._rule_ids_known(entry["h"]):
+                out.append(entry["r"])
+                if hits is not None:
+                    hits.update(self._by_id[rule_id] for rule_id in entry["h"])
+                continue
+            if clean_known and entry.get("m") == []:
+                out.append(piece)
+                continue
+            self.fresh += 1
+            fired = set()
+            rewritten = pipeline.apply_rules(
+                piece, ruleset, preserve_code, fired, normalize
+            )
+            entry["r"] = rewritten
+            entry["h"] = sorted(rule.id for rule in fired)
+            if hits is not None:
+                hits.update(fired)
+            out.append(rewritten)
+        return "".join(out)
+
+
+def settings_key(config, plugin_root):
+    """Fingerprint of everything besides the text that decides the results."""
+    try:
+        from _blake2 import blake2b  # skips hashlib's OpenSSL import
+    except ImportError:
+        from hashlib import blake2b
+
+    from .paths import source_files, stat_signature
+
+    sources = source_files(
+        plugin_root, pipeline.configured_languages(config, plugin_root)
+    )
+    settings = (FORMAT_VERSION, str(plugin_root), sorted(config.items()))
+    h = blake2b(digest_size=20)
+    h.update(repr(settings).encode())
+    h.update(b"\0")
+    h.update(stat_signature(sources).encode())
+    return h.hexdigest()
+
+
+def session_dir(environ=None):
+    from .paths import cache_dir
+
+    return os.path.join(cache_dir(environ), "sessions")
+
+
+def prune(directory, ttl=SESSION_TTL):
+    """Remove the records of sessions idle for more than ``ttl`` seconds."""
+    import time
+
+    cutoff = time.time() - ttl
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def for_prompt(config, plugin_root, environ, session_id, prompt):
+    """The session's Record if the config and prompt call for one, else None."""
+    if not session_id or not config.get("incremental", False):
+        return None
+    minimum = config.get("incremental_min_chars", DEFAULT_MIN_CHARS)
+    if not minimum <= len(prompt) <= pipeline.STREAM_THRESHOLD:
+        return None
+    try:
+        from _blake2 import blake2b
+    except ImportError:
+        from hashlib import blake2b
+
+    name = blake2b(str(session_id).encode(), digest_size=16).hexdigest()
+    path = os.path.join(session_dir(environ), name + ".json")
+    return Record(path, settings_key(config, plugin_root)).load()
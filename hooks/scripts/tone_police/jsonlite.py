@@ -0,0 +1,49 @@
+"""JSON decoding without importing ``json``.
+
+``import json`` pulls in ``re`` and ``enum``, which is most of the start-up
+cost of a hook run that turns out to have nothing to filter (empty prompt,
+filter disabled, daemon answering). The C scanner behind json.loads needs
+none of that, so it is used directly when available. Anything it rejects is
+handed to the real json.loads, which produces the usual JSONDecodeError.
+"""
+
+_WHITESPACE = " \t\n\r"
+
+try:
+    from _json import make_scanner as _make_scanner
+except ImportError:  # pragma: no cover - non-CPython
+    _make_scanner = None
+
+
+class _Context:
+    """The attributes json's C scanner reads from a JSONDecoder."""
+
+    strict = True
+    object_hook = None
+    object_pairs_hook = None
+    parse_float = float
+    parse_int = int
+    parse_constant = {
+        "-Infinity": float("-inf"),
+        "Infinity": float("inf"),
+        "NaN": float("nan"),
+    }.__getitem__
+
+
+_scan = _make_scanner(_Context()) if _make_scanner is not None else None
+
+
+def loads(text):
+    """Decode a JSON document, like json.loads()."""
+    if _scan is not None:
+        start = len(text) - len(text.lstrip(_WHITESPACE))
+        try:
+            value, end = _scan(text, start)
+        except Exception:
+            pass
+        else:
+            if not text[end:].strip(_WHITESPACE):
+                return value
+    import json
+
+    return json.loads(text)
@@ -0,0 +1,49 @@
+"""Advisory file locks for state that concurrent hooks fold and rewrite.
+
+Appends stay lock-free (``O_APPEND`` keeps them whole); only the rare
+read-modify-write steps that fold a journal into a total and start it
+afresh take a lock. Where ``fcntl`` is missing (Windows) locking is a no-op
+and those steps can race as they did before.
+"""
+
+import os
+
+
+class FileLock:
+    """An exclusive ``flock()`` on ``path``, created 0600 if missing.
+
+    Use as a context manager; it gives True when the lock is held (always,
+    without ``fcntl``) and False when ``blocking=False`` and it is busy.
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self._fd = None
+
+    def acquire(self):
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if self.blocking else fcntl.LOCK_NB))
+        except OSError:
+            os.close(fd)
+            if self.blocking:
+                raise
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)  # closing drops the lock
+            self._fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
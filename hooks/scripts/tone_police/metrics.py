@@ -0,0 +1,370 @@
+"""Prometheus textfile metrics, enabled with ``"metrics": true``.
+
+The hook keeps no process around to be scraped, so it writes the text
+exposition format to a ``.prom`` file for node-exporter's textfile collector
+to pick up: prompts by decision (clean, rewrite, block), hook latency overall
+and per stage, prompts per category that fired, and result cache lookups
+when the cache is on.
+
+Each prompt costs one ``O_APPEND`` write of a short line to
+``<metrics_path>.events`` and one stat() of the ``.prom`` file. When that file
+is older than ``metrics_interval_s``, the hook that notices folds the new
+events into ``<metrics_path>.state`` (totals plus the journal offset they
+cover) and rewrites the ``.prom``; both are written to a temporary name and
+renamed into place, so the collector never reads a partial file. A render
+holds ``<metrics_path>.lock`` (locks.py) from reading the state to writing
+the ``.prom``. Otherwise a render that folded a journal just before another
+render removed it could write its older totals back, and a counter must
+never go down. A hook that finds the lock taken skips its render, since the
+holder is already doing it. Once fully folded past ``MAX_EVENTS_BYTES`` the
+journal is removed and started afresh; an event appended during that
+instant is lost.
+
+Latency is measured inside the hook, from reading the payload to the
+answer; the interpreter start of a one-shot hook is not included. Cached
+answers count as decisions but not as category hits. In block mode without
+``block_suggestion`` only the category of the first match is known.
+
+Config keys:
+    metrics: Turn metrics on (default false).
+    metrics_path: The ``.prom`` file (default:
+        ``$XDG_STATE_HOME/tone-police/tone-police.prom``); point it into the
+        collector's ``--collector.textfile.directory``.
+    metrics_interval_s: Oldest the ``.prom`` file may get (default 15).
+"""
+
+import os
+from time import perf_counter
+
+from .paths import state_dir
+
+DEFAULT_INTERVAL = 15.0
+
+# Upper bounds in seconds; in-process latency, so well below a cold start.
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+DECISIONS = ("clean", "rewrite", "block")
+
+# Journal size past which a fully folded journal is started afresh.
+MAX_EVENTS_BYTES = 1024 * 1024
+
+# Bump when the state file changes shape; older states are started afresh.
+FORMAT_VERSION = 1
+
+_event_flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+
+
+def metrics_path(config, environ=None):
+    path = config.get("metrics_path")
+    if path:
+        return os.path.expanduser(path)
+    return os.path.join(state_dir(environ), "tone-police.prom")
+
+
+class Run:
+    """Timing and outcome of one prompt, written out by finish().
+
+    Attributes:
+        path: The ``.prom`` file.
+        interval: Seconds between renders.
+        stages: [(stage name, seconds), ...] in the order they ran.
+        cache: "hit", "miss" or None when the cache was not consulted.
+    """
+
+    def __init__(self, config, environ=None, started=None):
+        self.path = metrics_path(config, environ)
+        self.interval = float(config.get("metrics_interval_s", DEFAULT_INTERVAL))
+        self.started = perf_counter() if started is None else started
+        self.stages = []
+        self.cache = None
+        self._mark = self.started
+
+    def stage(self, name):
+        """Close the stage ``name``: the time since the previous stage."""
+        now = perf_counter()
+        self.stages.append((name, now - self._mark))
+        self._mark = now
+
+    def finish(self, decision, categories=()):
+        """Record the prompt; render the ``.prom`` file if it is due.
+
+        Errors are ignored: metrics never fail the hook.
+        """
+        import time
+
+        total = perf_counter() - self.started
+        stages = ",".join(f"{name}={seconds:.7f}" for name, seconds in self.stages)
+        cats = ",".join(sorted({_clean(c) for c in categories})) or "-"
+        line = "\t".join(
+            (decision, self.cache or "-", f"{total:.7f}", stages or "-", cats)
+        )
+        events = self.path + ".events"
+        try:
+            fd = os.open(events, _event_flags, 0o600)
+        except FileNotFoundError:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(events)), exist_ok=True)
+                fd = os.open(events, _event_flags, 0o600)
+            except OSError:
+                return
+        except OSError:
+            return
+        try:
+            os.write(fd, (line + "\n").encode())
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        try:
+            due = os.stat(self.path).st_mtime < time.time() - self.interval
+        except OSError:
+            due = True
+        if due:
+            try:
+                render(self.path, blocking=False)
+            except (OSError, ValueError):
+                pass
+
+
+def _clean(category):
+    for ch in ",\t\n ":
+        category = category.replace(ch, "_")
+    return category
+
+
+def new_histogram():
+    return {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+
+
+def observe(histogram, seconds):
+    i = 0
+    while i < len(BUCKETS) and seconds > BUCKETS[i]:
+        i += 1
+    histogram["buckets"][i] += 1
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+
+def new_state():
+    return {
+        "version": FORMAT_VERSION,
+        "ino": None,
+        "offset": 0,
+        "decisions": {decision: 0 for decision in DECISIONS},
+        "cache": {},
+        "categories": {},
+        "latency": new_histogram(),
+        "stages": {},
+    }
+
+
+def fold(state, line):
+    """Add one journal line to ``state``; malformed lines are skipped."""
+    parts = line.split("\t")
+    if len(parts) != 5:
+        return
+    decision, cache, total, stages, categories = parts
+    timings = []
+    try:
+        total = float(total)
+        if stages != "-":
+            for stage in stages.split(","):
+                name, _, seconds = stage.partition("=")
+                timings.append((name, float(seconds)))
+    except ValueError:
+        return
+    state["decisions"][decision] = state["decisions"].get(decision, 0) + 1
+    if cache != "-":
+        state["cache"][cache] = state["cache"].get(cache, 0) + 1
+    observe(state["latency"], total)
+    for name, seconds in timings:
+        observe(state["stages"].setdefault(name, new_histogram()), seconds)
+    if categories != "-":
+        for category in categories.split(","):
+            state["categories"][category] = state["categories"].get(category, 0) + 1
+
+
+def load_state(path):
+    import json
+
+    try:
+        with open(path + ".state", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return new_state()
+    if not isinstance(state, dict) or state.get("version") != FORMAT_VERSION:
+        return new_state()
+    return state
+
+
+def _replace(path, data):
+    """Write ``data`` to ``path`` through a temporary file and a rename."""
+    import threading
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def update(path):
+    """Fold the unread journal into the state file; returns the state.
+
+    Call with the render lock held; see render().
+    """
+    import json
+
+    state = load_state(path)
+    events = path + ".events"
+    try:
+        f = open(events, "rb")
+    except FileNotFoundError:
+        return state
+    with f:
+        st = os.fstat(f.fileno())
+        if st.st_ino != state["ino"] or st.st_size < state["offset"]:
+            state["ino"] = st.st_ino
+            state["offset"] = 0
+        f.seek(state["offset"])
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].decode("utf-8", "replace").splitlines():
+        fold(state, line)
+    state["offset"] += end
+    if state["offset"] >= MAX_EVENTS_BYTES and state["offset"] == st.st_size:
+        try:
+            os.unlink(events)
+        except OSError:
+            pass
+        state["ino"] = None
+        state["offset"] = 0
+    _replace(path + ".state", json.dumps(state, sort_keys=True))
+    return state
+
+
+def _label(value):
+    value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{value}"'
+
+
+def _histogram(lines, name, histogram, labels=""):
+    cumulative = 0
+    for bound, n in zip(BUCKETS + ("+Inf",), histogram["buckets"]):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    braces = f"{{{labels.rstrip(',')}}}" if labels else ""
+    lines.append(f"{name}_sum{braces} {histogram['sum']:.7f}")
+    lines.append(f"{name}_count{braces} {histogram['count']}")
+
+
+def exposition(state, now=None):
+    """The Prometheus text format for ``state``."""
+    import time
+
+    if now is None:
+        now = time.time()
+    lines = [
+        "# HELP tone_police_prompts_total Prompts handled, by decision.",
+        "# TYPE tone_police_prompts_total counter",
+    ]
+    for decision, n in sorted(state["decisions"].items()):
+        lines.append(f"tone_police_prompts_total{{decision={_label(decision)}}} {n}")
+    lines += [
+        "# HELP tone_police_hook_duration_seconds Time in the hook per prompt.",
+        "# TYPE tone_police_hook_duration_seconds histogram",
+    ]
+    _histogram(lines, "tone_police_hook_duration_seconds", state["latency"])
+    if state["stages"]:
+        lines += [
+            "# HELP tone_police_stage_duration_seconds Time per stage of the hook.",
+            "# TYPE tone_police_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in sorted(state["stages"].items()):
+            _histogram(
+                lines,
+                "tone_police_stage_duration_seconds",
+                histogram,
+                f"stage={_label(stage)},",
+            )
+    lines += [
+        "# HELP tone_police_category_hits_total Prompts in which a category fired.",
+        "# TYPE tone_police_category_hits_total counter",
+    ]
+    for category, n in sorted(state["categories"].items()):
+        lines.append(
+            f"tone_police_category_hits_total{{category={_label(category)}}} {n}"
+        )
+    if state["cache"]:
+        lines += [
+            "# HELP tone_police_result_cache_lookups_total Result cache lookups.",
+            "# TYPE tone_police_result_cache_lookups_total counter",
+        ]
+        for result, n in sorted(state["cache"].items()):
+            lines.append(
+                f"tone_police_result_cache_lookups_total{{result={_label(result)}}} {n}"
+            )
+    lines += [
+        "# HELP tone_police_metrics_updated_seconds When this file was written.",
+        "# TYPE tone_police_metrics_updated_seconds gauge",
+        f"tone_police_metrics_updated_seconds {now:.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def render(path, blocking=True):
+    """Bring the state and the ``.prom`` file at ``path`` up to date.
+
+    Returns:
+        The exposition text, or None if ``blocking`` is false and another
+        process holds the lock.
+    """
+    from .locks import FileLock
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with FileLock(path + ".lock", blocking) as held:
+        if not held:
+            return None
+        text = exposition(update(path))
+        _replace(path, text)
+    return text
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --metrics``."""
+    import argparse
+    import sys
+
+    from . import pipeline
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --metrics",
+        description="Render the Prometheus textfile now and print it.",
+    )
+    parser.add_argument("--path", help="the .prom file (default: from the config)")
+    args = parser.parse_args(argv)
+
+    config, _ = pipeline.load_config()
+    path = args.path or metrics_path(config)
+    sys.stdout.write(render(path))
+    return 0
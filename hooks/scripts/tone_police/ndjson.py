@@ -0,0 +1,83 @@
+"""Batch mode: one process filtering newline-delimited JSON prompts.
+
+``tone-filter.py --ndjson`` reads ``{"prompt": ...}`` objects from stdin, one
+per line, and writes one result object per line, in input order, flushing
+after each so it can sit in a pipeline::
+
+    {"decision": "rewrite", "prompt": "what on earth", "output": "[TONE-...]"}
+
+``decision`` is "allow" (nothing to change), "rewrite" or "block", following
+the configured mode, and block mode honors ``block_severity`` and
+``block_suggestion`` as the hook does; ``prompt`` is the filtered text (the
+original when no suggestion was made) and ``output`` is exactly what the hook
+would have printed. An ``id`` in the input is echoed back. A
+line that is not a JSON object gets ``{"error": ...}`` instead.
+
+Config and dictionaries are loaded once, at start-up.
+"""
+
+import json
+import sys
+
+from . import jsonlite, pipeline
+
+
+class Batch:
+    """Filters prompts with one config and one rule set."""
+
+    def __init__(self, config, plugin_root):
+        from .service import ToneFilter
+
+        self.engine = ToneFilter(config, plugin_root)
+
+    def process(self, record):
+        """The result object for one decoded input object."""
+        prompt = record.get("prompt", "")
+        if not isinstance(prompt, str):
+            return {"error": "prompt must be a string"}
+        result = self.engine.filter(prompt)
+        return {
+            "decision": result.decision,
+            "prompt": result.text,
+            "output": result.output,
+        }
+
+    def process_line(self, line):
+        """The result object for one input line."""
+        try:
+            record = jsonlite.loads(line)
+        except ValueError as e:
+            return {"error": f"invalid JSON: {e}"}
+        if not isinstance(record, dict):
+            return {"error": "expected a JSON object"}
+        result = self.process(record)
+        if "id" in record:
+            result = {"id": record["id"], **result}
+        return result
+
+
+def run(source, sink, config, plugin_root):
+    """Answer every non-blank line of ``source`` on ``sink``."""
+    batch = Batch(config, plugin_root)
+    for line in iter(source.readline, ""):
+        if not line.strip():
+            continue
+        sink.write(json.dumps(batch.process_line(line)) + "\n")
+        sink.flush()
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --ndjson``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --ndjson",
+        description=(
+            "Filter newline-delimited {\"prompt\": ...} objects from stdin, "
+            "writing one result object per line."
+        ),
+    )
+    parser.parse_args(argv)
+    config, plugin_root = pipeline.load_config()
+    run(sys.stdin, sys.stdout, config, plugin_root)
+    return 0
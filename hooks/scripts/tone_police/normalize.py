@@ -0,0 +1,228 @@
+"""Obfuscation-tolerant matching through a normalized shadow of the prompt.
+
+``f*ck``, ``sh!t``, ``b1tch``, ``ｆｕｃｋ``, ``fцck`` and ``f​uck`` slip past
+``\\bf+u+c+k+\\b``. Rather than growing the dictionaries, the text gets a
+*shadow*: the same prompt with look-alike characters folded back to plain
+letters. The language rules run over the shadow once, and each match that
+covers a folded character is replaced at the corresponding span of the real
+text. Everything else in the prompt is left exactly as it was.
+
+The shadow is built in two steps:
+
+* ``str.translate`` with a fixed table: fullwidth forms and mathematical or
+  circled letters to ASCII, Cyrillic and Greek homoglyphs to Latin, and
+  invisible characters (zero-width spaces, soft hyphens, strike-through
+  overlays) deleted. Deletions are the only length change, so an offset map
+  from shadow to original positions is built only when there are any.
+* Inside tokens whose digits and symbols all sit between letters, leetspeak
+  is folded (``@``->a, ``$``->s, ``!``->i, ``0``->o, ...); a trailing run of
+  ``!`` is punctuation, not a letter. Masking characters (``*``, ``#``,
+  ``%``) are resolved against the words the dictionaries spell out: ``f*ck``
+  and ``f**k`` both become ``fuck``, while ``**bold**`` is left alone.
+  Neither step changes length. ``a55``, ``%hit`` and ``h3ll0`` (a digit or
+  symbol at an edge) stay as they are, and so do tokens inside paths and
+  dotted or snake_case identifiers (``./h3ll``, ``sh1t.py``): those are
+  names, not words.
+
+An all-ASCII prompt with no letter next to a digit or symbol costs one regex
+search and nothing else.
+"""
+
+import re
+
+from .folding import fold, fold_text
+
+# Fullwidth ASCII (U+FF01..U+FF5E), then letter look-alikes.
+_TABLE = {cp: cp - 0xFEE0 for cp in range(0xFF01, 0xFF5F)}
+# Mathematical alphanumerics: 13 styles of A-Z a-z, holes included.
+_TABLE.update(
+    {
+        cp: ord("Aa"[(cp - 0x1D400) % 52 // 26]) + (cp - 0x1D400) % 26
+        for cp in range(0x1D400, 0x1D6A4)
+    }
+)
+_TABLE.update({0x24B6 + i: ord("A") + i for i in range(26)})  # circled
+_TABLE.update({0x24D0 + i: ord("a") + i for i in range(26)})
+# Cyrillic and Greek homoglyphs, paired with the Latin letters below them.
+_HOMOGLYPHS = (
+    ("АВЕКМНОРСТУХІЈЅ", "ABEKMHOPCTYXIJS"),
+    ("аеорсухіјѕԁц", "aeopcyxijsdu"),
+    ("ΑΒΕΖΗΙΚΜΝΟΡΤΥΧ", "ABEZHIKMNOPTYX"),
+    ("αικνορτυχ", "aikvoptux"),
+)
+_TABLE.update(
+    {ord(a): ord(b) for glyphs, latin in _HOMOGLYPHS for a, b in zip(glyphs, latin)}
+)
+# Zero-width and formatting characters, and strike-through/underline overlays.
+_INVISIBLE = frozenset(
+    "\u00ad\u034f\u200b\u200c\u200d\u2060\ufeff\u0332\u0335\u0336\u0337\u0338"
+)
+_TABLE.update(dict.fromkeys(map(ord, _INVISIBLE)))
+
+_LEET = str.maketrans("@4$5!0137|+", "aassioietlt")
+_MASKS = "*#%"
+
+# A digit or symbol touching a letter: where an obfuscated token can start.
+_SEAM = re.compile(r"(?<=[^\W\d_])[\d@$!|+*#%]|[\d@$!|+*#%](?=[^\W\d_])")
+_TOKEN_CHARS = re.compile(r"[\w@$!|+*#%]+")
+# Next to these a token is part of a path or a dotted name.
+_NAME_BEFORE = re.compile(r"[/\\.]")
+_NAME_AFTER = re.compile(r"[/\\]|\.\w")
+
+
+def build_index(rules):
+    """{masked word: word} for every word the rules spell out literally.
+
+    ``fuck`` gives ``f*ck``, ``f**k`` and ``fu*k``: any run of masked
+    letters between the first and the last.
+    """
+    from .analysis import linear_form
+
+    words = set()
+    for rule in rules:
+        if rule.language == "common":
+            continue
+        items = linear_form(rule.pattern, rule.flags)
+        if items is None:
+            continue
+        chars = []
+        for item in items:
+            if isinstance(item, str):
+                continue
+            literal = item.chars.literal_chars()
+            if literal is None:
+                chars = None
+                break
+            # One letter up to case, as the scan folds it: ſ and s, ı and i.
+            folded = {fold(ch) for ch in literal}
+            if len(folded) != 1:
+                chars = None
+                break
+            chars.append(folded.pop() * item.min)
+        if chars:
+            words.update("".join(chars).split())
+    index = {}
+    for word in sorted(words):
+        n = len(word)
+        if n < 3:
+            continue
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                index.setdefault(word[:i] + "*" * (j - i) + word[j:], word)
+    return index
+
+
+def _fold_token(token, index):
+    core = token.rstrip("!")
+    tail = token[len(core) :]
+    if not (core[:1].isalpha() and core[-1:].isalpha()) or "_" in core:
+        return token
+    core = core.translate(_LEET)
+    if any(mask in core for mask in _MASKS):
+        masked = fold_text(core)
+        for mask in _MASKS[1:]:
+            masked = masked.replace(mask, "*")
+        word = index.get(masked)
+        if word is None:
+            return core + tail
+        core = "".join(plain if ch in _MASKS else ch for ch, plain in zip(core, word))
+    return core + tail
+
+
+def shadow_text(text, index):
+    """The normalized shadow of ``text``.
+
+    Returns:
+        (shadow, offsets), where ``offsets[i]`` is the position in ``text``
+        of ``shadow[i]``, plus one final entry for the end; None when there
+        were no deletions and positions line up. (None, None) when the
+        shadow would equal ``text``.
+    """
+    shadow = text if text.isascii() else text.translate(_TABLE)
+    offsets = None
+    if len(shadow) != len(text):
+        offsets = [i for i, ch in enumerate(text) if ch not in _INVISIBLE]
+        offsets.append(len(text))
+    seams = list(_SEAM.finditer(shadow))
+    if seams:
+        pieces = []
+        done = 0
+        for seam in seams:
+            at = seam.start()
+            if at < done:
+                continue
+            start = at
+            while start and _TOKEN_CHARS.match(shadow, start - 1, start):
+                start -= 1
+            end = _TOKEN_CHARS.match(shadow, at).end()
+            pieces.append(shadow[done:start])
+            if _NAME_BEFORE.match(shadow, max(start - 1, 0), start) or (
+                _NAME_AFTER.match(shadow, end)
+            ):
+                pieces.append(shadow[start:end])
+            else:
+                pieces.append(_fold_token(shadow[start:end], index))
+            done = end
+        pieces.append(shadow[done:])
+        shadow = "".join(pieces)
+    if shadow == text:
+        return None, None
+    return shadow, offsets
+
+
+def matches(text, ruleset, rules=None):
+    """Matches of the language rules that only the shadow of ``text`` has.
+
+    Args:
+        text: The text to search.
+        ruleset: The RuleSet.
+        rules: Rules to try, in order (default: all of ``ruleset``'s).
+
+    Yields:
+        (start, end, rule, match): the span in ``text`` and the match object
+        on the shadow.
+    """
+    shadow, offsets = shadow_text(text, ruleset.obfuscation_index)
+    if shadow is None:
+        return
+    folded = fold_text(shadow)
+    for rule in ruleset.rules if rules is None else rules:
+        if rule.language == "common" or rule.replacement is None:
+            continue
+        if rule.anchors and not any(anchor in folded for anchor in rule.anchors):
+            continue
+        for m in rule.regex.finditer(shadow):
+            start, end = m.span()
+            if offsets is not None:
+                start, end = offsets[start], offsets[end]
+            if text[start:end] == m.group():
+                continue  # nothing folded here: the plain pass saw it too
+            yield start, end, rule, m
+
+
+def apply(text, ruleset, hits=None):
+    """Rewrite obfuscated matches of ``ruleset``'s language rules in ``text``.
+
+    Run after the rules themselves, so only matches the plain pass could not
+    see remain. Rules that matched are added to the set ``hits``, if given.
+    """
+    claimed = []
+    for start, end, rule, m in matches(text, ruleset):
+        if any(start < e and s < end for s, e, _ in claimed):
+            continue
+        claimed.append((start, end, m.expand(rule.replacement)))
+        if hits is not None:
+            hits.add(rule)
+    if not claimed:
+        return text
+    out = []
+    done = 0
+    for start, end, replacement in sorted(claimed):
+        out.append(text[done:start])
+        out.append(replacement)
+        done = end
+    out.append(text[done:])
+    # Rules run in sequence, so a replacement can feed a later rule ("what
+    # the f*ck" -> "what the fudge" -> "what on earth"). The plain pass is
+    # idempotent on its own output, so one more run settles exactly those.
+    return ruleset.apply("".join(out), hits)
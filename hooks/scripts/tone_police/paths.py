@@ -0,0 +1,46 @@
+"""Per-user locations and dictionary sources shared by the hook and the tools."""
+
+import os
+
+
+def cache_dir(environ=None):
+    """Directory holding built artifacts."""
+    if environ is None:
+        environ = os.environ
+    explicit = environ.get("TONE_POLICE_CACHE_DIR")
+    if explicit:
+        return explicit
+    base = environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "tone-police")
+
+
+def state_dir(environ=None):
+    """Directory holding logs and other state worth keeping across runs."""
+    if environ is None:
+        environ = os.environ
+    base = environ.get("XDG_STATE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "state"
+    )
+    return os.path.join(base, "tone-police")
+
+
+def source_files(plugin_root, languages):
+    """The JSON files a (languages, intensity) artifact is built from."""
+    dictionaries = os.path.join(str(plugin_root), "dictionaries")
+    names = ["common-patterns"] + list(languages)
+    return [os.path.join(dictionaries, f"{name}.json") for name in names]
+
+
+def stat_signature(paths):
+    """Cheap change detector: mtime and size of every source file."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            parts.append(f"{path}:missing")
+        else:
+            parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+    return "\n".join(parts)
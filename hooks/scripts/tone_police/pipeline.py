@@ -0,0 +1,557 @@
+"""Config resolution, dictionary loading and the filter pipeline.
+
+Only ``os`` and ``sys`` are imported up front: a prompt that turns out to be
+empty, or a filter that is disabled, is answered without ever loading ``re``,
+``json`` or the rule machinery.
+"""
+
+import os
+import sys
+
+from . import jsonlite, tracing
+
+DEFAULT_PLUGIN_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+# (path, mtime_ns, size) -> parsed JSON. A one-shot hook process reads each
+# file once anyway; a long-lived daemon reuses the parse until the file changes.
+_json_cache = {}
+
+
+def _read_json(path):
+    """Parse a JSON file, reusing the previous parse if the file is unchanged."""
+    st = os.stat(path)
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    data = _json_cache.get(key)
+    if data is None:
+        with open(path) as f:
+            data = jsonlite.loads(f.read())
+        _json_cache[key] = data
+    return data
+
+
+def default_plugin_root():
+    """Plugin root to use when CLAUDE_PLUGIN_ROOT is not set.
+
+    Inside a zipapp build the dictionaries ship in the archive; they are
+    unpacked once into the cache directory so they can be stat()ed and mapped
+    like files in a checkout.
+    """
+    archive = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if os.path.isfile(archive):
+        from . import bundle
+
+        return bundle.unpacked_root(archive)
+    return DEFAULT_PLUGIN_ROOT
+
+
+def load_config(environ=None):
+    """Load config, checking project override first, then plugin default."""
+    if environ is None:
+        environ = os.environ
+    plugin_root = environ.get("CLAUDE_PLUGIN_ROOT") or default_plugin_root()
+    project_dir = environ.get("CLAUDE_PROJECT_DIR", "")
+
+    # Check for project-level override
+    if project_dir:
+        override = os.path.join(project_dir, ".claude", "tone-police.config.json")
+        if os.path.exists(override):
+            return _read_json(override), plugin_root
+
+    # Fall back to default config
+    default = os.path.join(plugin_root, "config", "default-config.json")
+    if os.path.exists(default):
+        return _read_json(default), plugin_root
+
+    # Hardcoded fallback
+    return {
+        "intensity": "moderate",
+        "languages": ["en"],
+        "enabled": True,
+        "preserve_code_blocks": True,
+        "log_transforms": False,
+    }, plugin_root
+
+
+def load_dictionary(plugin_root, language):
+    """Load a language dictionary file."""
+    dict_path = os.path.join(plugin_root, "dictionaries", f"{language}.json")
+    if os.path.exists(dict_path):
+        return _read_json(dict_path)
+    return None
+
+
+def load_common_patterns(plugin_root):
+    """Load cross-language common patterns."""
+    path = os.path.join(plugin_root, "dictionaries", "common-patterns.json")
+    if os.path.exists(path):
+        return _read_json(path)
+    return None
+
+
+# Fenced blocks, then inline code spans.
+CODE_PATTERN = r"(```[\s\S]*?```|`[^`\n]+`)"
+
+# Prompts longer than this (in characters) are filtered chunk by chunk; see
+# stream.py.
+STREAM_THRESHOLD = 1 << 20
+
+
+def split_code_blocks(text):
+    """Split ``text`` into alternating prose and code segments.
+
+    Returns:
+        A list of odd length: prose at even indices (possibly empty), code
+        blocks at odd indices. ``"".join()`` gives ``text`` back.
+    """
+    import re
+
+    return re.split(CODE_PATTERN, text)
+
+
+def protect_code_blocks(text):
+    """Extract and replace code blocks with placeholders.
+
+    The filter itself uses split_code_blocks(); placeholders are visible to
+    the rules (``(\\w)\\1{2,}`` shortens ``__CODE_BLOCK_1____CODE_BLOCK_2__``).
+    """
+    import re
+
+    blocks = []
+    pattern = re.compile(CODE_PATTERN)
+
+    def replacer(match):
+        blocks.append(match.group(0))
+        return f"__CODE_BLOCK_{len(blocks) - 1}__"
+
+    protected = pattern.sub(replacer, text)
+    return protected, blocks
+
+
+def restore_code_blocks(text, blocks):
+    """Restore code blocks from placeholders."""
+    for i, block in enumerate(blocks):
+        text = text.replace(f"__CODE_BLOCK_{i}__", block)
+    return text
+
+
+def get_intensity_patterns(dictionary, intensity):
+    """Get cumulative patterns for the given intensity level."""
+    patterns_by_category = {}
+    levels = ["light", "moderate", "strict"]
+    target_idx = levels.index(intensity) if intensity in levels else 1
+
+    for level in levels[: target_idx + 1]:
+        level_patterns = dictionary.get("patterns", {}).get(level, {})
+        for category, pattern_list in level_patterns.items():
+            if category not in patterns_by_category:
+                patterns_by_category[category] = []
+            patterns_by_category[category].extend(pattern_list)
+
+    return patterns_by_category
+
+
+def apply_common_patterns(text, common):
+    """Apply cross-language normalization patterns."""
+    import re
+
+    if not common:
+        return text
+
+    patterns = common.get("patterns", {})
+
+    # ALL CAPS normalization (4+ chars)
+    caps_config = patterns.get("caps_normalization", {})
+    if caps_config:
+        caps_pattern = caps_config.get("pattern", r"\b([A-Z]{4,})\b")
+        text = re.sub(caps_pattern, lambda m: m.group(0).lower(), text)
+
+    # Excessive punctuation
+    punct_config = patterns.get("excessive_punctuation", {})
+    if punct_config:
+        for p in punct_config.get("patterns", []):
+            text = re.sub(p["pattern"], p["replacement"], text)
+
+    # Repeated characters
+    repeat_config = patterns.get("repeated_characters", {})
+    if repeat_config:
+        text = re.sub(
+            repeat_config.get("pattern", r"(\w)\1{2,}"),
+            repeat_config.get("replacement", r"\1\1"),
+            text,
+        )
+
+    return text
+
+
+def apply_language_patterns(text, patterns_by_category):
+    """Apply language-specific replacement patterns."""
+    import re
+
+    for category, pattern_list in patterns_by_category.items():
+        for entry in pattern_list:
+            regex = entry["pattern"]
+            replacement = entry["replacement"]
+            flags = re.IGNORECASE if "i" in entry.get("flags", "i") else 0
+            text = re.sub(regex, replacement, text, flags=flags)
+    return text
+
+
+def configured_languages(config, plugin_root):
+    """The languages a config may run: its list, or the candidates for "auto".
+
+    With ``"languages": "auto"`` the candidates are ``auto_languages`` if set,
+    otherwise every dictionary installed.
+    """
+    languages = config.get("languages", ["en"])
+    if languages == "auto":
+        from . import detect
+
+        return config.get("auto_languages") or detect.available_languages(
+            plugin_root
+        )
+    return languages
+
+
+def select_languages(config, plugin_root, text):
+    """The languages to run over ``text``; see detect.py for "auto"."""
+    languages = configured_languages(config, plugin_root)
+    if config.get("languages") == "auto" and len(languages) > 1:
+        from . import detect
+
+        found = detect.detect(
+            text,
+            detect.profiles(plugin_root, languages),
+            config.get("language_confidence", detect.DEFAULT_CONFIDENCE),
+        )
+        if found:
+            return found
+    return languages
+
+
+def load_rules(config, plugin_root, text=None):
+    """The precompiled RuleSet for the config's languages and intensity.
+
+    With ``"languages": "auto"``, passing ``text`` narrows the languages to
+    the ones detected in it; without it every candidate is loaded.
+    """
+    from . import artifact
+
+    intensity = config.get("intensity", "moderate")
+    if text is None:
+        languages = configured_languages(config, plugin_root)
+    else:
+        languages = select_languages(config, plugin_root, text)
+    with tracing.span("load rules", languages=list(languages), intensity=intensity):
+        return artifact.load_ruleset(plugin_root, languages, intensity)
+
+
+def apply_rules(text, ruleset, preserve_code=True, hits=None, normalize=False):
+    """Filter ``text`` with ``ruleset``, leaving code blocks untouched.
+
+    Each prose segment between code blocks is filtered on its own, so no
+    rule ever sees (or matches across) code. With ``normalize``, obfuscated
+    spellings (``f*ck``, ``ｆｕｃｋ``) are caught too; see normalize.py. Rules
+    that matched are added to the set ``hits``, if given.
+    """
+    apply = ruleset.apply
+    if tracing.current() is not None:
+
+        def apply(prose, hits):
+            return tracing.apply(ruleset, prose, hits)
+
+    if normalize:
+        from . import normalize as _normalize
+
+        rules_apply = apply
+
+        def apply(prose, hits):
+            prose = rules_apply(prose, hits)
+            with tracing.span("obfuscation"):
+                return _normalize.apply(prose, ruleset, hits)
+
+    if not preserve_code:
+        return apply(text, hits)
+    with tracing.span("code blocks"):
+        segments = split_code_blocks(text)
+    if len(segments) == 1:
+        return apply(text, hits)
+    # Apply common patterns, then language-specific patterns, to the prose
+    segments[::2] = [
+        apply(prose, hits) if prose else prose for prose in segments[::2]
+    ]
+    return "".join(segments)
+
+
+def filter_text(text, config, plugin_root, ruleset=None, hits=None, record=None):
+    """Run the full filter pipeline over a prompt and return the result.
+
+    ``ruleset`` skips the (memoized) RuleSet lookup for callers that filter
+    many prompts with one config. Rules that matched are added to the set
+    ``hits``, if given. ``record`` is the session's incremental.Record, if any.
+    """
+    if ruleset is None:
+        ruleset = load_rules(config, plugin_root, text)
+    preserve_code = config.get("preserve_code_blocks", True)
+    normalize = config.get("normalize_obfuscation", True)
+    if record is not None:
+        clean_known = config.get("block_severity") is None
+        return record.filter(
+            text, ruleset, preserve_code, normalize, hits, clean_known
+        )
+    if len(text) > STREAM_THRESHOLD:
+        # Huge pastes (logs, traces) go through in chunks, so the rewrites
+        # never hold more than a few copies of one chunk at a time.
+        from .stream import StreamFilter
+
+        stream = StreamFilter(ruleset, preserve_code, hits=hits, normalize=normalize)
+        step = stream.chunk_size
+        out = [stream.feed(text[i : i + step]) for i in range(0, len(text), step)]
+        out.append(stream.close())
+        return "".join(out)
+    return apply_rules(text, ruleset, preserve_code, hits, normalize)
+
+
+def render_response(config, text, categories=None):
+    """Format the hook's stdout for a prompt that was rewritten to ``text``.
+
+    In block mode ``text`` may be None, when no suggestion was computed; the
+    reason then names the matched ``categories`` instead.
+    """
+    mode = config.get("mode", "rewrite")
+    if mode == "block":
+        import json
+
+        if text is None:
+            found = ", ".join(sorted(set(categories or ())))
+            reason = f"Your message was blocked by tone-police ({found})."
+        else:
+            reason = (
+                "Your message was blocked by tone-police. "
+                f'Suggested rephrasing: "{text}"'
+            )
+        return json.dumps({"decision": "block", "reason": reason}) + "\n"
+    # Plain text stdout is injected as additional context
+    return (
+        f"[TONE-POLICE] The user's original message contained hostile/profane language. "
+        f"Rewritten for tone (original intent preserved): {text}\n"
+    )
+
+
+def block_response(prompt, config, plugin_root, hits=None, record=None):
+    """The hook's output for ``prompt`` in block mode; see block_decision()."""
+    matches, text = block_decision(prompt, config, plugin_root, hits, record)
+    if not matches:
+        return ""
+    return render_response(config, text, [m.rule.category for m in matches])
+
+
+def block_decision(prompt, config, plugin_root, hits=None, record=None):
+    """Whether block mode stops ``prompt``, and the suggestion it offers.
+
+    A scan that stops at the first match decides; only a prompt that is
+    blocked pays for the rewrite, and only while ``block_suggestion`` is on.
+    ``hits`` gets the matching rule, plus every rule of the rewrite if one ran.
+    With the session's incremental.Record, unchanged pieces of the last prompt
+    are neither scanned nor rewritten again.
+
+    Returns:
+        ``(matches, text)``: the scan.Match objects that block the prompt
+        (empty when it passes) and the rewrite, None when none was made.
+    """
+    from .scan import scan_text
+
+    ruleset = load_rules(config, plugin_root, prompt)
+    with tracing.span("scan"):
+        if record is None:
+            matches = scan_text(prompt, config, plugin_root, ruleset, first=True)
+        else:
+            matches = record.scan(
+                prompt,
+                ruleset,
+                config.get("preserve_code_blocks", True),
+                config.get("normalize_obfuscation", True),
+                config.get("block_severity"),
+            )
+    if not matches:
+        return [], None
+    if hits is not None:
+        hits.update(m.rule for m in matches)
+    if not config.get("block_suggestion", True):
+        return matches, None
+    text = filter_text(prompt, config, plugin_root, ruleset, hits, record)
+    if text == prompt:
+        return [], text  # every match was replaced by itself
+    return matches, text
+
+
+def handle(raw, environ=None):
+    """Process one raw hook payload and return what the hook should print.
+
+    Args:
+        raw: The JSON document Claude Code wrote to the hook's stdin.
+        environ: Environment to resolve config from; defaults to os.environ.
+
+    Returns:
+        The text for stdout, or an empty string when nothing should be printed.
+    """
+    from time import perf_counter
+
+    started = perf_counter()
+    tracer = None
+    if tracing.current() is None:
+        tracer = tracing.from_environ(os.environ if environ is None else environ)
+    if tracer is None:
+        return _handle(raw, environ, started)
+    tracer.start()
+    try:
+        return _handle(raw, environ, started)
+    finally:
+        tracer.add("handle", started, perf_counter())
+        tracer.finish()
+
+
+def _handle(raw, environ, started):
+    with tracing.span("parse"):
+        try:
+            input_data = jsonlite.loads(raw)
+        except ValueError:
+            return ""
+
+    user_prompt = input_data.get("prompt", "")
+    if not user_prompt:
+        return ""
+    session_id = input_data.get("session_id")
+
+    try:
+        with tracing.span("config"):
+            config, plugin_root = load_config(environ)
+    except Exception as e:
+        import json
+
+        # Output error as context so we can debug
+        return (
+            json.dumps(
+                {"additionalContext": f"[TONE-POLICE ERROR] Config load failed: {e}"}
+            )
+            + "\n"
+        )
+
+    if not config.get("enabled", True):
+        return ""
+
+    if not config.get("trace", False) or tracing.current() is not None:
+        return _respond(user_prompt, session_id, config, plugin_root, environ, started)
+    from time import perf_counter
+
+    tracer = tracing.from_config(config, environ).start()
+    tracer.add("parse+config", started, perf_counter())
+    try:
+        return _respond(user_prompt, session_id, config, plugin_root, environ, started)
+    finally:
+        tracer.add("handle", started, perf_counter())
+        tracer.finish()
+
+
+def _respond(user_prompt, session_id, config, plugin_root, environ, started):
+    """The output for a prompt once the config is known."""
+    metrics = None
+    if config.get("metrics", False):
+        from .metrics import Run
+
+        metrics = Run(config, environ, started)
+        metrics.stage("config")
+
+    log = config.get("log_transforms", False)
+    mode = config.get("mode", "rewrite")
+    tracer = tracing.current()
+    if tracer is not None:
+        tracer.info.update(chars=len(user_prompt), mode=mode)
+    cache = None
+    # A cached answer would skip the audit record, so logging bypasses it.
+    if config.get("result_cache", False) and not log:
+        from . import resultcache
+
+        with tracing.span("cache"):
+            cache = resultcache.for_config(config, environ)
+            key = cache.key(user_prompt, config, plugin_root)
+            cached = cache.get(key)
+        if metrics is not None:
+            metrics.stage("cache")
+            metrics.cache = "miss" if cached is None else "hit"
+        if tracer is not None:
+            tracer.info["cache"] = "miss" if cached is None else "hit"
+        if cached is not None:
+            if metrics is not None:
+                decision = cached[0] if cached[1] else "clean"
+                metrics.finish(decision)
+            return cached[1]
+
+    record = None
+    if config.get("incremental", False):
+        from . import incremental
+
+        with tracing.span("incremental"):
+            record = incremental.for_prompt(
+                config, plugin_root, environ, session_id, user_prompt
+            )
+
+    hits = set() if log or metrics is not None else None
+    if mode == "block":
+        with tracing.span("filter"):
+            matches, text = block_decision(
+                user_prompt, config, plugin_root, hits, record
+            )
+        if metrics is not None:
+            metrics.stage("filter")
+        output = ""
+        if matches:
+            if log:
+                from . import audit
+
+                with tracing.span("log"):
+                    audit.log_transform(config, environ, user_prompt, text, hits)
+                if metrics is not None:
+                    metrics.stage("log")
+            with tracing.span("render"):
+                categories = [m.rule.category for m in matches]
+                output = render_response(config, text, categories)
+    else:
+        with tracing.span("filter"):
+            text = filter_text(user_prompt, config, plugin_root, None, hits, record)
+        if metrics is not None:
+            metrics.stage("filter")
+
+        # Output only if text was modified
+        output = ""
+        if text != user_prompt:
+            if log:
+                from . import audit
+
+                with tracing.span("log"):
+                    audit.log_transform(config, environ, user_prompt, text, hits)
+                if metrics is not None:
+                    metrics.stage("log")
+            with tracing.span("render"):
+                output = render_response(config, text)
+    if cache is not None:
+        decision = mode if output else "allow"
+        with tracing.span("cache"):
+            cache.put(key, decision, output)
+    if record is not None:
+        with tracing.span("incremental"):
+            record.save()
+        if tracer is not None:
+            tracer.info.update(reused=record.reused, fresh=record.fresh)
+    if tracer is not None:
+        tracer.info["decision"] = mode if output else "clean"
+    if metrics is not None:
+        with tracing.span("metrics"):
+            metrics.finish(mode if output else "clean", {r.category for r in hits})
+    return output
+
+
+def main():
+    sys.stdout.write(handle(sys.stdin.read()))
+    sys.exit(0)
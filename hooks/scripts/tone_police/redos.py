@@ -0,0 +1,393 @@
+"""ReDoS audit for dictionary rules.
+
+Two checks per rule, for every entry of every ``dictionaries/*.json`` at
+strict intensity plus common-patterns.json:
+
+* A static scan of the parsed regex for the shapes behind catastrophic
+  backtracking: a quantifier nested inside another (``(a+)+``), a repeated
+  alternation whose branches can start alike (``(foo|f\\w)*``), and adjacent
+  quantifiers over overlapping characters (``\\w+\\w+``). Nested shapes are
+  exponential and are never executed; the others are reported.
+* An adversarial benchmark. Attack strings are generated from the pattern
+  itself: a matching prefix, one quantified item pumped to fill the input,
+  then a character that makes the rest fail (``fffff...uuuu!`` for
+  ``f+u+c+k+``). Each attack runs at doubling sizes up to the target size;
+  the slowest time at that size is compared with the budget, and the growth
+  between the last two sizes shows whether the rule is super-linear.
+
+``tone-filter.py --redos`` prints the findings and exits 1 when a rule
+is over budget; the test suite runs the same audit.
+"""
+
+import os
+import sys
+
+from .analysis import _charset, sre_c, sre_parse
+
+DEFAULT_SIZE_KB = 16
+DEFAULT_BUDGET_MS = 50.0
+
+# Growth between the last two doublings above which a rule counts as
+# super-linear (2 is linear, 4 quadratic), once it takes at least
+# MIN_MEASURABLE_MS.
+SUPERLINEAR_RATIO = 3.0
+MIN_MEASURABLE_MS = 5.0
+
+_REPEATS = (sre_c.MAX_REPEAT, sre_c.MIN_REPEAT)
+_PROBE = "aAzZfF0_ \t\n!?.-éß"
+_SUFFIXES = ("", "!", " ", "x", "0", "\x00")
+
+
+class Finding:
+    """The audit result for one rule.
+
+    Attributes:
+        rule: The audited Rule.
+        static: Shapes found by the static scan, e.g. "nested quantifier".
+        worst_ms: Slowest attack at the target size, or None if not run.
+        growth: worst_ms over the same attack at half the size, or None.
+        attack: The slowest attack string, truncated for display.
+    """
+
+    def __init__(self, rule, static):
+        self.rule = rule
+        self.static = static
+        self.worst_ms = None
+        self.growth = None
+        self.attack = None
+
+    @property
+    def exponential(self):
+        return any(shape in EXPONENTIAL for shape in self.static)
+
+    @property
+    def superlinear(self):
+        return (
+            self.growth is not None
+            and self.growth > SUPERLINEAR_RATIO
+            and self.worst_ms >= MIN_MEASURABLE_MS
+        )
+
+    def over_budget(self, budget_ms):
+        if self.exponential:
+            return True
+        return self.worst_ms is not None and self.worst_ms > budget_ms
+
+    def __repr__(self):
+        return f"Finding({self.rule.id!r}, {self.static!r}, {self.worst_ms!r})"
+
+
+NESTED = "nested quantifier"
+ALTERNATION = "repeated alternation with overlapping branches"
+ADJACENT = "adjacent quantifiers over overlapping characters"
+EXPONENTIAL = (NESTED, ALTERNATION)
+
+
+def _parse(pattern, flags):
+    return sre_parse.parse(pattern, flags)
+
+
+def _first_items(seq):
+    """Character items a match of ``seq`` can start with (None: unknown)."""
+    for op, av in seq:
+        if op is sre_c.AT:
+            continue
+        if op in (sre_c.LITERAL, sre_c.NOT_LITERAL, sre_c.IN, sre_c.ANY):
+            return [(op, av)]
+        if op is sre_c.SUBPATTERN:
+            return _first_items(av[3])
+        if op in _REPEATS:
+            if av[0] == 0:
+                return None  # optional: whatever follows could start too
+            return _first_items(av[2])
+        if op is sre_c.BRANCH:
+            out = []
+            for branch in av[1]:
+                first = _first_items(branch)
+                if first is None:
+                    return None
+                out += first
+            return out
+        return None
+    return None
+
+
+def _probe_for(av):
+    """Probe characters plus the literals an item mentions."""
+    probe = set(_PROBE)
+    if isinstance(av, int):
+        probe.add(chr(av))
+    elif isinstance(av, list):
+        for item_op, item_av in av:
+            if item_op is sre_c.LITERAL:
+                probe.add(chr(item_av))
+            elif item_op is sre_c.RANGE:
+                probe.add(chr(item_av[0]))
+    return probe
+
+
+def _branches(seq):
+    """Alternative lists directly inside ``seq``, looking through groups."""
+    out = []
+    for op, av in seq:
+        if op is sre_c.SUBPATTERN:
+            out += _branches(av[3])
+        elif op is sre_c.BRANCH:
+            out.append(av[1])
+    return out
+
+
+def static_findings(pattern, flags=0):
+    """Backtracking-prone shapes in ``pattern``, as a sorted list of names."""
+    try:
+        parsed = _parse(pattern, flags)
+    except Exception:
+        return []
+    ignorecase = bool(flags & sre_c.SRE_FLAG_IGNORECASE)
+    found = set()
+
+    def overlaps(a, b):
+        first_a = _first_items(a)
+        first_b = _first_items(b)
+        if first_a is None or first_b is None:
+            return True
+        sets_a = [_charset(op, av, ignorecase) for op, av in first_a]
+        sets_b = [_charset(op, av, ignorecase) for op, av in first_b]
+        if None in sets_a or None in sets_b:
+            return True
+        probe = set()
+        for op, av in first_a + first_b:
+            probe |= _probe_for(av)
+        return any(
+            any(c.matches(ch) for c in sets_a) and any(c.matches(ch) for c in sets_b)
+            for ch in probe
+        )
+
+    def walk(seq, repeated):
+        previous = None  # body of a directly preceding variable repeat
+        for op, av in seq:
+            if op is sre_c.AT:
+                continue
+            if op not in _REPEATS:
+                if op is sre_c.SUBPATTERN:
+                    walk(av[3], repeated)
+                elif op is sre_c.BRANCH:
+                    for branch in av[1]:
+                        walk(branch, repeated)
+                previous = None
+                continue
+            lo, hi, body = av
+            many = hi is sre_c.MAXREPEAT or hi > 1
+            if repeated and hi is sre_c.MAXREPEAT:
+                found.add(NESTED)
+            if many and any(
+                overlaps(a, b)
+                for branches in _branches(body)
+                for i, a in enumerate(branches)
+                for b in branches[i + 1 :]
+            ):
+                found.add(ALTERNATION)
+            if (
+                previous is not None
+                and hi is sre_c.MAXREPEAT
+                and overlaps(previous, body)
+            ):
+                found.add(ADJACENT)
+            walk(body, repeated or many)
+            previous = body if lo != hi else None
+
+    walk(list(parsed), False)
+    return sorted(found)
+
+
+# ---------------------------------------------------------------------------
+# Attack generation
+# ---------------------------------------------------------------------------
+
+
+def _sample(op, av, ignorecase):
+    chars = _charset(op, av, ignorecase)
+    if chars is None:
+        return "a"
+    for ch in sorted(_probe_for(av)):
+        if chars.matches(ch):
+            return ch
+    return "a"
+
+
+def _example(seq, ignorecase, groups):
+    """A short string matching ``seq`` (best effort)."""
+    out = []
+    for op, av in seq:
+        if op in (sre_c.LITERAL, sre_c.NOT_LITERAL, sre_c.IN, sre_c.ANY):
+            out.append(_sample(op, av, ignorecase))
+        elif op is sre_c.SUBPATTERN:
+            text = _example(av[3], ignorecase, groups)
+            if av[0] is not None:
+                groups[av[0]] = text
+            out.append(text)
+        elif op in _REPEATS:
+            out.append(_example(av[2], ignorecase, groups) * av[0])
+        elif op is sre_c.BRANCH:
+            out.append(_example(av[1][0], ignorecase, groups))
+        elif op is sre_c.GROUPREF:
+            out.append(groups.get(av, ""))
+        elif op is sre_c.GROUPREF_EXISTS:
+            out.append(_example(av[1], ignorecase, groups))
+    return "".join(out)
+
+
+def _pumps(seq, ignorecase, groups):
+    """(one iteration, items before, items after) for each repeat, any depth."""
+    for i, (op, av) in enumerate(seq):
+        before = _example(seq[:i], ignorecase, dict(groups))
+        if op in _REPEATS:
+            pump = _example(av[2], ignorecase, dict(groups))
+            if pump:
+                yield before, pump, seq[i + 1 :]
+            inner = _pumps(av[2], ignorecase, groups)
+        elif op is sre_c.SUBPATTERN:
+            inner = _pumps(av[3], ignorecase, groups)
+        else:
+            continue
+        for prefix, pump, _ in inner:
+            yield before + prefix, pump, seq[i + 1 :]
+
+
+def attacks(pattern, flags, size):
+    """Adversarial inputs of about ``size`` characters for ``pattern``."""
+    parsed = list(_parse(pattern, flags))
+    ignorecase = bool(flags & sre_c.SRE_FLAG_IGNORECASE)
+    groups = {}
+    full = _example(parsed, ignorecase, groups)
+    out = set()
+    if full:
+        out.add((full * size)[:size])
+        out.add(((full[:-1] + " ") * size)[:size])
+    for prefix, pump, rest in _pumps(parsed, ignorecase, groups):
+        tail = _example(rest, ignorecase, dict(groups))
+        body = pump * (size // len(pump) + 1)
+        for suffix in _SUFFIXES + (tail[:-1],):
+            out.add((prefix + body)[: size - len(suffix)] + suffix)
+        # Many short near-misses rather than one long one.
+        near_miss = prefix + pump * 8 + "!"
+        out.add((near_miss * (size // len(near_miss) + 1))[:size])
+    if ignorecase:
+        out |= {text.upper() for text in list(out)}
+    return sorted(out)
+
+
+# ---------------------------------------------------------------------------
+# Audit
+# ---------------------------------------------------------------------------
+
+
+def dictionary_rules(plugin_root):
+    """Every rule of every dictionary at strict intensity, plus the common ones."""
+    from . import pipeline, rules
+
+    out = rules._common_rules(pipeline.load_common_patterns(plugin_root))
+    directory = os.path.join(plugin_root, "dictionaries")
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json") or name == "common-patterns.json":
+            continue
+        language = name[: -len(".json")]
+        dictionary = pipeline.load_dictionary(plugin_root, language)
+        out += rules._language_rules(dictionary, language, "strict")
+    return out
+
+
+def _time_ms(rule, text, repeat=3):
+    import time
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rule.apply(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def audit_rule(rule, size_kb=DEFAULT_SIZE_KB, budget_ms=DEFAULT_BUDGET_MS):
+    """Statically scan and benchmark one rule; returns a Finding."""
+    finding = Finding(rule, static_findings(rule.pattern, rule.flags))
+    if finding.exponential:
+        return finding  # running it is the denial of service
+    target = size_kb * 1024
+    finding.worst_ms = 0.0
+    for attack in attacks(rule.pattern, rule.flags, target):
+        size = 1024
+        previous = None
+        while True:
+            text = attack[:size] if size < target else attack
+            elapsed = _time_ms(rule, text)
+            if size >= target or elapsed > budget_ms:
+                break
+            previous = elapsed
+            size *= 2
+        if elapsed >= finding.worst_ms:
+            finding.worst_ms = elapsed
+            finding.attack = text[:40]
+            finding.growth = elapsed / previous if previous else None
+    return finding
+
+
+def audit(plugin_root=None, size_kb=DEFAULT_SIZE_KB, budget_ms=DEFAULT_BUDGET_MS):
+    """Audit every dictionary rule, one Finding per unique pattern."""
+    from . import pipeline
+
+    seen = {}
+    for rule in dictionary_rules(str(plugin_root or pipeline.DEFAULT_PLUGIN_ROOT)):
+        key = (rule.pattern, rule.flags, rule.action)
+        if key not in seen:
+            seen[key] = audit_rule(rule, size_kb, budget_ms)
+    return list(seen.values())
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --redos``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --redos",
+        description="Scan and benchmark dictionary rules for ReDoS.",
+    )
+    parser.add_argument(
+        "--size-kb",
+        type=int,
+        default=DEFAULT_SIZE_KB,
+        help="attack input size in KB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="worst-case time allowed per rule (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="list every rule, not just findings"
+    )
+    args = parser.parse_args(argv)
+
+    findings = audit(size_kb=args.size_kb, budget_ms=args.budget_ms)
+    failed = 0
+    for finding in sorted(findings, key=lambda f: -(f.worst_ms or float("inf"))):
+        over = finding.over_budget(args.budget_ms)
+        failed += over
+        notes = list(finding.static)
+        if finding.superlinear:
+            notes.append(f"super-linear (x{finding.growth:.1f} per doubling)")
+        if not (over or notes or args.all):
+            continue
+        worst = "not run" if finding.worst_ms is None else f"{finding.worst_ms:.2f} ms"
+        status = "FAIL" if over else "ok  "
+        print(f"{status} {worst:>10}  {finding.rule.id}  {finding.rule.pattern}")
+        for note in notes:
+            print(f"{'':16}{note}")
+    print(
+        f"{len(findings)} patterns, {failed} over {args.budget_ms:g} ms "
+        f"at {args.size_kb} KB",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
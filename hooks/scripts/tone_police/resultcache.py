@@ -0,0 +1,327 @@
+"""Persistent prompt-result cache, enabled with ``"result_cache": true``.
+
+A retried or resubmitted prompt gets the same answer, so the hook's output is
+stored on disk under a hash of everything that decides it: the prompt, the
+effective config, the plugin root and the stat signature of the dictionaries
+in use. A repeat is then answered with one file read and no regex work;
+editing a dictionary or the config simply stops old entries from matching.
+
+One file per entry (``results/ab/abcdef...``), written to a temporary name
+and renamed into place, so concurrent hook processes never see a partial
+entry. A hit bumps the file's mtime, which makes the mtime order an LRU
+order: every EVICT_EVERY misses the directory is scanned and the least
+recently used entries are deleted until it fits in ``result_cache_max_bytes``.
+
+Entries hold prompt text, so the cache directory is 0700 and every entry
+0600, whatever the umask.
+
+Hits and misses are counted by appending one byte to ``hits`` or ``misses``;
+``O_APPEND`` keeps concurrent increments whole without a lock. Once a
+journal reaches COMPACT_BYTES it is renamed aside and added to the totals in
+``counts``, under a lock (locks.py), so the journals stay small. A count is
+its total plus its journal's size; an increment racing the rename can be
+lost. ``tone-filter.py --result-cache`` prints them.
+
+Config keys:
+    result_cache: Turn the cache on (default false; entries hold prompt text).
+    result_cache_max_bytes: Size bound for stored entries (default 16 MiB).
+"""
+
+import os
+
+from .paths import cache_dir, source_files, stat_signature
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# Bump when a change to the filter changes its output for the same inputs.
+FORMAT_VERSION = 4
+
+# Misses between eviction scans; a miss is also what adds an entry.
+EVICT_EVERY = 64
+
+# Eviction trims to this fraction of the bound so the next scans are no-ops.
+EVICT_TO = 0.8
+
+# Size of a counter journal, in increments, at which it is folded into
+# ``counts``; a multiple of EVICT_EVERY.
+COMPACT_BYTES = 4096
+
+COUNTERS = ("hits", "misses")
+
+_counter_flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+
+
+class ResultCache:
+    """On-disk LRU map from a prompt key to (decision, hook output).
+
+    Attributes:
+        directory: Where entries and counters live.
+        max_bytes: Size bound enforced by eviction.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._misses = 0
+        self._private = False
+
+    def key(self, prompt, config, plugin_root):
+        """Hex digest identifying the result for ``prompt`` under ``config``."""
+        try:
+            from _blake2 import blake2b  # skips hashlib's OpenSSL import
+        except ImportError:
+            from hashlib import blake2b
+
+        from .pipeline import configured_languages
+
+        sources = source_files(plugin_root, configured_languages(config, plugin_root))
+        h = blake2b(digest_size=20)
+        # repr, not json: the json import alone costs more than a cache hit.
+        settings = (FORMAT_VERSION, str(plugin_root), sorted(config.items()))
+        h.update(repr(settings).encode())
+        h.update(b"\0")
+        h.update(stat_signature(sources).encode())
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, "results", key[:2], key)
+
+    def _ensure_directory(self):
+        """Create the cache directory 0700, tightening one made before."""
+        if self._private:
+            return
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if os.stat(self.directory).st_mode & 0o077:
+            os.chmod(self.directory, 0o700)
+        self._private = True
+
+    def get(self, key):
+        """The stored (decision, output) for ``key``, or None; counts the lookup."""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self._misses = self._count("misses")
+            return None
+        self._count("hits")
+        decision, _, output = data.partition("\n")
+        return decision, output
+
+    def put(self, key, decision, output):
+        """Store a result; errors are ignored, the cache is only a shortcut.
+
+        Every EVICT_EVERY-th miss counted by this process also runs eviction.
+        """
+        import threading
+
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._ensure_directory()
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(f"{decision}\n{output}")
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        if self._misses and self._misses % EVICT_EVERY == 0:
+            self.evict()
+
+    def _count(self, name):
+        """Add one to counter ``name``.
+
+        Returns:
+            The size of its journal, which grows by one per call until it is
+            folded away; 0 on error.
+        """
+        try:
+            self._ensure_directory()
+            fd = os.open(os.path.join(self.directory, name), _counter_flags, 0o600)
+            try:
+                os.write(fd, b".")
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+        except OSError:
+            return 0
+        if size >= COMPACT_BYTES:
+            self._compact(name)
+        return size
+
+    def _lock(self, blocking=True):
+        from .locks import FileLock
+
+        return FileLock(os.path.join(self.directory, "counts.lock"), blocking)
+
+    def _totals(self):
+        import json
+
+        try:
+            with open(os.path.join(self.directory, "counts"), encoding="utf-8") as f:
+                totals = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return totals if isinstance(totals, dict) else {}
+
+    def _compact(self, name):
+        """Move the journal of counter ``name`` into ``counts``.
+
+        Skipped when another process holds the lock; it is folding anyway.
+        """
+        import json
+        import threading
+
+        journal = os.path.join(self.directory, name)
+        folding = journal + ".folding"
+        counts = os.path.join(self.directory, "counts")
+        tmp = f"{counts}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self._lock(blocking=False) as held:
+                if not held:
+                    return
+                # New increments start a fresh journal from here on.
+                os.replace(journal, folding)
+                totals = self._totals()
+                totals[name] = totals.get(name, 0) + os.stat(folding).st_size
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with open(fd, "w", encoding="utf-8") as f:
+                    json.dump(totals, f)
+                os.replace(tmp, counts)
+                os.unlink(folding)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def counts(self):
+        """{counter: value} for hits and misses."""
+
+        def journal(name):
+            try:
+                return os.stat(os.path.join(self.directory, name)).st_size
+            except OSError:
+                return 0
+
+        try:
+            lock = self._lock()
+            held = lock.acquire()
+        except OSError:
+            lock, held = None, False  # no directory yet, or read-only
+        try:
+            totals = self._totals()
+            return {name: int(totals.get(name, 0)) + journal(name) for name in COUNTERS}
+        finally:
+            if held:
+                lock.release()
+
+    def _entries(self):
+        """(mtime, size, path) of every stored entry."""
+        out = []
+        root = os.path.join(self.directory, "results")
+        try:
+            shards = list(os.scandir(root))
+        except OSError:
+            return out
+        for shard in shards:
+            try:
+                for entry in os.scandir(shard.path):
+                    st = entry.stat()
+                    out.append((st.st_mtime_ns, st.st_size, entry.path))
+            except OSError:
+                continue  # evicted or cleared under us
+        return out
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its bound.
+
+        Returns:
+            The number of entries removed.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """Counters and current size, as a dict."""
+        counts = self.counts()
+        entries = self._entries()
+        return {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        import shutil
+
+        shutil.rmtree(os.path.join(self.directory, "results"), ignore_errors=True)
+        for name in COUNTERS + ("counts",):
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def for_config(config, environ=None):
+    """The ResultCache for the config's settings."""
+    return ResultCache(
+        os.path.join(cache_dir(environ), "result-cache"),
+        int(config.get("result_cache_max_bytes", DEFAULT_MAX_BYTES)),
+    )
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --result-cache``."""
+    import argparse
+    import json
+    import sys
+
+    from . import pipeline
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --result-cache",
+        description="Show or clear the persistent prompt-result cache.",
+    )
+    parser.add_argument("--clear", action="store_true", help="remove every entry")
+    parser.add_argument(
+        "--evict", action="store_true", help="trim to the size bound now"
+    )
+    args = parser.parse_args(argv)
+
+    config, _ = pipeline.load_config()
+    cache = for_config(config)
+    if args.clear:
+        cache.clear()
+    elif args.evict:
+        cache.evict()
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["enabled"] = bool(config.get("result_cache", False))
+    sys.stdout.write(json.dumps(stats, indent=2, sort_keys=True) + "\n")
+    return 0
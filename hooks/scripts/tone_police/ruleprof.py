@@ -0,0 +1,322 @@
+"""Per-rule cost and hit-rate profiler for the dictionaries.
+
+``tone-filter.py --profile-rules`` runs a corpus through the rules one at a
+time, in execution order, and reports for every rule how often it matched,
+how often it changed the text and how much time it cost::
+
+    python3 hooks/scripts/tone-filter.py --profile-rules prompts.jsonl logs/
+    python3 hooks/scripts/tone-filter.py --profile-rules --json report.json
+
+Time is counted the way the engine pays it: a rule whose anchors are absent
+from the text is skipped, and its would-be cost is only in ``ungated_ms``.
+Layers merge rules into shared scans, so the totals are an upper bound on
+what the hook spends; the ranking is what matters for pruning.
+
+Every rule gets a status:
+
+* ``active``: changed the text at least once.
+* ``dead``: never matched the corpus at all.
+* ``preempted``: matched the original prompt, but an earlier rule had always
+  rewritten the match by the time this one ran.
+* ``noop``: matched at its turn, but its replacement never changed the text.
+* ``shadowed``: left out by the dictionary compiler, which proved the case
+  above for every input (see analysis.find_redundant).
+"""
+
+import sys
+
+from . import pipeline
+from .rules import ACTION_LOWERCASE, LEVELS, _lowercase_match
+
+SORT_KEYS = ("time_ms", "ungated_ms", "hits", "changed", "us_per_kb", "id")
+
+
+class RuleStats:
+    """What one rule did over a corpus.
+
+    Attributes:
+        rule: The Rule.
+        hits: Matches at the rule's turn, i.e. after every earlier rule.
+        changed: Prose segments the rule changed.
+        original_hits: Matches in the unfiltered prose.
+        time_ns: Time spent where the anchors let the rule run.
+        ungated_ns: Time spent if the rule always ran.
+        skipped: Segments the anchors let the engine skip.
+        shadowed_by: The earlier Rule, for rules the compiler left out.
+    """
+
+    __slots__ = (
+        "rule",
+        "hits",
+        "changed",
+        "original_hits",
+        "time_ns",
+        "ungated_ns",
+        "skipped",
+        "shadowed_by",
+    )
+
+    def __init__(self, rule, shadowed_by=None):
+        self.rule = rule
+        self.hits = 0
+        self.changed = 0
+        self.original_hits = 0
+        self.time_ns = 0
+        self.ungated_ns = 0
+        self.skipped = 0
+        self.shadowed_by = shadowed_by
+
+    @property
+    def status(self):
+        if self.shadowed_by is not None:
+            return "shadowed"
+        if self.changed:
+            return "active"
+        if self.hits:
+            return "noop"
+        if self.original_hits:
+            return "preempted"
+        return "dead"
+
+    def to_dict(self, kb):
+        rule = self.rule
+        time_ms = self.time_ns / 1e6
+        return {
+            "id": rule.id,
+            "language": rule.language,
+            "level": rule.level,
+            "category": rule.category,
+            "pattern": rule.pattern,
+            "status": self.status,
+            "hits": self.hits,
+            "changed": self.changed,
+            "original_hits": self.original_hits,
+            "time_ms": round(time_ms, 4),
+            "ungated_ms": round(self.ungated_ns / 1e6, 4),
+            "us_per_kb": round(time_ms * 1000 / kb, 4) if kb else None,
+            "skipped": self.skipped,
+            "shadowed_by": self.shadowed_by and self.shadowed_by.id,
+        }
+
+
+def _count(regex, text):
+    return sum(1 for _ in regex.finditer(text))
+
+
+def profile(prompts, ruleset, preserve_code=True, repeat=3):
+    """Run ``prompts`` through ``ruleset`` rule by rule, measuring each.
+
+    Args:
+        prompts: Iterable of prompt strings.
+        ruleset: The RuleSet; one from rules.build_ruleset() also reports the
+            rules it left out as shadowed.
+        preserve_code: Leave code blocks out, like the config option.
+        repeat: Each substitution is timed this many times; the best counts.
+
+    Returns:
+        (list of RuleStats in execution order, characters of prose profiled)
+    """
+    from time import perf_counter_ns
+
+    from .folding import fold_text
+
+    rules = ruleset.rules
+    sequence = ruleset.sequence
+    stats = {}
+    for i in sequence:
+        stats.setdefault(i, RuleStats(rules[i]))
+    chars = 0
+    for prompt in prompts:
+        segments = [prompt]
+        if preserve_code:
+            segments = pipeline.split_code_blocks(prompt)[::2]
+        for text in segments:
+            if not text:
+                continue
+            chars += len(text)
+            for i, s in stats.items():
+                s.original_hits += _count(rules[i].regex, text)
+            folded = None
+            for i in sequence:
+                rule = rules[i]
+                s = stats[i]
+                if folded is None:
+                    folded = fold_text(text)
+                anchors = rule.anchors
+                gated = anchors is not None and not any(a in folded for a in anchors)
+                replacement = rule.replacement
+                if rule.action == ACTION_LOWERCASE:
+                    replacement = _lowercase_match
+                best = None
+                for _ in range(repeat):
+                    start = perf_counter_ns()
+                    rewritten, n = rule.regex.subn(replacement, text)
+                    elapsed = perf_counter_ns() - start
+                    if best is None or elapsed < best:
+                        best = elapsed
+                s.ungated_ns += best
+                if gated:
+                    s.skipped += 1
+                else:
+                    s.time_ns += best
+                s.hits += n
+                if rewritten != text:
+                    s.changed += 1
+                    text = rewritten
+                    folded = None
+    out = list(stats.values())
+    out += [
+        RuleStats(rule, shadowed_by=by)
+        for kind, rule, by in ruleset.redundant
+        if kind != "duplicate"  # a level repeating a lower one; profiled above
+    ]
+    return out, chars
+
+
+def read_corpus(paths):
+    """Prompts from files and directories.
+
+    ``.jsonl``/``.ndjson`` files hold one ``{"prompt": ...}`` object per line;
+    any other file is one prompt. Directories are walked. ``-`` is stdin.
+    A line that is not valid JSON is skipped with a warning on stderr naming
+    the file and line.
+    """
+    import os
+
+    from . import jsonlite
+
+    def read_file(path, f):
+        if path.endswith((".jsonl", ".ndjson")):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = jsonlite.loads(line)
+                except ValueError as e:
+                    print(
+                        f"{path}:{number}: skipped, invalid JSON: {e}",
+                        file=sys.stderr,
+                    )
+                    continue
+                if isinstance(record, dict) and record.get("prompt"):
+                    yield record["prompt"]
+        else:
+            yield f.read()
+
+    for path in paths:
+        if path == "-":
+            yield from read_file("", sys.stdin)
+        elif os.path.isdir(path):
+            for directory, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(directory, name)
+                    with open(full, encoding="utf-8", errors="replace") as f:
+                        yield from read_file(full, f)
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield from read_file(path, f)
+
+
+def report(stats, chars, languages, intensity, prompts, sort="time_ms"):
+    """The JSON report: corpus size, settings and one entry per rule."""
+    kb = chars / 1024
+    entries = [s.to_dict(kb) for s in stats]
+    if sort == "id":
+        entries.sort(key=lambda e: e["id"])
+    else:
+        entries.sort(key=lambda e: (-(e[sort] or 0), e["id"]))
+    statuses = {}
+    for entry in entries:
+        statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+    return {
+        "languages": list(languages),
+        "intensity": intensity,
+        "prompts": prompts,
+        "kb": round(kb, 2),
+        "time_ms": round(sum(s.time_ns for s in stats) / 1e6, 3),
+        "statuses": statuses,
+        "rules": entries,
+    }
+
+
+def format_table(result, top=20):
+    """A human-readable summary of report()."""
+    lines = [
+        f"{result['prompts']} prompts, {result['kb']} KB of prose, "
+        f"{result['time_ms']} ms in rules ({result['intensity']}, "
+        f"{', '.join(result['languages'])})",
+        "  ".join(f"{n} {status}" for status, n in sorted(result["statuses"].items())),
+        "",
+        f"{'status':<10}{'hits':>7}{'changed':>8}{'ms':>10}{'us/KB':>9}  rule",
+    ]
+    for entry in result["rules"][:top]:
+        lines.append(
+            f"{entry['status']:<10}{entry['hits']:>7}{entry['changed']:>8}"
+            f"{entry['time_ms']:>10.3f}{entry['us_per_kb'] or 0:>9.2f}  {entry['id']}"
+        )
+    flagged = [e for e in result["rules"] if e["status"] not in ("active", "noop")]
+    if flagged:
+        lines += ["", "Never changed the text:"]
+        for entry in sorted(flagged, key=lambda e: e["id"]):
+            note = entry["status"]
+            if entry["shadowed_by"]:
+                note += f" by {entry['shadowed_by']}"
+            lines.append(f"  {entry['id']:<32} {note:<28} {entry['pattern']}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --profile-rules``."""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --profile-rules",
+        description="Profile dictionary rules over a prompt corpus.",
+    )
+    parser.add_argument(
+        "corpus",
+        nargs="*",
+        help="files, directories or - for stdin (default: the benchmark corpora)",
+    )
+    parser.add_argument("--intensity", choices=LEVELS, default="strict")
+    parser.add_argument(
+        "--languages",
+        default="en,es,fr,de",
+        help="comma-separated, in config order (default: %(default)s)",
+    )
+    parser.add_argument("--sort", choices=SORT_KEYS, default="time_ms")
+    parser.add_argument(
+        "--top", type=int, default=20, help="rows in the table (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--json", metavar="PATH", help="write the report (- for stdout)"
+    )
+    parser.add_argument(
+        "--no-preserve-code", action="store_true", help="profile code blocks too"
+    )
+    args = parser.parse_args(argv)
+
+    from .rules import build_ruleset
+
+    _, plugin_root = pipeline.load_config()
+    languages = args.languages.split(",")
+    if args.corpus:
+        prompts = list(read_corpus(args.corpus))
+    else:
+        from . import bench
+
+        prompts = [bench.corpus(kind, 16 * 1024) for kind in bench.CORPORA]
+    ruleset = build_ruleset(plugin_root, languages, args.intensity)
+    stats, chars = profile(prompts, ruleset, not args.no_preserve_code)
+    result = report(stats, chars, languages, args.intensity, len(prompts), args.sort)
+    if args.json == "-":
+        sys.stdout.write(json.dumps(result, indent=2, ensure_ascii=False) + "\n")
+        return 0
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    sys.stdout.write(format_table(result, args.top))
+    return 0
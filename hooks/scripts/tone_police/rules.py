@@ -0,0 +1,383 @@
+"""Rule sets: the ordered regex rules one (languages, intensity) runs.
+
+The sequential ``re.sub`` semantics of apply_common_patterns() and
+apply_language_patterns() are kept exactly: a RuleSet is a list of passes
+("common", then one per language) and each pass applies its rules in the
+same order the dictionaries list them, repeats included. At run time the
+passes are executed as merged layers (see engine.py), which give the same
+output in far fewer scans.
+"""
+
+import re
+
+from . import pipeline
+from .folding import fold_text
+
+LEVELS = ("light", "moderate", "strict")
+
+ACTION_SUB = 0
+ACTION_LOWERCASE = 1
+
+DEFAULT_CAPS_PATTERN = r"\b([A-Z]{4,})\b"
+DEFAULT_REPEAT_PATTERN = r"(\w)\1{2,}"
+DEFAULT_REPEAT_REPLACEMENT = r"\1\1"
+
+
+def _lowercase_match(match):
+    return match.group(0).lower()
+
+
+class Rule:
+    """One pattern/replacement pair with the metadata needed to report on it."""
+
+    __slots__ = (
+        "id",
+        "language",
+        "level",
+        "category",
+        "pattern",
+        "replacement",
+        "flags",
+        "action",
+        "anchors",
+        "_regex",
+    )
+
+    def __init__(
+        self,
+        id,
+        language,
+        level,
+        category,
+        pattern,
+        replacement,
+        flags,
+        action,
+        anchors=None,
+    ):
+        self.id = id
+        self.language = language
+        self.level = level
+        self.category = category
+        self.pattern = pattern
+        self.replacement = replacement
+        self.flags = flags
+        self.action = action
+        # Case-folded strings one of which must occur for the rule to match;
+        # None when the rule has no such anchor and always has to run.
+        self.anchors = anchors
+        self._regex = None
+
+    def __repr__(self):
+        return f"Rule({self.id!r}, {self.pattern!r})"
+
+    @property
+    def key(self):
+        """Identity used for deduplication: what the rule matches and writes."""
+        return (self.language, self.pattern, self.replacement, self.flags, self.action)
+
+    @property
+    def regex(self):
+        if self._regex is None:
+            self._regex = re.compile(self.pattern, self.flags)
+        return self._regex
+
+    def apply(self, text, hits=None):
+        """Rewrite ``text``; add this rule to the set ``hits`` if it matched."""
+        if self.action == ACTION_LOWERCASE:
+            replacement = _lowercase_match
+        else:
+            replacement = self.replacement
+        if hits is None:
+            return self.regex.sub(replacement, text)
+        text, count = self.regex.subn(replacement, text)
+        if count:
+            hits.add(self)
+        return text
+
+
+class RuleSet:
+    """The rules for one (languages, intensity) combination, in run order.
+
+    Attributes:
+        languages: Language codes, in config order.
+        intensity: The configured intensity level.
+        rules: Unique rules; passes refer to them by index.
+        passes: List of (name, [rule index, ...]); "common" comes first.
+        layers: List of (merged source or None, [rule index, ...]) covering
+            the passes in order, or None to run the passes rule by rule.
+        redundant: (kind, dropped Rule, earlier Rule) for every dictionary
+            entry the compiler left out; only set by build_ruleset().
+
+    ``line_local`` is the precomputed value of the property, when known.
+    """
+
+    def __init__(
+        self, languages, intensity, rules, passes, layers=None, line_local=None
+    ):
+        self.languages = tuple(languages)
+        self.intensity = intensity
+        self.rules = rules
+        self.passes = passes
+        self.layers = layers
+        self.redundant = []
+        self._compiled = None
+        self._line_local = line_local
+        self._obfuscation_index = None
+        self._literal_index = None
+
+    @property
+    def sequence(self):
+        """Rule indices in execution order, repeats included."""
+        return [i for _, indices in self.passes for i in indices]
+
+    @property
+    def line_local(self):
+        """Whether every rule matches within a single line.
+
+        When true, text can be filtered piecewise, cut after any newline; see
+        stream.py.
+        """
+        if self._line_local is None:
+            from .analysis import line_local
+
+            self._line_local = all(
+                line_local(rule.pattern, rule.flags) for rule in self.rules
+            )
+        return self._line_local
+
+    @property
+    def obfuscation_index(self):
+        """Masked spellings of the words the rules match; see normalize.py."""
+        if self._obfuscation_index is None:
+            from .normalize import build_index
+
+            self._obfuscation_index = build_index(self.rules)
+        return self._obfuscation_index
+
+    @property
+    def literal_index(self):
+        """The rules that match a literal word or phrase; see engine.py."""
+        if self._literal_index is None:
+            from .engine import LiteralIndex
+
+            self._literal_index = LiteralIndex(self.rules)
+        return self._literal_index
+
+    def pass_rules(self, name):
+        for pass_name, indices in self.passes:
+            if pass_name == name:
+                return [self.rules[i] for i in indices]
+        return []
+
+    def apply(self, text, hits=None, trace=None):
+        """Filter ``text``; same result as apply_sequential(), fewer scans.
+
+        Layers whose rules' anchors are all absent from the case-folded text
+        are skipped, so a clean prompt costs one fold, a handful of substring
+        searches and the few anchorless rules (caps, repeated characters).
+
+        Args:
+            text: The text to filter.
+            hits: Optional set; every rule that matched is added to it.
+            trace: Optional callable, called as ``trace(layer, skipped,
+                changed)`` after each layer; tracing.py times layers with it.
+                Without layers it goes to apply_sequential().
+        """
+        if self.layers is None:
+            return self.apply_sequential(text, hits, trace)
+        folded = None
+        for layer in self._compiled or self._layers():
+            anchors = layer.anchors
+            if anchors is not None:
+                if folded is None:
+                    folded = fold_text(text)
+                if not any(anchor in folded for anchor in anchors):
+                    if trace is not None:
+                        trace(layer, True, False)
+                    continue
+            rewritten = layer.apply(text, hits)
+            changed = rewritten != text
+            if changed:
+                text = rewritten
+                folded = None
+            if trace is not None:
+                trace(layer, False, changed)
+        return text
+
+    @property
+    def compiled_layers(self):
+        """The engine.Layer objects for ``layers``, built on first use."""
+        return self._compiled or self._layers()
+
+    def _layers(self):
+        from .engine import Layer
+
+        self._compiled = [
+            Layer(source, [self.rules[i] for i in indices])
+            for source, indices in self.layers
+        ]
+        return self._compiled
+
+    def compile(self):
+        """Compile every regex now rather than on first use.
+
+        Lazy compilation is safe across threads (the worst case is compiling
+        twice), but a long-lived embedder may prefer to pay it up front.
+        """
+        if self.layers is None:
+            for rule in self.rules:
+                rule.regex
+        else:
+            for layer in self._compiled or self._layers():
+                if layer.source is None:
+                    layer.rules[0].regex
+                else:
+                    layer.regex
+        return self
+
+    def apply_sequential(self, text, hits=None, trace=None):
+        """Run every pass over ``text`` in order, one ``re.sub`` per rule.
+
+        ``trace``, if given, is called as ``trace(name, rules)`` after each
+        pass, ``rules`` being how many it ran.
+        """
+        rules = self.rules
+        for name, indices in self.passes:
+            for i in indices:
+                text = rules[i].apply(text, hits)
+            if trace is not None:
+                trace(name, len(indices))
+        return text
+
+
+def _common_rules(common):
+    """Mirror apply_common_patterns(), including its defaults."""
+    if not common:
+        return []
+    patterns = common.get("patterns", {})
+    rules = []
+
+    caps_config = patterns.get("caps_normalization", {})
+    if caps_config:
+        rules.append(
+            Rule(
+                "common/caps_normalization",
+                "common",
+                None,
+                "caps_normalization",
+                caps_config.get("pattern", DEFAULT_CAPS_PATTERN),
+                None,
+                0,
+                ACTION_LOWERCASE,
+            )
+        )
+
+    punct_config = patterns.get("excessive_punctuation", {})
+    if punct_config:
+        for i, p in enumerate(punct_config.get("patterns", [])):
+            rules.append(
+                Rule(
+                    f"common/excessive_punctuation/{i}",
+                    "common",
+                    None,
+                    "excessive_punctuation",
+                    p["pattern"],
+                    p["replacement"],
+                    0,
+                    ACTION_SUB,
+                )
+            )
+
+    repeat_config = patterns.get("repeated_characters", {})
+    if repeat_config:
+        rules.append(
+            Rule(
+                "common/repeated_characters",
+                "common",
+                None,
+                "repeated_characters",
+                repeat_config.get("pattern", DEFAULT_REPEAT_PATTERN),
+                repeat_config.get("replacement", DEFAULT_REPEAT_REPLACEMENT),
+                0,
+                ACTION_SUB,
+            )
+        )
+    return rules
+
+
+def _language_rules(dictionary, language, intensity):
+    """Mirror get_intensity_patterns() + apply_language_patterns() ordering."""
+    target_idx = LEVELS.index(intensity) if intensity in LEVELS else 1
+    by_category = {}
+    for level in LEVELS[: target_idx + 1]:
+        level_patterns = dictionary.get("patterns", {}).get(level, {})
+        for category, pattern_list in level_patterns.items():
+            bucket = by_category.setdefault(category, [])
+            for i, entry in enumerate(pattern_list):
+                flags = re.IGNORECASE if "i" in entry.get("flags", "i") else 0
+                bucket.append(
+                    Rule(
+                        f"{language}/{level}/{category}/{i}",
+                        language,
+                        level,
+                        category,
+                        entry["pattern"],
+                        entry["replacement"],
+                        flags,
+                        ACTION_SUB,
+                    )
+                )
+    return [rule for bucket in by_category.values() for rule in bucket]
+
+
+def build_ruleset(plugin_root, languages, intensity):
+    """Compile the dictionary JSON files into a minimal RuleSet.
+
+    The cumulative levels repeat many rules (en.json lists its light
+    profanity again under moderate and strict). Executions that provably
+    cannot change the text -- repeats, and rules shadowed by an earlier
+    rule -- are dropped and listed in ``RuleSet.redundant``; the output is
+    unchanged. The merged layers are planned here too, so loading an
+    artifact never has to analyze.
+    """
+    from . import analysis
+    from .engine import build_layers
+
+    passes = [("common", [])]
+    executed = []  # (pass number, Rule) in dictionary order, repeats included
+    common = pipeline.load_common_patterns(plugin_root)
+    executed += [(0, r) for r in _common_rules(common)]
+    for lang in languages:
+        dictionary = pipeline.load_dictionary(plugin_root, lang)
+        if dictionary:
+            rules = _language_rules(dictionary, lang, intensity)
+            executed += [(len(passes), r) for r in rules]
+            passes.append((lang, []))
+
+    # The first occurrence of each rule stands in for its repeats.
+    canonical = {}
+    for _, rule in executed:
+        canonical.setdefault(rule.key, rule)
+    dropped = analysis.find_redundant([canonical[r.key] for _, r in executed])
+    for rule in canonical.values():
+        rule.anchors = analysis.rule_anchors(rule)
+
+    unique = []
+    index_by_key = {}
+    redundant = []
+    for pos, (number, rule) in enumerate(executed):
+        if pos in dropped:
+            kind, by = dropped[pos]
+            redundant.append((kind, rule, canonical[executed[by][1].key]))
+            continue
+        idx = index_by_key.get(rule.key)
+        if idx is None:
+            idx = index_by_key[rule.key] = len(unique)
+            unique.append(canonical[rule.key])
+        passes[number][1].append(idx)
+
+    ruleset = RuleSet(languages, intensity, unique, passes)
+    ruleset.redundant = redundant
+    ruleset.layers = build_layers(unique, ruleset.sequence)
+    return ruleset
@@ -0,0 +1,187 @@
+"""Detection without rewriting: which rules match a prompt, and where.
+
+Block mode only needs a yes or no, plus what to say about it. scan() runs
+the same anchor-gated layers as RuleSet.apply() but only searches: nothing is
+substituted or copied, and with ``first`` it returns at the first match
+instead of finishing the prompt. Spans refer to the prompt as given.
+
+Since the text never changes, the rules that match a literal word or phrase
+are not searched for at all: the prompt is cut into words once and looked
+up in the rule set's engine.LiteralIndex. Only the real regexes (caps,
+punctuation, ``f+u+c+k+``) run through ``re``.
+
+A prompt that no rule matches is exactly a prompt the rewrite leaves alone:
+until something has been rewritten, every rule sees the original text. The
+converse holds as long as no replacement equals the text it replaces, so the
+hook still runs the rewrite before blocking when it needs the suggestion.
+
+``severity`` narrows the rules to a level and the ones below it. Levels run
+from the worst language to the mildest (``light`` is the profanity every
+intensity filters, ``strict`` adds plain negativity); the common style rules
+(caps, punctuation, repeated letters) have no level and only count when no
+severity is given.
+"""
+
+from . import pipeline
+from .folding import fold_text
+from .rules import LEVELS
+
+
+class Match:
+    """One rule matching one span of the prompt.
+
+    Attributes:
+        rule: The Rule.
+        start: Offset of the first character in the prompt.
+        end: Offset just past the last character.
+        text: ``prompt[start:end]``.
+    """
+
+    __slots__ = ("rule", "start", "end", "text")
+
+    def __init__(self, rule, start, end, text):
+        self.rule = rule
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self):
+        return f"Match({self.rule.id!r}, {self.start}, {self.end}, {self.text!r})"
+
+    def to_dict(self):
+        return {
+            "rule": self.rule.id,
+            "category": self.rule.category,
+            "level": self.rule.level,
+            "start": self.start,
+            "end": self.end,
+            "text": self.text,
+        }
+
+
+def _wanted(severity):
+    """Predicate for the rules at ``severity`` or worse; unknown means all."""
+    if severity not in LEVELS:
+        return None
+    levels = frozenset(LEVELS[: LEVELS.index(severity) + 1])
+    return lambda rule: rule.level in levels
+
+
+def _prose(text, preserve_code):
+    """(offset, segment) for every non-empty prose segment of ``text``."""
+    if not preserve_code:
+        yield 0, text
+        return
+    offset = 0
+    for i, segment in enumerate(pipeline.split_code_blocks(text)):
+        if i % 2 == 0 and segment:
+            yield offset, segment
+        offset += len(segment)
+
+
+def _layers(ruleset):
+    if ruleset.layers is None:
+        from .engine import Layer
+
+        return [Layer(None, [rule]) for rule in ruleset.rules]
+    return ruleset.compiled_layers
+
+
+def _search(text, ruleset, wanted, first):
+    """(start, end, rule) for the plain matches in one prose segment."""
+    from .engine import literal
+
+    folded = fold_text(text)
+    for layer in _layers(ruleset):
+        rules = layer.rules
+        if wanted is not None:
+            rules = [rule for rule in rules if wanted(rule)]
+            if not rules:
+                continue
+        if layer.source is not None and len(rules) == len(layer.rules):
+            regex = layer.rest
+            if regex is None:
+                continue
+            anchors = layer.anchors
+            if anchors is not None and not any(a in folded for a in anchors):
+                continue
+            found = [regex.search(text)] if first else regex.finditer(text)
+            for m in found:
+                if m is not None:
+                    yield m.start(), m.end(), rules[int(m.lastgroup[1:])]
+            continue
+        for rule in rules:
+            if literal(rule) is not None:
+                continue
+            anchors = rule.anchors
+            if anchors is not None and not any(a in folded for a in anchors):
+                continue
+            regex = rule.regex
+            found = [regex.search(text)] if first else regex.finditer(text)
+            for m in found:
+                if m is not None:
+                    yield m.start(), m.end(), rule
+    # Last: with ``first`` a cheap regex hit saves cutting the text into words.
+    yield from ruleset.literal_index.find(text, folded, wanted)
+
+
+def scan(
+    text, ruleset, preserve_code=True, normalize=False, severity=None, first=False
+):
+    """Find where ``ruleset`` matches ``text`` without rewriting anything.
+
+    Args:
+        text: The prompt.
+        ruleset: The RuleSet to search with.
+        preserve_code: Leave code blocks out, like the config option.
+        normalize: Also report obfuscated spellings; see normalize.py.
+        severity: Only consider rules of this level or worse (None: all).
+        first: Stop at the first match found: regex rules are tried in rule
+            order before the literal words, so it is not necessarily the
+            leftmost.
+
+    Returns:
+        A list of Match, sorted by position. Spans of different rules may
+        overlap.
+    """
+    wanted = _wanted(severity)
+    found = {}
+    segments = list(_prose(text, preserve_code))
+    for offset, segment in segments:
+        for start, end, rule in _search(segment, ruleset, wanted, first):
+            start += offset
+            end += offset
+            found[start, end, rule.id] = Match(rule, start, end, text[start:end])
+            if first:
+                return list(found.values())
+    if normalize:
+        from . import normalize as _normalize
+
+        rules = ruleset.rules
+        if wanted is not None:
+            rules = [rule for rule in rules if wanted(rule)]
+        for offset, segment in segments:
+            for start, end, rule, _ in _normalize.matches(segment, ruleset, rules):
+                start += offset
+                end += offset
+                found[start, end, rule.id] = Match(rule, start, end, text[start:end])
+                if first:
+                    return list(found.values())
+    return sorted(found.values(), key=lambda m: (m.start, m.end, m.rule.id))
+
+
+def scan_text(text, config, plugin_root, ruleset=None, first=False):
+    """scan() with the settings of ``config``, as the hook uses it.
+
+    ``block_severity`` in the config sets the severity.
+    """
+    if ruleset is None:
+        ruleset = pipeline.load_rules(config, plugin_root, text)
+    return scan(
+        text,
+        ruleset,
+        config.get("preserve_code_blocks", True),
+        config.get("normalize_obfuscation", True),
+        config.get("block_severity"),
+        first,
+    )
@@ -0,0 +1,321 @@
+"""Embeddable filter engine for long-running Python services.
+
+The hook resolves config and rules from files on every prompt. A service that
+filters text for many projects builds a ToneFilter once per config instead,
+or lets a Registry keep one per project::
+
+    from tone_police import Registry, ToneFilter
+
+    engine = ToneFilter({"intensity": "strict", "languages": ["en", "de"]})
+    result = engine.filter("what the hell")
+    result.decision, result.text, result.categories
+    engine.scan("what the hell", first=True).hostile
+
+    registry = Registry()
+    registry.filter("what the hell", project_dir="/srv/repos/app")
+
+Both are thread-safe. A ToneFilter's config and compiled rules never change
+once it is built; its one mutable part, the cache of rule sets for detected
+languages, is a dict filled on first use, safe to share under the GIL (at
+worst two threads build the same entry). The Registry guards its table with
+a lock.
+"""
+
+import os
+import threading
+
+from . import pipeline
+from .paths import source_files, stat_signature
+
+DEFAULT_MAX_ENGINES = 32
+
+
+class FilterResult:
+    """What filtering one text produced.
+
+    Attributes:
+        original: The text as given.
+        text: The filtered text (``original`` when nothing matched, or when
+            block mode made no suggestion).
+        decision: "allow" when unchanged, otherwise the config's mode,
+            "rewrite" or "block".
+        output: Exactly what the hook would print for this prompt.
+        rules: IDs of the rules that matched, sorted.
+        categories: Categories of those rules, sorted.
+    """
+
+    __slots__ = ("original", "text", "decision", "output", "rules", "categories")
+
+    def __init__(self, original, text, decision, output, rules, categories):
+        self.original = original
+        self.text = text
+        self.decision = decision
+        self.output = output
+        self.rules = rules
+        self.categories = categories
+
+    def __repr__(self):
+        return f"FilterResult({self.decision!r}, {self.text!r})"
+
+    @property
+    def changed(self):
+        return self.text != self.original
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ScanResult:
+    """Where the rules match one text; the rewrite is only made on request.
+
+    Attributes:
+        original: The text as given.
+        matches: scan.Match objects, sorted by position.
+    """
+
+    __slots__ = ("original", "matches", "_engine", "_suggestion")
+
+    def __init__(self, original, matches, engine):
+        self.original = original
+        self.matches = matches
+        self._engine = engine
+        self._suggestion = None
+
+    def __repr__(self):
+        return f"ScanResult({len(self.matches)} matches)"
+
+    @property
+    def hostile(self):
+        return bool(self.matches)
+
+    @property
+    def rules(self):
+        return sorted({m.rule.id for m in self.matches})
+
+    @property
+    def categories(self):
+        return sorted({m.rule.category for m in self.matches})
+
+    @property
+    def suggestion(self):
+        """The rewritten text, computed on first access."""
+        if self._suggestion is None:
+            self._suggestion = self._engine.filter(self.original).text
+        return self._suggestion
+
+    def to_dict(self):
+        return {
+            "original": self.original,
+            "hostile": self.hostile,
+            "matches": [m.to_dict() for m in self.matches],
+        }
+
+
+class ToneFilter:
+    """A config and its compiled rules, built once and reused.
+
+    Attributes:
+        config: The effective config (a copy; later edits have no effect).
+        plugin_root: Where the dictionaries are read from.
+        ruleset: The compiled RuleSet, or None when the config is disabled.
+            With ``"languages": "auto"`` it covers every candidate language
+            and serves prompts whose language is uncertain; the others get a
+            RuleSet for just the detected languages, built on first use.
+    """
+
+    def __init__(self, config, plugin_root=None):
+        self.config = dict(config)
+        self.plugin_root = str(plugin_root or pipeline.default_plugin_root())
+        self.ruleset = None
+        self._profiles = None
+        self._detected = {}  # detected languages -> RuleSet
+        if self.config.get("enabled", True):
+            self.ruleset = pipeline.load_rules(self.config, self.plugin_root)
+            self.ruleset.compile()
+            if self.config.get("languages") == "auto":
+                from . import detect
+
+                self._profiles = detect.profiles(
+                    self.plugin_root, self.ruleset.languages
+                )
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """Build from the config the hook would use for ``environ``."""
+        config, plugin_root = pipeline.load_config(environ)
+        return cls(config, plugin_root)
+
+    def _ruleset_for(self, text):
+        from . import artifact, detect
+
+        languages = detect.detect(
+            text,
+            self._profiles,
+            self.config.get("language_confidence", detect.DEFAULT_CONFIDENCE),
+        )
+        if not languages:
+            return self.ruleset
+        ruleset = self._detected.get(languages)
+        if ruleset is None:
+            intensity = self.config.get("intensity", "moderate")
+            ruleset = artifact.load_ruleset(self.plugin_root, languages, intensity)
+            self._detected[languages] = ruleset.compile()
+        return ruleset
+
+    def scan(self, text, severity=None, first=False):
+        """Find what ``text`` would be filtered for, without rewriting it.
+
+        Args:
+            text: The text.
+            severity: Only consider rules of this level or worse (default:
+                the config's ``block_severity``, else every rule).
+            first: Stop at the first match; enough to decide on blocking.
+
+        Returns:
+            A ScanResult.
+        """
+        from . import scan
+
+        matches = []
+        if self.ruleset is not None and text:
+            matches = scan.scan(
+                text,
+                self._ruleset(text),
+                self.config.get("preserve_code_blocks", True),
+                self.config.get("normalize_obfuscation", True),
+                severity or self.config.get("block_severity"),
+                first,
+            )
+        return ScanResult(text, matches, self)
+
+    def _ruleset(self, text):
+        if self._profiles and len(self.ruleset.languages) > 1:
+            return self._ruleset_for(text)
+        return self.ruleset
+
+    def filter(self, text):
+        """Filter ``text`` and report what happened; returns a FilterResult.
+
+        In block mode the verdict is the hook's: a scan honoring
+        ``block_severity`` decides, and the rewrite is only made for a
+        blocked text while ``block_suggestion`` is on (otherwise ``text`` of
+        the result is the original).
+        """
+        if self.config.get("mode", "rewrite") == "block":
+            return self._block(text)
+        hits = set()
+        filtered = text
+        if self.ruleset is not None and text:
+            ruleset = self._ruleset(text)
+            filtered = pipeline.filter_text(
+                text, self.config, self.plugin_root, ruleset, hits
+            )
+        if filtered == text:
+            return FilterResult(text, text, "allow", "", [], [])
+        return FilterResult(
+            text,
+            filtered,
+            "rewrite",
+            pipeline.render_response(self.config, filtered),
+            sorted({rule.id for rule in hits}),
+            sorted({rule.category for rule in hits}),
+        )
+
+    def _block(self, text):
+        """filter() in block mode, deciding as pipeline.block_decision()."""
+        matches = self.scan(text, first=True).matches
+        if not matches:
+            return FilterResult(text, text, "allow", "", [], [])
+        hits = {m.rule for m in matches}
+        filtered = None
+        if self.config.get("block_suggestion", True):
+            filtered = pipeline.filter_text(
+                text, self.config, self.plugin_root, self._ruleset(text), hits
+            )
+            if filtered == text:
+                return FilterResult(text, text, "allow", "", [], [])
+        categories = [m.rule.category for m in matches]
+        return FilterResult(
+            text,
+            text if filtered is None else filtered,
+            "block",
+            pipeline.render_response(self.config, filtered, categories),
+            sorted({rule.id for rule in hits}),
+            sorted({rule.category for rule in hits}),
+        )
+
+
+class Registry:
+    """ToneFilters per project directory, least recently used first out.
+
+    A project's engine is rebuilt when its ``.claude/tone-police.config.json``
+    (or, without one, the plugin default config) or one of the dictionaries
+    it uses changes size or mtime.
+
+    Attributes:
+        plugin_root: Plugin checkout every engine reads from.
+        max_engines: Engines kept before the least recently used is dropped.
+    """
+
+    def __init__(self, plugin_root=None, max_engines=DEFAULT_MAX_ENGINES):
+        from collections import OrderedDict
+
+        self.plugin_root = str(plugin_root or pipeline.default_plugin_root())
+        self.max_engines = max_engines
+        self._engines = OrderedDict()  # project dir -> (signature, ToneFilter)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    def _config_signature(self, project_dir):
+        paths = [os.path.join(self.plugin_root, "config", "default-config.json")]
+        if project_dir:
+            paths.append(
+                os.path.join(project_dir, ".claude", "tone-police.config.json")
+            )
+        return stat_signature(paths)
+
+    def _signature(self, project_dir, config, configs=None):
+        if configs is None:
+            configs = self._config_signature(project_dir)
+        languages = pipeline.configured_languages(config, self.plugin_root)
+        files = source_files(self.plugin_root, languages)
+        return configs + "\n" + stat_signature(files)
+
+    def get(self, project_dir=None):
+        """The ToneFilter for ``project_dir`` (None: the plugin default)."""
+        project_dir = str(project_dir or "")
+        with self._lock:
+            entry = self._engines.get(project_dir)
+        if entry is not None:
+            signature, engine = entry
+            if signature == self._signature(project_dir, engine.config):
+                with self._lock:
+                    if project_dir in self._engines:
+                        self._engines.move_to_end(project_dir)
+                return engine
+
+        # Build outside the lock so one slow project does not stall others.
+        # Every file is stat'ed before it is read: an edit landing during the
+        # build leaves the signature stale, so the next get() rebuilds.
+        configs = self._config_signature(project_dir)
+        config, plugin_root = pipeline.load_config(
+            {"CLAUDE_PLUGIN_ROOT": self.plugin_root, "CLAUDE_PROJECT_DIR": project_dir}
+        )
+        signature = self._signature(project_dir, config, configs)
+        engine = ToneFilter(config, plugin_root)
+        with self._lock:
+            self._engines[project_dir] = (signature, engine)
+            self._engines.move_to_end(project_dir)
+            while len(self._engines) > self.max_engines:
+                self._engines.popitem(last=False)
+        return engine
+
+    def filter(self, text, project_dir=None):
+        """Filter ``text`` with the project's engine; returns a FilterResult."""
+        return self.get(project_dir).filter(text)
+
+    def clear(self):
+        with self._lock:
+            self._engines.clear()
@@ -0,0 +1,181 @@
+"""Chunked filtering of huge prompts in bounded memory.
+
+Rules like ``f+u+c+k+`` or ``[!?]{3,}`` have no longest match, so no
+overlap window between chunks is ever wide enough. Instead the text is cut
+just after a newline that nothing can span: every dictionary rule is checked
+to match within a single line (analysis.line_local), and cuts skip over
+fenced code blocks, whose state is carried from one chunk to the next. Each
+chunk then filters exactly as it would inside the whole prompt.
+
+Memory stays within a few chunks, except that a single line, or a fenced
+block whose closing fence has not arrived yet, is held until it is complete.
+A rule set with a rule that can span lines (a custom ``\\s+``, say) is simply
+filtered in one piece at close().
+"""
+
+import sys
+
+from . import pipeline
+
+# Characters buffered before a cut is attempted.
+CHUNK_SIZE = 64 * 1024
+
+_code_regex = None
+
+
+def find_cut(text, preserve_code=True):
+    """Offset just past the last newline ``text`` can safely be cut at.
+
+    A cut is safe when no code span can cross it, whatever text follows:
+    it is not inside a fenced block, and no fence opened before it is still
+    waiting for its closing ``` (that fence may yet swallow the cut).
+
+    Returns:
+        The cut offset, or 0 when there is none.
+    """
+    global _code_regex
+    limit = len(text)
+    fences = []
+    if preserve_code:
+        if _code_regex is None:
+            import re
+
+            _code_regex = re.compile(pipeline.CODE_PATTERN)
+        pos = 0
+        for match in _code_regex.finditer(text):
+            # An inline span only stands if no unclosed fence precedes it;
+            # that fence could still close further on and take it over.
+            if text.find("```", pos, match.start() + 2) != -1:
+                break
+            if match.group().startswith("```"):
+                fences.append(match.span())
+            pos = match.end()
+        unclosed = text.find("```", pos)
+        if unclosed != -1:
+            limit = unclosed
+    while True:
+        newline = text.rfind("\n", 0, limit)
+        if newline == -1:
+            return 0
+        while fences and fences[-1][0] > newline:
+            fences.pop()
+        if fences and fences[-1][1] > newline:
+            limit = fences[-1][0]
+            continue
+        return newline + 1
+
+
+class StreamFilter:
+    """Incremental filter: feed() text as it arrives, then close().
+
+    The concatenated output is identical to pipeline.apply_rules() over the
+    concatenated input.
+
+    Attributes:
+        ruleset: The RuleSet to apply.
+        preserve_code: Leave code blocks untouched, like the config option.
+        chunk_size: Characters to buffer before trying to cut (default:
+            CHUNK_SIZE).
+        hits: Optional set; every rule that matched is added to it.
+        normalize: Also catch obfuscated spellings, like the
+            ``normalize_obfuscation`` config option.
+    """
+
+    def __init__(
+        self, ruleset, preserve_code=True, chunk_size=None, hits=None, normalize=False
+    ):
+        self.ruleset = ruleset
+        self.preserve_code = preserve_code
+        self.hits = hits
+        self.normalize = normalize
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self._splittable = ruleset.line_local
+        self._pending = []
+        self._size = 0
+        self._next_attempt = self.chunk_size
+
+    def feed(self, text):
+        """Add input; return whatever output is final so far (maybe "")."""
+        self._pending.append(text)
+        self._size += len(text)
+        if self._size < self._next_attempt:
+            return ""
+        buffer = "".join(self._pending)
+        cut = find_cut(buffer, self.preserve_code) if self._splittable else 0
+        if not cut:
+            # Wait for twice as much before rescanning, so a very long line
+            # or code block costs linear time overall.
+            self._pending = [buffer]
+            self._next_attempt = max(2 * self._size, self._size + self.chunk_size)
+            return ""
+        rest = buffer[cut:]
+        self._pending = [rest] if rest else []
+        self._size = len(rest)
+        self._next_attempt = self._size + self.chunk_size
+        return pipeline.apply_rules(
+            buffer[:cut], self.ruleset, self.preserve_code, self.hits, self.normalize
+        )
+
+    def close(self):
+        """Flush the remaining input; return the last of the output."""
+        buffer = "".join(self._pending)
+        self._pending = []
+        self._size = 0
+        self._next_attempt = self.chunk_size
+        if not buffer:
+            return ""
+        return pipeline.apply_rules(
+            buffer, self.ruleset, self.preserve_code, self.hits, self.normalize
+        )
+
+
+def filter_stream(
+    source, sink, ruleset, preserve_code=True, chunk_size=None, normalize=False
+):
+    """Filter text from file object ``source`` into ``sink``, chunk by chunk."""
+    stream = StreamFilter(ruleset, preserve_code, chunk_size, normalize=normalize)
+    while True:
+        data = source.read(stream.chunk_size)
+        if not data:
+            break
+        sink.write(stream.feed(data))
+    sink.write(stream.close())
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --filter``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --filter",
+        description=(
+            "Filter plain text from stdin to stdout with the active config, "
+            "in bounded memory."
+        ),
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="characters to buffer before each cut (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    # Keep "\r\n" as it is, like a prompt that arrives inside hook JSON.
+    sys.stdin.reconfigure(newline="")
+    sys.stdout.reconfigure(newline="")
+    config, plugin_root = pipeline.load_config()
+    if not config.get("enabled", True):
+        import shutil
+
+        shutil.copyfileobj(sys.stdin, sys.stdout)
+        return 0
+    filter_stream(
+        sys.stdin,
+        sys.stdout,
+        pipeline.load_rules(config, plugin_root),
+        config.get("preserve_code_blocks", True),
+        args.chunk_size,
+        config.get("normalize_obfuscation", True),
+    )
+    return 0
@@ -0,0 +1,327 @@
+"""Per-prompt tracing to Chrome trace JSON.
+
+For the prompt that took seconds and nobody can tell why. Set
+``TONE_POLICE_TRACE`` to a directory and the hook runs in-process (the
+daemon is skipped, so imports are part of the picture) and writes one
+``trace-*.json`` per prompt; open it in ``chrome://tracing``, Perfetto or
+speedscope. ``"trace": true`` in the config does the same from wherever the
+hook runs, the daemon included, starting once the config is known; the files
+go to ``trace_dir`` (default ``$XDG_STATE_HOME/tone-police/traces``).
+
+The trace has a span per stage: payload parsing, config resolution, the
+result cache, dictionary loading, splitting off code blocks, one span per
+pass (``common``, ``en``, ...) with the layers it ran or skipped nested
+inside, obfuscation, the block-mode scan, the audit log and the output.
+Layers merge rules across passes where order allows, so a layer can belong
+to a pass like ``en+es``.
+
+``TONE_POLICE_TRACE_PROFILE=1`` (or ``"trace_profile": true``) also records
+every Python and C function call while the prompt is handled, so the
+trace shows where inside a stage the time went. Module bodies appear as
+``import <name>`` spans, the same breakdown ``-X importtime`` prints.
+Profiling makes the prompt several times slower and stops after
+MAX_PROFILE_EVENTS calls.
+
+The pipeline imports this module for every prompt, so it imports nothing
+beyond ``os``; with no tracer running, span() is a dictionary check.
+"""
+
+import os
+from _thread import get_ident
+from time import perf_counter
+
+MAX_PROFILE_EVENTS = 200000
+
+# Thread id -> the Tracer recording that thread; the daemon handles prompts
+# on many threads at once.
+_tracers = {}
+
+
+def current():
+    """The Tracer recording this thread, or None."""
+    if not _tracers:
+        return None
+    return _tracers.get(get_ident())
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, self.start, perf_counter(), **self.args)
+        return False
+
+
+def span(name, **args):
+    """Context manager timing ``name`` if this thread is being traced."""
+    tracer = current()
+    if tracer is None:
+        return _NULL
+    return _Span(tracer, name, args)
+
+
+def trace_dir(config, environ=None):
+    path = config.get("trace_dir")
+    if path:
+        return os.path.expanduser(path)
+    from .paths import state_dir
+
+    return os.path.join(state_dir(environ), "traces")
+
+
+class Tracer:
+    """Spans (and optionally every call) of one thread, for one prompt.
+
+    Attributes:
+        directory: Where finish() writes the trace.
+        profile: Whether every function call is recorded too.
+        path: The trace file, once written.
+        truncated: Whether profiling stopped at MAX_PROFILE_EVENTS.
+        info: Facts about the prompt for the trace's ``otherData``.
+    """
+
+    def __init__(self, directory, profile=False):
+        self.directory = directory
+        self.profile = profile
+        self.path = None
+        self.truncated = False
+        self.thread = get_ident()
+        self.info = {}
+        self._spans = []
+        self._calls = []
+        self._depth = 0
+        self._previous = None
+
+    def start(self):
+        """Make this the tracer of the calling thread."""
+        _tracers[self.thread] = self
+        if self.profile:
+            import sys
+
+            self._previous = sys.getprofile()
+            sys.setprofile(self._on_call)
+        return self
+
+    def add(self, name, start, end, **args):
+        """Record a span from perf_counter() ``start`` to ``end``."""
+        self._spans.append((name, start, end, args))
+
+    def _on_call(self, frame, event, arg):
+        if event == "call" or event == "c_call":
+            if len(self._calls) >= MAX_PROFILE_EVENTS:
+                # Stop here; finish() closes the calls still open.
+                import sys
+
+                sys.setprofile(None)
+                self.truncated = True
+                return
+            if event == "c_call":
+                name = getattr(arg, "__qualname__", None) or repr(arg)
+                module = getattr(arg, "__module__", None)
+                if module:
+                    name = f"{module}.{name}"
+                category = "c"
+            else:
+                code = frame.f_code
+                if code.co_name == "<module>" and "__spec__" in frame.f_globals:
+                    name = f"import {frame.f_globals.get('__name__')}"
+                    category = "import"
+                else:
+                    filename = os.path.basename(code.co_filename)
+                    name = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+                    category = "python"
+            self._calls.append(("B", perf_counter(), name, category))
+            self._depth += 1
+        elif self._depth:
+            # return, c_return or c_exception. Frames entered before the
+            # profiler started return unmatched; those are ignored.
+            self._calls.append(("E", perf_counter(), None, None))
+            self._depth -= 1
+
+    def finish(self):
+        """Stop recording and write the trace; returns its path or None."""
+        if self.profile:
+            import sys
+
+            sys.setprofile(self._previous)
+        end = perf_counter()
+        if _tracers.get(self.thread) is self:
+            del _tracers[self.thread]
+        self._calls += [("E", end, None, None)] * self._depth
+        self._depth = 0
+        try:
+            self.path = self.write()
+        except OSError:
+            self.path = None
+        return self.path
+
+    def events(self):
+        """The Chrome trace events, timestamps in microseconds."""
+        pid = os.getpid()
+        tid = self.thread % (1 << 31)
+        out = [
+            {
+                "ph": "M",
+                "name": "process_name",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": "tone-police"},
+            },
+            {
+                "ph": "M",
+                "name": "thread_name",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": f"hook {self.thread}"},
+            },
+        ]
+        for name, start, end, args in self._spans:
+            event = {
+                "ph": "X",
+                "name": name,
+                "cat": "stage",
+                "ts": round(start * 1e6, 3),
+                "dur": round((end - start) * 1e6, 3),
+                "pid": pid,
+                "tid": tid,
+            }
+            if args:
+                event["args"] = args
+            out.append(event)
+        for phase, ts, name, category in self._calls:
+            event = {"ph": phase, "ts": round(ts * 1e6, 3), "pid": pid, "tid": tid}
+            if name is not None:
+                event["name"] = name
+                event["cat"] = category
+            out.append(event)
+        return out
+
+    def write(self):
+        import json
+        import time
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory, f"trace-{time.time_ns()}-{os.getpid()}-{self.thread}.json"
+        )
+        document = {
+            "traceEvents": self.events(),
+            "displayTimeUnit": "ms",
+            "otherData": dict(self.info, truncated=self.truncated),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(tmp, path)
+        return path
+
+
+def from_environ(environ):
+    """A Tracer if ``TONE_POLICE_TRACE`` asks for one, else None."""
+    directory = environ.get("TONE_POLICE_TRACE")
+    if not directory:
+        return None
+    profile = environ.get("TONE_POLICE_TRACE_PROFILE", "0") not in ("", "0")
+    return Tracer(os.path.expanduser(directory), profile)
+
+
+def from_config(config, environ=None):
+    """A Tracer if the config turns tracing on, else None."""
+    if not config.get("trace", False):
+        return None
+    return Tracer(trace_dir(config, environ), config.get("trace_profile", False))
+
+
+def run_hook(raw, tracer, environ=None):
+    """Handle one hook payload in-process under ``tracer``.
+
+    The pipeline is imported inside the trace, so a cold start shows what
+    its imports cost.
+    """
+    tracer.start()
+    start = perf_counter()
+    try:
+        from . import pipeline
+
+        tracer.add("import pipeline", start, perf_counter())
+        return pipeline.handle(raw, environ)
+    finally:
+        tracer.add("hook", start, perf_counter())
+        tracer.finish()
+
+
+def apply(ruleset, text, hits=None):
+    """RuleSet.apply() with a span per pass and per layer."""
+    tracer = current()
+    if ruleset.layers is None:
+        return ruleset.apply_sequential(text, hits, _Passes(tracer))
+    layers = _Layers(tracer)
+    try:
+        return ruleset.apply(text, hits, layers)
+    finally:
+        layers.close()
+
+
+class _Passes:
+    """apply_sequential()'s trace hook: a span per pass."""
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.last = perf_counter()
+
+    def __call__(self, name, rules):
+        self.tracer.add(f"pass {name}", self.last, perf_counter(), rules=rules)
+        self.last = perf_counter()
+
+
+class _Layers:
+    """RuleSet.apply()'s trace hook: a span per layer, grouped into passes.
+
+    Layers merge rules across passes where order allows, so a run of layers
+    from the same languages (``en``, ``en+es``) makes one pass span.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.n = 0
+        self.group = self.group_start = None
+        self.last = perf_counter()
+
+    def __call__(self, layer, skipped, changed):
+        end = perf_counter()
+        label = "+".join(dict.fromkeys(rule.language for rule in layer.rules))
+        if label != self.group:
+            self.close()
+            self.group, self.group_start = label, self.last
+        args = {"rules": len(layer.rules), "skipped": skipped}
+        if not skipped:
+            args["changed"] = changed
+        self.tracer.add(f"layer {self.n}", self.last, end, **args)
+        self.n += 1
+        self.last = perf_counter()
+
+    def close(self):
+        """Finish the open pass span, if any."""
+        if self.group is not None:
+            self.tracer.add(f"pass {self.group}", self.group_start, self.last)
+            self.group = None
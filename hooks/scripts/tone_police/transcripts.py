@@ -0,0 +1,532 @@
+"""Offline hostility audit of stored session transcripts.
+
+``tone-filter.py --audit-transcripts`` measures, after the fact, how much of
+what was typed into past sessions the filter would have caught::
+
+    python3 hooks/scripts/tone-filter.py --audit-transcripts ~/.claude/projects
+
+Transcripts are JSONL files; a user prompt is a ``"type": "user"`` record
+whose message content is text rather than a tool result (plain
+``{"prompt": ...}`` lines work too). Each file is memory-mapped and cut into
+newline-aligned units of about ``--chunk-mb``; units are scanned in a pool of
+worker processes, each holding one ToneFilter built from the active config,
+so the work spreads over every core and nothing but a unit's statistics ever
+crosses a process boundary. Prompts are scanned, not rewritten (see
+scan.py), and counted per project and per category.
+
+Every finished unit is appended to a state file with its path, byte range,
+a hash of its bytes and its statistics. The next audit with the same state
+file walks each transcript through the units it already has, for as long as
+their bytes hash the same, and cuts fresh units only after that. An
+interrupted audit resumes, and a transcript that has grown is audited only
+from the end of its last complete line seen before. A change of config
+invalidates everything. The state is rewritten without the entries of
+deleted transcripts and of units that no longer match, so it does not grow
+without bound.
+"""
+
+import os
+import sys
+
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Bump when the statistics of a unit change meaning, to invalidate states.
+FORMAT_VERSION = 2
+
+_engine = None
+_severity = None
+
+
+def transcript_files(paths):
+    """Every ``.jsonl`` file under ``paths``, sorted."""
+    out = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirs, files in os.walk(path):
+                out += [
+                    os.path.join(directory, name)
+                    for name in files
+                    if name.endswith(".jsonl")
+                ]
+        elif os.path.exists(path):
+            out.append(path)
+    return sorted(out)
+
+
+def units(path, chunk_bytes=DEFAULT_CHUNK_BYTES, start=0):
+    """Newline-aligned (start, end) byte ranges covering the file from ``start``."""
+    import mmap
+
+    size = os.path.getsize(path)
+    if start >= size:
+        return []
+    out = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                newline = m.find(b"\n", end - 1)
+                end = size if newline < 0 else newline + 1
+            out.append((start, end))
+            start = end
+    return out
+
+
+def _digest(data):
+    try:
+        from _blake2 import blake2b  # skips hashlib's OpenSSL import
+    except ImportError:
+        from hashlib import blake2b
+
+    return blake2b(data, digest_size=16).hexdigest()
+
+
+def plan(path, chunk_bytes=DEFAULT_CHUNK_BYTES, known=None):
+    """The units covering ``path``, reusing the ones audited before.
+
+    Args:
+        path: The transcript.
+        chunk_bytes: Target size of a fresh unit.
+        known: {start: {(end, digest), ...}} of this file's units in the
+            state.
+
+    Returns:
+        List of (start, end, digest): the digest of an earlier unit whose
+        bytes are unchanged, or None for a unit still to audit.
+    """
+    import mmap
+
+    size = os.path.getsize(path)
+    out = []
+    pos = 0
+    if known and size:
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as m:
+            while pos in known:
+                for end, digest in sorted(known[pos], reverse=True):
+                    # A unit cut at the old end of file mid-line has grown.
+                    whole = end == size or m[end - 1 : end] == b"\n"
+                    if end <= size and whole and _digest(m[pos:end]) == digest:
+                        out.append((pos, end, digest))
+                        pos = end
+                        break
+                else:
+                    break
+    out += [(start, end, None) for start, end in units(path, chunk_bytes, pos)]
+    return out
+
+
+def prompt_of(record):
+    """The user-typed text of a transcript record, or None."""
+    if not isinstance(record, dict) or record.get("isMeta"):
+        return None
+    prompt = record.get("prompt")
+    if isinstance(prompt, str):
+        return prompt
+    message = record.get("message")
+    if record.get("type") != "user" or not isinstance(message, dict):
+        return None
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        texts = [
+            block.get("text", "")
+            for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        ]
+        return "\n".join(texts) if texts else None
+    return None
+
+
+def new_stats():
+    return {"prompts": 0, "hostile": 0, "matches": 0, "categories": {}}
+
+
+def merge(total, part):
+    """Add the per-project statistics ``part`` into ``total``."""
+    for project, stats in part.items():
+        into = total.setdefault(project, new_stats())
+        for key in ("prompts", "hostile", "matches"):
+            into[key] += stats[key]
+        for category, n in stats["categories"].items():
+            into["categories"][category] = into["categories"].get(category, 0) + n
+    return total
+
+
+def _init(config, plugin_root, severity):
+    global _engine, _severity
+    from .service import ToneFilter
+
+    _engine = ToneFilter(config, plugin_root)
+    _severity = severity
+
+
+def audit_unit(path, start, end):
+    """Scan the prompts in ``path[start:end]``.
+
+    Returns:
+        (digest, stats): the hash of the bytes scanned, taken from the same
+        mapping so an append or rewrite meanwhile cannot put another
+        unit's hash in the state, and the per-project stats.
+    """
+    import json
+    import mmap
+
+    default_project = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    stats = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        pos = start
+        while pos < end:
+            newline = m.find(b"\n", pos, end)
+            stop = end if newline < 0 else newline
+            # Cheap test before decoding: most records are tool traffic.
+            if m.find(b'"user"', pos, stop) >= 0 or m.find(b'"prompt"', pos, stop) >= 0:
+                try:
+                    record = json.loads(m[pos:stop])
+                except ValueError:
+                    record = None
+                prompt = prompt_of(record)
+                if prompt:
+                    project = record.get("cwd") or default_project
+                    result = _engine.scan(prompt, _severity)
+                    into = stats.setdefault(project, new_stats())
+                    into["prompts"] += 1
+                    if result.matches:
+                        into["hostile"] += 1
+                        into["matches"] += len(result.matches)
+                        for category in result.categories:
+                            into["categories"][category] = (
+                                into["categories"].get(category, 0) + 1
+                            )
+            pos = stop + 1
+        digest = _digest(m[start:end])
+    return digest, stats
+
+
+def _run_unit(job):
+    path, start, end = job
+    digest, stats = audit_unit(path, start, end)
+    return (path, start, end, digest), stats
+
+
+class State:
+    """The resumable record of finished units, one JSON line each.
+
+    Attributes:
+        path: The state file.
+        settings: Fingerprint of the config; lines for other settings are
+            ignored.
+        done: {(path, start, end, digest): per-project stats} read back from
+            the file.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.done = {}
+        self._lines = 0
+        self._file = None
+
+    def load(self):
+        import json
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        entry = json.loads(line)
+                        if entry.get("settings") != self.settings:
+                            continue
+                        key = (
+                            entry["path"],
+                            entry["start"],
+                            entry["end"],
+                            entry["digest"],
+                        )
+                    except (ValueError, KeyError, AttributeError):
+                        continue  # cut short by an interruption
+                    self.done[key] = entry["stats"]
+        except OSError:
+            pass
+        return self
+
+    def known(self):
+        """{path: {start: {(end, digest), ...}}} of the finished units."""
+        out = {}
+        for path, start, end, digest in self.done:
+            out.setdefault(path, {}).setdefault(start, set()).add((end, digest))
+        return out
+
+    def _entry(self, key, stats):
+        import json
+
+        path, start, end, digest = key
+        entry = {
+            "path": path,
+            "start": start,
+            "end": end,
+            "digest": digest,
+            "settings": self.settings,
+            "stats": stats,
+        }
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+
+    def add(self, key, stats):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(self._entry(key, stats))
+        self._file.flush()
+        self._lines += 1
+        self.done[key] = stats
+
+    def prune(self, keep):
+        """Forget every unit but those in ``keep``; rewrites the file if smaller.
+
+        Errors are ignored: a state that keeps growing is only wasteful.
+        """
+        import threading
+
+        self.close()
+        self.done = {key: self.done[key] for key in keep if key in self.done}
+        if self._lines == len(self.done):
+            return
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, stats in self.done.items():
+                    f.write(self._entry(key, stats))
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self._lines = len(self.done)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def settings_key(config, plugin_root, severity):
+    """Fingerprint of everything that decides a unit's statistics."""
+    from .paths import source_files, stat_signature
+    from .pipeline import configured_languages
+
+    languages = configured_languages(config, plugin_root)
+    return repr(
+        (
+            FORMAT_VERSION,
+            sorted(config.items()),
+            severity,
+            stat_signature(source_files(plugin_root, languages)),
+        )
+    )
+
+
+def audit(
+    paths,
+    config,
+    plugin_root,
+    state_path=None,
+    jobs=None,
+    chunk_bytes=DEFAULT_CHUNK_BYTES,
+    severity=None,
+    progress=None,
+):
+    """Audit every transcript under ``paths``.
+
+    Args:
+        paths: Files or directories of ``.jsonl`` transcripts.
+        config: The filter config to audit with.
+        plugin_root: Where the dictionaries are read from.
+        state_path: State file for resuming; None keeps no state.
+        jobs: Worker processes (default: one per core; 1 runs in-process).
+        chunk_bytes: Target size of a unit of work.
+        severity: Only count rules of this level or worse; see scan.py.
+        progress: Optional callable(done, total) after each unit.
+
+    Returns:
+        {project: {"prompts", "hostile", "matches", "categories"}}.
+    """
+    state = State(state_path, settings_key(config, plugin_root, severity))
+    if state_path:
+        state.load()
+    known = state.known()
+    todo = []
+    keys = []
+    audited = set()
+    for path in transcript_files(paths):
+        path = os.path.abspath(path)
+        audited.add(path)
+        for start, end, digest in plan(path, chunk_bytes, known.get(path)):
+            if digest is None:
+                todo.append((path, start, end))
+            else:
+                keys.append((path, start, end, digest))
+    if state_path:
+        # Keep the units in use, and those of other transcripts that exist.
+        others = [
+            key
+            for key in state.done
+            if key[0] not in audited and os.path.exists(key[0])
+        ]
+        state.prune(keys + others)
+
+    total = len(keys) + len(todo)
+    finished = len(keys)
+    jobs = jobs or os.cpu_count() or 1
+    pool = None
+    try:
+        if jobs == 1 or len(todo) <= 1:
+            _init(config, plugin_root, severity)
+            results = map(_run_unit, todo)
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            pool = ProcessPoolExecutor(
+                jobs, initializer=_init, initargs=(config, plugin_root, severity)
+            )
+            futures = [pool.submit(_run_unit, job) for job in todo]
+            results = (future.result() for future in as_completed(futures))
+        for key, stats in results:
+            if state_path:
+                state.add(key, stats)
+            else:
+                state.done[key] = stats
+            keys.append(key)
+            finished += 1
+            if progress:
+                progress(finished, total)
+    finally:
+        state.close()
+        if pool is not None:
+            for future in futures:
+                future.cancel()
+            pool.shutdown()
+
+    out = {}
+    for key in keys:
+        merge(out, state.done[key])
+    return out
+
+
+def summarize(projects):
+    """The report: totals, per-category counts and per-project figures."""
+    overall = new_stats()
+    for stats in projects.values():
+        merge({"all": overall}, {"all": stats})
+    rate = overall["hostile"] / overall["prompts"] if overall["prompts"] else 0.0
+    return {
+        "prompts": overall["prompts"],
+        "hostile": overall["hostile"],
+        "hostility": round(rate, 4),
+        "categories": dict(sorted(overall["categories"].items())),
+        "projects": {
+            project: dict(
+                stats,
+                hostility=round(stats["hostile"] / stats["prompts"], 4)
+                if stats["prompts"]
+                else 0.0,
+            )
+            for project, stats in sorted(projects.items())
+        },
+    }
+
+
+def format_table(summary):
+    lines = [
+        f"{summary['prompts']} prompts, {summary['hostile']} hostile "
+        f"({summary['hostility']:.1%})",
+        "  ".join(f"{c}: {n}" for c, n in summary["categories"].items()),
+        "",
+        f"{'prompts':>8}{'hostile':>9}{'rate':>8}  project",
+    ]
+    ranked = sorted(
+        summary["projects"].items(), key=lambda item: (-item[1]["hostility"], item[0])
+    )
+    for project, stats in ranked:
+        lines.append(
+            f"{stats['prompts']:>8}{stats['hostile']:>9}"
+            f"{stats['hostility']:>8.1%}  {project}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main(argv):
+    """Entry point for ``tone-filter.py --audit-transcripts``."""
+    import argparse
+    import json
+
+    from . import pipeline
+    from .paths import state_dir
+    from .rules import LEVELS
+
+    parser = argparse.ArgumentParser(
+        prog="tone-filter.py --audit-transcripts",
+        description="Measure hostility across stored session transcripts.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[os.path.join(os.path.expanduser("~"), ".claude", "projects")],
+        help="transcript files or directories (default: ~/.claude/projects)",
+    )
+    parser.add_argument("--jobs", type=int, help="worker processes (default: cores)")
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+        help="size of a unit of work (default: %(default)s)",
+    )
+    parser.add_argument("--severity", choices=LEVELS, help="see block_severity")
+    parser.add_argument(
+        "--state",
+        default=os.path.join(state_dir(), "transcript-audit.jsonl"),
+        help="resume file (default: %(default)s)",
+    )
+    parser.add_argument("--fresh", action="store_true", help="discard the state")
+    parser.add_argument(
+        "--json", metavar="PATH", help="write the report (- for stdout)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.fresh:
+        try:
+            os.unlink(args.state)
+        except OSError:
+            pass
+    config, plugin_root = pipeline.load_config()
+
+    def progress(done, total):
+        sys.stderr.write(f"\r{done}/{total} units")
+        sys.stderr.flush()
+
+    projects = audit(
+        args.paths,
+        config,
+        plugin_root,
+        args.state,
+        args.jobs,
+        max(1, int(args.chunk_mb * 1024 * 1024)),
+        args.severity,
+        progress if sys.stderr.isatty() else None,
+    )
+    if sys.stderr.isatty():
+        sys.stderr.write("\n")
+    summary = summarize(projects)
+    if args.json == "-":
+        sys.stdout.write(json.dumps(summary, indent=2, ensure_ascii=False) + "\n")
+        return 0
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    sys.stdout.write(format_table(summary))
+    return 0
@@ -26,6 +26,12 @@ def _load_tone_filter_module():
 tone_filter = _load_tone_filter_module()
 
 
+@pytest.fixture(autouse=True, scope="session")
+def _isolated_artifact_cache(tmp_path_factory):
+    """Keep dictionary artifacts built during tests out of ~/.cache."""
+    os.environ["TONE_POLICE_CACHE_DIR"] = str(tmp_path_factory.mktemp("artifacts"))
+
+
 @pytest.fixture
 def plugin_root():
     """Return the absolute path to the plugin root directory."""
@@ -75,6 +81,8 @@ def run_filter(user_prompt, config_override=None, env_extra=None):
 
     env = os.environ.copy()
     env["CLAUDE_PLUGIN_ROOT"] = str(PLUGIN_ROOT)
+    # Never hand test prompts to a daemon the developer happens to be running.
+    env["TONE_POLICE_DAEMON"] = "0"
     if env_extra:
         env.update(env_extra)
 
@@ -0,0 +1,160 @@
+"""Tests for precompiled dictionary artifacts."""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT, tone_filter  # noqa: E402
+
+from tone_police import artifact, rules  # noqa: E402
+
+SAMPLES = [
+    "What the FUCK is wrong with this STUPID code?!!! It's garbage....",
+    "shut up you idiot, this sucks and I hate this",
+    "esto es mierda, joder. Quel con! Was zur Hölle, du Idiot",
+    "soooo damnnnn annoying, who the hell wrote this?",
+]
+
+
+def _reference(text, languages, intensity):
+    """The original module-level pipeline, minus code protection."""
+    text = tone_filter.apply_common_patterns(
+        text, tone_filter.load_common_patterns(PLUGIN_ROOT)
+    )
+    for lang in languages:
+        dictionary = tone_filter.load_dictionary(PLUGIN_ROOT, lang)
+        if dictionary:
+            patterns = tone_filter.get_intensity_patterns(dictionary, intensity)
+            text = tone_filter.apply_language_patterns(text, patterns)
+    return text
+
+
+@pytest.fixture
+def plugin_copy(tmp_path):
+    """A writable plugin root so tests can edit dictionaries."""
+    root = tmp_path / "plugin"
+    shutil.copytree(PLUGIN_ROOT / "dictionaries", root / "dictionaries")
+    return root
+
+
+@pytest.fixture(autouse=True)
+def _fresh_memo():
+    artifact._loaded.clear()
+    yield
+    artifact._loaded.clear()
+
+
+# ---------------------------------------------------------------------------
+# 1. Round trip
+# ---------------------------------------------------------------------------
+
+
+class TestRoundTrip:
+    @pytest.mark.parametrize("intensity", rules.LEVELS)
+    def test_loaded_ruleset_matches_build(self, tmp_path, intensity):
+        langs = ("en", "es", "fr", "de")
+        path, built = artifact.build(PLUGIN_ROOT, langs, intensity, str(tmp_path))
+        sources = artifact.source_files(PLUGIN_ROOT, langs)
+        loaded, fresh = artifact.read_artifact(
+            path, langs, intensity, artifact.stat_signature(sources), sources
+        )
+        assert fresh
+        assert loaded.passes == built.passes
+        assert loaded.layers == built.layers
+        assert [(r.id, r.key, r.level, r.anchors) for r in loaded.rules] == [
+            (r.id, r.key, r.level, r.anchors) for r in built.rules
+        ]
+
+    def test_line_local_is_stored(self, tmp_path):
+        path, built = artifact.build(PLUGIN_ROOT, ("en",), "strict", str(tmp_path))
+        sources = artifact.source_files(PLUGIN_ROOT, ("en",))
+        loaded, _ = artifact.read_artifact(
+            path, ("en",), "strict", artifact.stat_signature(sources), sources
+        )
+        assert loaded._line_local is built.line_local is True
+
+    def test_rules_are_stored_once(self, tmp_path):
+        _, ruleset = artifact.build(PLUGIN_ROOT, ("en",), "strict", str(tmp_path))
+        assert len(ruleset.rules) == len(set(ruleset.sequence))
+        assert len({rule.key for rule in ruleset.rules}) == len(ruleset.rules)
+
+    @pytest.mark.parametrize("intensity", rules.LEVELS)
+    @pytest.mark.parametrize("text", SAMPLES)
+    def test_output_matches_reference(self, tmp_path, intensity, text):
+        langs = ("en", "es", "fr", "de")
+        ruleset = artifact.load_ruleset(PLUGIN_ROOT, langs, intensity, str(tmp_path))
+        assert ruleset.apply(text) == _reference(text, langs, intensity)
+
+
+# ---------------------------------------------------------------------------
+# 2. Invalidation
+# ---------------------------------------------------------------------------
+
+
+class TestInvalidation:
+    def test_edited_dictionary_rebuilds(self, plugin_copy, tmp_path):
+        cache = str(tmp_path / "cache")
+        before = artifact.load_ruleset(plugin_copy, ("en",), "light", cache)
+        assert before.apply("crap") == "crud"
+
+        en = plugin_copy / "dictionaries" / "en.json"
+        en.write_text(en.read_text().replace('"crud"', '"cruddy"'))
+        artifact._loaded.clear()
+        after = artifact.load_ruleset(plugin_copy, ("en",), "light", cache)
+        assert after.apply("crap") == "cruddy"
+
+    def test_touched_dictionary_reuses_artifact(self, plugin_copy, tmp_path):
+        cache = str(tmp_path / "cache")
+        artifact.load_ruleset(plugin_copy, ("en",), "light", cache)
+        en = plugin_copy / "dictionaries" / "en.json"
+        st = en.stat()
+        os.utime(en, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        path = artifact.artifact_path(cache, plugin_copy, ("en",), "light")
+        sources = artifact.source_files(plugin_copy, ("en",))
+        signature = artifact.stat_signature(sources)
+        ruleset, fresh = artifact.read_artifact(
+            path, ("en",), "light", signature, sources
+        )
+        assert ruleset is not None and not fresh
+
+        artifact.load_ruleset(plugin_copy, ("en",), "light", cache)
+        _, fresh = artifact.read_artifact(path, ("en",), "light", signature, sources)
+        assert fresh
+
+    def test_corrupt_artifact_rebuilds(self, tmp_path):
+        cache = str(tmp_path / "cache")
+        path = artifact.artifact_path(cache, PLUGIN_ROOT, ("en",), "moderate")
+        os.makedirs(cache)
+        Path(path).write_bytes(b"TPDA garbage")
+        ruleset = artifact.load_ruleset(PLUGIN_ROOT, ("en",), "moderate", cache)
+        assert ruleset.apply("shut up") == "please stop"
+        assert Path(path).read_bytes()[:4] == artifact.MAGIC
+
+    def test_intensity_and_languages_get_separate_artifacts(self, tmp_path):
+        a = artifact.artifact_path(str(tmp_path), PLUGIN_ROOT, ("en",), "light")
+        b = artifact.artifact_path(str(tmp_path), PLUGIN_ROOT, ("en",), "strict")
+        c = artifact.artifact_path(str(tmp_path), PLUGIN_ROOT, ("en", "es"), "light")
+        assert len({a, b, c}) == 3
+
+    def test_checkouts_get_separate_artifacts(self, plugin_copy, tmp_path):
+        cache = str(tmp_path / "cache")
+        ours = artifact.artifact_path(cache, PLUGIN_ROOT, ("en",), "light")
+        theirs = artifact.artifact_path(cache, plugin_copy, ("en",), "light")
+        assert ours != theirs
+        artifact.load_ruleset(PLUGIN_ROOT, ("en",), "light", cache)
+        artifact.load_ruleset(plugin_copy, ("en",), "light", cache)
+        assert os.path.exists(ours) and os.path.exists(theirs)
+        link = tmp_path / "link"
+        link.symlink_to(plugin_copy)
+        assert artifact.artifact_path(cache, link, ("en",), "light") == theirs
+
+    def test_config_values_cannot_escape_cache_dir(self, tmp_path):
+        path = artifact.artifact_path(
+            str(tmp_path), PLUGIN_ROOT, ("../../etc",), "light"
+        )
+        assert os.path.dirname(path) == str(tmp_path)
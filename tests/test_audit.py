@@ -0,0 +1,269 @@
+"""Tests for the log_transforms audit log."""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import artifact, audit, bench, pipeline  # noqa: E402
+
+HOSTILE = "What the FUCK, this shit sucks!!!"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_logs(monkeypatch):
+    monkeypatch.setattr(audit, "_logs", {})
+
+
+@pytest.fixture
+def project(tmp_path):
+    def write(**config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps({"intensity": "moderate", "languages": ["en"], **config})
+        )
+        return {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+        }
+
+    return write
+
+
+def _lines(path):
+    return [json.loads(line) for line in Path(path).read_text().splitlines()]
+
+
+def _rebuild(before, after, spans):
+    """``before`` with every span replaced by its counterpart in ``after``."""
+    out = []
+    pos = 0
+    for start, end, new_start, new_end in spans:
+        out.append(before[pos:start])
+        out.append(after[new_start:new_end])
+        pos = end
+    out.append(before[pos:])
+    return "".join(out)
+
+
+def _rewrite(size):
+    """A hostile prompt of ``size`` characters and its strict rewrite."""
+    config = {"languages": ["en"], "intensity": "strict"}
+    ruleset = pipeline.load_rules(config, PLUGIN_ROOT)
+    text = bench.corpus("hostile", size)
+    hits = set()
+    return text, pipeline.apply_rules(text, ruleset, True, hits), hits
+
+
+# ---------------------------------------------------------------------------
+# 1. Records
+# ---------------------------------------------------------------------------
+
+
+class TestRecords:
+    def test_rewrite_is_logged(self, project, tmp_path):
+        log = tmp_path / "audit.jsonl"
+        environ = project(log_transforms=True, log_path=str(log))
+        assert pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        (entry,) = _lines(log)
+        assert entry["project"] == environ["CLAUDE_PROJECT_DIR"]
+        assert entry["mode"] == "rewrite"
+        assert entry["intensity"] == "moderate"
+        assert "common/caps_normalization" in entry["rules"]
+        assert {"profanity", "excessive_punctuation"} <= set(entry["categories"])
+        assert entry["prompt"] == HOSTILE
+        assert entry["rewritten"] != HOSTILE
+        for span in entry["spans"]:
+            assert HOSTILE[span["start"] : span["end"]] == span["before"]
+            assert span["after"] in entry["rewritten"]
+
+    def test_clean_prompts_and_disabled_logging_write_nothing(self, project, tmp_path):
+        log = tmp_path / "audit.jsonl"
+        environ = project(log_transforms=True, log_path=str(log))
+        assert not pipeline.handle(json.dumps({"prompt": "lgtm"}), environ)
+        environ = project(log_transforms=False, log_path=str(log))
+        assert pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        assert not log.exists()
+
+    @pytest.mark.parametrize("log_transforms", [False, True])
+    def test_logging_keeps_the_block_verdict(self, project, tmp_path, log_transforms):
+        log = tmp_path / "audit.jsonl"
+        environ = project(
+            mode="block",
+            block_severity="light",
+            block_suggestion=False,
+            log_transforms=log_transforms,
+            log_path=str(log),
+        )
+        assert not pipeline.handle(
+            json.dumps({"prompt": "this CODE is BROKEN"}), environ
+        )
+        output = json.loads(
+            pipeline.handle(json.dumps({"prompt": "this is shit"}), environ)
+        )
+        assert output["decision"] == "block"
+        assert "(profanity)" in output["reason"]
+        assert "Suggested" not in output["reason"]
+        if log_transforms:
+            (entry,) = _lines(log)
+            assert entry["mode"] == "block"
+            assert entry["categories"] == ["profanity"]
+            assert entry["prompt"] == "this is shit"
+            assert entry["rewritten"] is None and entry["spans"] is None
+        else:
+            assert not log.exists()
+
+    def test_blocked_suggestion_is_logged(self, project, tmp_path):
+        log = tmp_path / "audit.jsonl"
+        environ = project(mode="block", log_transforms=True, log_path=str(log))
+        output = json.loads(pipeline.handle(json.dumps({"prompt": HOSTILE}), environ))
+        (entry,) = _lines(log)
+        assert entry["rewritten"] in output["reason"]
+        assert entry["spans"]
+
+    def test_redaction(self, project, tmp_path):
+        log = tmp_path / "audit.jsonl"
+        environ = project(log_transforms=True, log_path=str(log), log_redact=True)
+        environ["XDG_STATE_HOME"] = str(tmp_path / "state")
+        pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        text = log.read_text()
+        assert "shit" not in text and "shoot" not in text
+        (entry,) = _lines(log)
+        assert len(entry["prompt_blake2b"]) == 64
+        assert entry["spans"]
+        for span in entry["spans"]:
+            assert set(span) == {"start", "end", "length"}
+
+    def test_redaction_is_keyed_per_install(self, tmp_path, monkeypatch):
+        import hashlib
+
+        monkeypatch.setattr(audit, "_keys", {})
+        config = {"log_redact": True}
+        first = {"XDG_STATE_HOME": str(tmp_path / "a")}
+        second = {"XDG_STATE_HOME": str(tmp_path / "b")}
+        entry = audit.make_entry(config, None, "shut up", "please", set(), True, first)
+        digest = entry["prompt_blake2b"]
+        assert digest != hashlib.sha256(b"shut up").hexdigest()
+        assert digest != hashlib.blake2b(b"shut up", digest_size=32).hexdigest()
+        again = audit.make_entry(config, None, "shut up", "please", set(), True, first)
+        assert again["prompt_blake2b"] == digest
+        other = audit.make_entry(config, None, "shut up", "please", set(), True, second)
+        assert other["prompt_blake2b"] != digest
+        key = tmp_path / "a" / "tone-police" / "audit.key"
+        assert key.stat().st_mode & 0o777 == 0o600
+        assert len(key.read_bytes()) == audit.KEY_BYTES
+
+    def test_matched_rules_agree_with_sequential_run(self):
+        ruleset = artifact.load_ruleset(PLUGIN_ROOT, ("en", "es", "de"), "strict")
+        for text in [HOSTILE, "who the hell wrote this?", "Scheiße, joder!!", "ok"]:
+            layered, sequential = set(), set()
+            ruleset.apply(text, layered)
+            ruleset.apply_sequential(text, sequential)
+            assert layered == sequential
+
+    def test_changed_spans(self):
+        assert audit.changed_spans("fix this shit now", "fix this shoot now") == [
+            (9, 13, 9, 14)
+        ]
+        assert audit.changed_spans("same", "same") == []
+        assert audit.changed_spans("shut up now", "please stop now") == [(0, 7, 0, 11)]
+
+    @pytest.mark.parametrize(
+        "before, after",
+        [("", "new"), ("old", ""), ("a b c", "a b c d"), ("x a b c", "a b c")],
+    )
+    def test_changed_spans_at_the_ends(self, before, after):
+        spans = audit.changed_spans(before, after)
+        assert spans
+        assert _rebuild(before, after, spans) == after
+
+    def test_changed_spans_of_a_large_rewrite(self):
+        text, rewritten, _ = _rewrite(40 * 1024)
+        start = time.perf_counter()
+        spans = audit.changed_spans(text, rewritten)
+        assert time.perf_counter() - start < 1
+        assert len(spans) > 100
+        assert _rebuild(text, rewritten, spans) == rewritten
+
+
+# ---------------------------------------------------------------------------
+# 2. Buffering, rotation and the time cap
+# ---------------------------------------------------------------------------
+
+
+class TestWriting:
+    def test_rotation(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        log = audit.AuditLog(str(path), max_bytes=200, backups=2, time_budget=5)
+        for i in range(20):
+            log.record({"n": i, "pad": "x" * 40})
+            log.flush()
+        assert {p.name for p in tmp_path.iterdir()} == {
+            "audit.jsonl",
+            "audit.jsonl.1",
+            "audit.jsonl.2",
+        }
+        assert all(p.stat().st_size <= 200 for p in tmp_path.iterdir())
+        assert _lines(path)[-1]["n"] == 19
+
+    def test_records_are_batched_after_the_first_flush(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        log = audit.AuditLog(str(path), audit.DEFAULT_MAX_BYTES, 1, time_budget=5)
+        log.record({"n": 0})
+        log.record({"n": 1})
+        assert [e["n"] for e in _lines(path)] == [0]
+        log.flush()
+        assert [e["n"] for e in _lines(path)] == [0, 1]
+
+    def test_late_batches_are_written_by_the_next_flush(self, tmp_path):
+        release = threading.Event()
+        path = tmp_path / "audit.jsonl"
+        log = audit.AuditLog(str(path), 1 << 20, 1, 0.05)
+        start = time.perf_counter()
+        log.record({"n": 0}, lambda entry: release.wait())
+        assert time.perf_counter() - start < 1
+        assert log.late == 1 and not path.exists()
+        release.set()
+        log.close()
+        assert [e["n"] for e in _lines(path)] == [0]
+        assert log.dropped == 0
+
+    def test_batches_still_late_at_close_are_dropped(self, tmp_path):
+        release = threading.Event()
+        path = tmp_path / "audit.jsonl"
+        log = audit.AuditLog(str(path), 1 << 20, 1, 0.05)
+        log.record({"n": 0}, lambda entry: release.wait())
+        log.record({"n": 1})
+        log.close()
+        assert log.dropped == 1
+        release.set()
+        assert [e["n"] for e in _lines(path)] == [1]
+
+    def test_large_prompt_stays_under_budget(self, tmp_path):
+        text, rewritten, hits = _rewrite(40 * 1024)
+        path = tmp_path / "audit.jsonl"
+        config = {"log_path": str(path), "log_time_budget_ms": 50}
+        start = time.perf_counter()
+        audit.log_transform(config, {}, text, rewritten, hits)
+        assert time.perf_counter() - start < 0.5
+        log = audit.get_log(config, {})
+        log.time_budget = 10  # as if at exit, on a slow machine
+        log.close()
+        (entry,) = _lines(path)
+        assert len(entry["spans"]) > 100
+        for span in entry["spans"]:
+            assert text[span["start"] : span["end"]] == span["before"]
+
+    def test_unwritable_path_is_ignored(self, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        log = audit.AuditLog(str(blocker / "audit.jsonl"), 1 << 20, 1, 5)
+        log.record({"n": 0})
+        assert log.flush()
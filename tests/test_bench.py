@@ -0,0 +1,114 @@
+"""Tests for the benchmark suite (the harness, not the numbers)."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import bench  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+QUICK = ["--corpora", "clean", "--sizes", "256", "--runs", "1", "--subprocess-runs"]
+
+
+def _timing(best):
+    return {"best_ms": best, "median_ms": best}
+
+
+# ---------------------------------------------------------------------------
+# 1. Corpora
+# ---------------------------------------------------------------------------
+
+
+class TestCorpora:
+    @pytest.mark.parametrize("kind", bench.CORPORA)
+    def test_size_and_determinism(self, kind):
+        text = bench.corpus(kind, 4096)
+        assert len(text) >= 4096
+        assert text == bench.corpus(kind, 4096)
+
+    def test_kinds_differ_in_content(self):
+        assert "```" in bench.corpus("code", 4096)
+        assert "Scheiß" in bench.corpus("multilang", 4096)
+        assert "FUCK" in bench.corpus("hostile", 4096)
+        assert "FUCK" not in bench.corpus("clean", 4096)
+
+
+# ---------------------------------------------------------------------------
+# 2. Stages and regression gate
+# ---------------------------------------------------------------------------
+
+
+class TestRun:
+    def test_every_stage_is_timed(self):
+        results = bench.run(corpora=["code"], sizes=[512], runs=1, subprocess_runs=1)
+        stages = {key.split("/")[0] for key in results}
+        assert stages == {
+            "load_config",
+            "load_dictionaries",
+            "load_ruleset",
+            "split_code_blocks",
+            "apply_common_patterns",
+            "apply_language_patterns",
+            "ruleset_apply",
+            "detect_languages",
+            "ruleset_apply_auto",
+            "filter_text",
+            "subprocess",
+        }
+        assert "subprocess/code/512" in results
+        assert all(r["best_ms"] <= r["median_ms"] for r in results.values())
+
+    def test_compare(self):
+        baseline = {"a": _timing(1.0), "b": _timing(1.0), "c": _timing(0.01)}
+        results = {"a": _timing(1.2), "b": _timing(1.3), "c": _timing(0.05)}
+        assert bench.compare(results, baseline) == [("b", 1.0, 1.3)]
+        assert bench.compare(results, baseline, threshold=0.5) == []
+
+    def test_stored_baseline_covers_the_default_suite(self):
+        with open(bench.BASELINE) as f:
+            baseline = json.load(f)["results"]
+        for kind in bench.CORPORA:
+            for size in bench.SIZES:
+                assert f"ruleset_apply/{kind}/{size}" in baseline
+                assert f"subprocess/{kind}/{size}" in baseline
+
+
+class TestCommandLine:
+    def _bench(self, *args):
+        env = {**os.environ, "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT)}
+        return subprocess.run(
+            [sys.executable, str(SCRIPT), "--bench", *QUICK, "0", *args],
+            capture_output=True,
+            text=True,
+            env=env,
+            timeout=120,
+        )
+
+    def test_report_is_json(self, tmp_path):
+        output = tmp_path / "report.json"
+        result = self._bench("--output", str(output))
+        assert result.returncode == 0
+        report = json.loads(output.read_text())
+        assert report["python"]
+        assert "filter_text/clean/256" in report["results"]
+
+    def test_regression_fails_the_run(self, tmp_path):
+        fast = tmp_path / "fast.json"
+        slow = tmp_path / "slow.json"
+        key = "apply_language_patterns/clean/256"
+        fast.write_text(json.dumps({"results": {key: _timing(1e-6)}}))
+        slow.write_text(json.dumps({"results": {key: _timing(1e6)}}))
+
+        result = self._bench("--output", os.devnull, "--baseline", str(fast))
+        assert result.returncode == 1
+        assert f"REGRESSION {key}" in result.stderr
+        result = self._bench("--output", os.devnull, "--baseline", str(slow))
+        assert result.returncode == 0
@@ -0,0 +1,134 @@
+"""Tests for the zipapp build and the minimal-import entry path."""
+
+import json
+import os
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import bundle, jsonlite  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+PROMPTS = [
+    "",
+    "Please refactor the parser.",
+    "What the FUCK is wrong with this STUPID code?!!!",
+    "esto es mierda, joder. Quel con! Was zur Hölle, du Idiot",
+]
+
+
+@pytest.fixture(scope="module")
+def pyz(tmp_path_factory):
+    return bundle.build(tmp_path_factory.mktemp("dist") / "tone-police.pyz")
+
+
+def _run(argv, prompt, **env):
+    full_env = {**os.environ, "TONE_POLICE_DAEMON": "0", **env}
+    full_env = {k: v for k, v in full_env.items() if v is not None}
+    return subprocess.run(
+        argv,
+        input=json.dumps({"prompt": prompt}),
+        capture_output=True,
+        text=True,
+        env=full_env,
+        timeout=30,
+    )
+
+
+# ---------------------------------------------------------------------------
+# 1. Archive contents
+# ---------------------------------------------------------------------------
+
+
+class TestArchive:
+    def test_contains_bytecode_and_data(self, pyz):
+        names = set(zipfile.ZipFile(pyz).namelist())
+        assert {
+            "__main__.pyc",
+            "tone_police/pipeline.pyc",
+            "dictionaries/en.json",
+            "dictionaries/common-patterns.json",
+            "config/default-config.json",
+        } <= names
+
+    def test_no_compile_ships_sources_only(self, tmp_path):
+        output = bundle.build(tmp_path / "plain.pyz", compile=False)
+        names = zipfile.ZipFile(output).namelist()
+        assert "__main__.py" in names
+        assert not [name for name in names if name.endswith(".pyc")]
+
+
+# ---------------------------------------------------------------------------
+# 2. Same behavior as the script
+# ---------------------------------------------------------------------------
+
+
+class TestRun:
+    @pytest.mark.parametrize("prompt", PROMPTS)
+    def test_matches_script(self, pyz, prompt):
+        env = {"CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT)}
+        expected = _run([sys.executable, str(SCRIPT)], prompt, **env)
+        actual = _run([sys.executable, "-S", str(pyz)], prompt, **env)
+        assert actual.returncode == expected.returncode == 0
+        assert actual.stdout == expected.stdout
+
+    def test_embedded_dictionaries(self, pyz, tmp_path):
+        result = _run(
+            [sys.executable, "-S", str(pyz)],
+            "What the FUCK",
+            CLAUDE_PLUGIN_ROOT=None,
+            TONE_POLICE_CACHE_DIR=str(tmp_path),
+        )
+        assert result.returncode == 0
+        assert "fudge" in result.stdout.lower() or "on earth" in result.stdout
+        unpacked = [p for p in tmp_path.iterdir() if p.name.startswith("bundle-")]
+        assert len(unpacked) == 1
+        assert (unpacked[0] / "dictionaries" / "en.json").exists()
+
+    def test_empty_prompt_imports_nothing_heavy(self, pyz):
+        result = _run(
+            [sys.executable, "-S", "-X", "importtime", str(pyz)],
+            "",
+            CLAUDE_PLUGIN_ROOT=str(PLUGIN_ROOT),
+        )
+        imported = {line.split("|")[-1].strip() for line in result.stderr.splitlines()}
+        assert not imported & {"re", "json", "pathlib", "enum", "socket"}
+
+    def test_measure(self, pyz):
+        commands = [("zipapp", [sys.executable, "-S", str(pyz)])]
+        results = bundle.measure(commands, PLUGIN_ROOT, runs=1)
+        assert set(results) == {
+            (label, "zipapp") for label, _ in bundle.MEASURE_PAYLOADS
+        }
+        assert "zipapp" in bundle.format_measurements(results, commands)
+
+
+# ---------------------------------------------------------------------------
+# 3. JSON without the json module
+# ---------------------------------------------------------------------------
+
+
+class TestJsonLite:
+    @pytest.mark.parametrize(
+        "text",
+        [
+            '{"prompt": "h\\u00e9llo", "n": [1, 2.5, -3e2, true, null]}',
+            '  \n{"a": {"b": "c"}}\n',
+            '"just a string"',
+            "[NaN, Infinity]",
+        ],
+    )
+    def test_matches_json(self, text):
+        assert repr(jsonlite.loads(text)) == repr(json.loads(text))
+
+    @pytest.mark.parametrize("text", ["", "{", '{"a": 1} trailing', "{'a': 1}"])
+    def test_invalid_input_raises_value_error(self, text):
+        with pytest.raises(ValueError):
+            jsonlite.loads(text)
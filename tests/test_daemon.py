@@ -0,0 +1,160 @@
+"""Tests for the filter daemon and its thin hook client."""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import client, daemon, pipeline  # noqa: E402
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets"
+)
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are capped at ~104 bytes, so avoid deep pytest tmp dirs.
+    tmp = tempfile.mkdtemp(prefix="tp-")
+    yield os.path.join(tmp, "tone-police.sock")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    server = daemon.make_server(socket_path)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def _env(socket_path, **extra):
+    env = {"CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT), "TONE_POLICE_SOCKET": socket_path}
+    env.update(extra)
+    return env
+
+
+# ---------------------------------------------------------------------------
+# 1. Request framing
+# ---------------------------------------------------------------------------
+
+
+class TestFraming:
+    def test_round_trip(self):
+        raw = json.dumps({"prompt": "fuck this"})
+        env = {"CLAUDE_PROJECT_DIR": "/work", "HOME": "/root", "TONE_POLICE_X": "1"}
+        decoded_raw, decoded_env = client.decode_request(client.encode_request(raw, env))
+        assert decoded_raw == raw
+        # Only CLAUDE_* / TONE_POLICE_* variables are forwarded
+        assert decoded_env == {"CLAUDE_PROJECT_DIR": "/work", "TONE_POLICE_X": "1"}
+
+    def test_bad_header_rejected(self):
+        with pytest.raises(ValueError):
+            client.decode_request(b"XX\0\0{}")
+
+
+# ---------------------------------------------------------------------------
+# 2. Daemon replies match in-process filtering
+# ---------------------------------------------------------------------------
+
+
+class TestDaemonReplies:
+    def test_rewrite_matches_in_process(self, running_daemon):
+        raw = json.dumps({"prompt": "this is shit code"})
+        env = _env(running_daemon)
+        assert client.request(raw, env) == pipeline.handle(raw, env)
+
+    def test_clean_prompt_returns_empty_string(self, running_daemon):
+        raw = json.dumps({"prompt": "please help"})
+        assert client.request(raw, _env(running_daemon)) == ""
+
+    def test_project_override_forwarded(self, running_daemon, tmp_path):
+        claude_dir = tmp_path / ".claude"
+        claude_dir.mkdir()
+        (claude_dir / "tone-police.config.json").write_text(
+            json.dumps({"enabled": False})
+        )
+        raw = json.dumps({"prompt": "fuck this"})
+        env = _env(running_daemon, CLAUDE_PROJECT_DIR=str(tmp_path))
+        assert client.request(raw, env) == ""
+
+
+# ---------------------------------------------------------------------------
+# 3. Fallback when no daemon is running
+# ---------------------------------------------------------------------------
+
+
+class TestFallback:
+    def test_missing_socket_returns_none(self, socket_path):
+        assert client.request("{}", _env(socket_path)) is None
+
+    def test_disabled_by_env(self, running_daemon):
+        env = _env(running_daemon, TONE_POLICE_DAEMON="0")
+        assert client.request("{}", env) is None
+
+    def test_shared_directory_is_not_trusted(self, running_daemon):
+        os.chmod(os.path.dirname(running_daemon), 0o755)
+        assert client.request("{}", _env(running_daemon)) is None
+
+    def test_symlinked_directory_is_not_trusted(self, running_daemon):
+        link = os.path.dirname(running_daemon) + "-link"
+        os.symlink(os.path.dirname(running_daemon), link)
+        try:
+            path = os.path.join(link, "tone-police.sock")
+            assert client.request("{}", _env(path)) is None
+        finally:
+            os.unlink(link)
+
+    def test_daemon_refuses_shared_directory(self, socket_path):
+        os.chmod(os.path.dirname(socket_path), 0o755)
+        with pytest.raises(RuntimeError, match="0700"):
+            daemon.make_server(socket_path)
+        assert not os.path.exists(socket_path)
+
+    def test_stale_socket_is_replaced(self, socket_path):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        daemon._claim_socket(socket_path)
+        assert not os.path.exists(socket_path)
+
+    def test_script_without_daemon(self, socket_path):
+        script = str(PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py")
+        env = {**os.environ, **_env(socket_path)}
+        env.pop("TONE_POLICE_DAEMON", None)
+        result = subprocess.run(
+            [sys.executable, script],
+            input=json.dumps({"prompt": "this is shit code"}),
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        assert "shoot" in result.stdout
+
+    def test_script_through_daemon(self, running_daemon):
+        script = str(PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py")
+        env = {**os.environ, **_env(running_daemon)}
+        env.pop("TONE_POLICE_DAEMON", None)
+        raw = json.dumps({"prompt": "this is shit code"})
+        result = subprocess.run(
+            [sys.executable, script],
+            input=raw,
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        assert result.stdout == pipeline.handle(raw, env)
@@ -0,0 +1,119 @@
+"""Tests for "languages": "auto" detection."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import detect, pipeline, service  # noqa: E402
+
+LANGUAGES = ["en", "es", "fr", "de"]
+INSTALLED = sorted(LANGUAGES)
+AUTO = {"languages": "auto", "intensity": "strict", "mode": "rewrite"}
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    return detect.profiles(PLUGIN_ROOT, LANGUAGES)
+
+
+# ---------------------------------------------------------------------------
+# 1. Scoring
+# ---------------------------------------------------------------------------
+
+
+class TestDetect:
+    @pytest.mark.parametrize(
+        "text, expected",
+        [
+            ("Why is this test failing? Please fix the parser.", ("en",)),
+            ("¿Por qué el código no funciona? Esto está roto.", ("es",)),
+            ("Pourquoi ce test est cassé ? Je ne comprends pas.", ("fr",)),
+            ("Warum ist der Test kaputt? Bitte hilf mir, das ist ärgerlich.", ("de",)),
+        ],
+    )
+    def test_single_language(self, profiles, text, expected):
+        assert detect.detect(text, profiles) == expected
+
+    def test_mixed_prompt_keeps_both_languages(self, profiles):
+        text = (
+            "The deploy is broken again and this is the third time. "
+            "Mi jefe dice que esto es una mierda y que el código está roto."
+        )
+        assert detect.detect(text, profiles) == ("en", "es")
+
+    def test_too_little_evidence_is_unsure(self, profiles):
+        assert detect.detect("wtf", profiles) is None
+        assert detect.detect("Traceback: KeyError 42", profiles) is None
+
+    def test_stopword_lists_do_not_overlap(self, profiles):
+        words, letters = profiles
+        assert set(letters) == set(LANGUAGES)
+        for language in LANGUAGES:
+            dictionary = pipeline.load_dictionary(PLUGIN_ROOT, language)
+            stopwords = dictionary["detect"]["stopwords"]
+            assert all(words[word] == language for word in stopwords)
+
+    def test_dictionaries_without_a_profile_are_skipped(self, tmp_path):
+        (tmp_path / "dictionaries").mkdir()
+        (tmp_path / "dictionaries" / "xx.json").write_text(
+            json.dumps({"language": "xx", "patterns": {}})
+        )
+        assert detect.profiles(tmp_path, ["xx"]) == ({}, {})
+        assert detect.available_languages(tmp_path) == ["xx"]
+
+
+# ---------------------------------------------------------------------------
+# 2. Pipeline integration
+# ---------------------------------------------------------------------------
+
+
+class TestAuto:
+    def test_candidates(self):
+        assert pipeline.configured_languages(AUTO, PLUGIN_ROOT) == INSTALLED
+        config = dict(AUTO, auto_languages=["en", "de"])
+        assert pipeline.configured_languages(config, PLUGIN_ROOT) == ["en", "de"]
+        explicit = {"languages": ["fr"]}
+        assert pipeline.configured_languages(explicit, PLUGIN_ROOT) == ["fr"]
+
+    def test_only_detected_rules_run(self):
+        text = "Why is this shit failing? Please fix the damn parser."
+        ruleset = pipeline.load_rules(AUTO, PLUGIN_ROOT, text)
+        assert ruleset.languages == ("en",)
+        assert pipeline.load_rules(AUTO, PLUGIN_ROOT).languages == tuple(INSTALLED)
+
+    def test_unsure_falls_back_to_every_candidate(self):
+        ruleset = pipeline.load_rules(AUTO, PLUGIN_ROOT, "joder")
+        assert ruleset.languages == tuple(INSTALLED)
+        assert pipeline.filter_text("joder", AUTO, PLUGIN_ROOT) != "joder"
+
+    def test_confidence_threshold(self):
+        text = (
+            "The deploy is broken again and this is the third time. "
+            "Mi jefe dice que esto es una mierda y que el código está roto."
+        )
+        strict = dict(AUTO, language_confidence=1.0)
+        loose = dict(AUTO, language_confidence=0.3)
+        assert pipeline.select_languages(strict, PLUGIN_ROOT, text) == ("en", "es")
+        assert len(pipeline.select_languages(loose, PLUGIN_ROOT, text)) == 1
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "What the hell is this shit? Why does the build fail?",
+            "Esto es una mierda, joder. ¿Quién escribió este código?",
+            "Putain, c'est de la merde, quel con a écrit ça ?",
+            "Was zur Hölle ist das für ein Scheiß, du Idiot!",
+        ],
+    )
+    def test_same_result_as_every_language(self, text):
+        everything = dict(AUTO, languages=LANGUAGES)
+        expected = pipeline.filter_text(text, everything, PLUGIN_ROOT)
+        assert expected != text
+        assert pipeline.filter_text(text, AUTO, PLUGIN_ROOT) == expected
+        engine = service.ToneFilter(AUTO, PLUGIN_ROOT)
+        assert engine.filter(text).text == expected
@@ -0,0 +1,298 @@
+"""Tests for merged rule layers and the pattern analysis behind them."""
+
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import analysis, engine, folding, rules  # noqa: E402
+
+LANGS = ("en", "es", "fr", "de")
+
+TRICKY = [
+    "what the fucking hell",
+    "fuuuucking fuuuck",
+    "who the hell wrote this? go to hell",
+    "WHAT THE FUCK, this sucks and I hate this",
+    "this is shit!!! ſhit İdiot",
+    "Scheiße, du Idiot! putain de merde, joder",
+    "hell_yeah hell-yeah hellish shell",
+    "crap\ncrap\tcrap",
+]
+
+
+def _automaton(pattern, flags=re.IGNORECASE, *others):
+    forms = [analysis.linear_form(pattern, flags)]
+    forms += [analysis.linear_form(p, flags) for p in others]
+    alphabet = analysis.Alphabet(forms)
+    return [analysis.Automaton(form, alphabet) for form in forms]
+
+
+@pytest.fixture(scope="module")
+def rulesets():
+    return {
+        level: rules.build_ruleset(PLUGIN_ROOT, LANGS, level) for level in rules.LEVELS
+    }
+
+
+# ---------------------------------------------------------------------------
+# 1. Pattern analysis
+# ---------------------------------------------------------------------------
+
+
+class TestAnalysis:
+    @pytest.mark.parametrize(
+        "pattern",
+        [r"\bf+u+c+k+\b", r"[!?]{3,}", r"\bwhat the f\w+", r"\.{4,}"],
+    )
+    def test_dictionary_shapes_are_linear(self, pattern):
+        assert analysis.linear_form(pattern, re.IGNORECASE) is not None
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [r"(\w)\1{2,}", r"foo|bar", r"^foo", r"(?=a)b", r"a*", r"(?P<x>a)"],
+    )
+    def test_other_shapes_are_opaque(self, pattern):
+        assert analysis.linear_form(pattern, 0) is None
+
+    def test_overlapping_phrases(self):
+        hell, who = _automaton(r"\bhell\b", re.IGNORECASE, r"\bwho the hell\b")
+        assert analysis.can_overlap(hell, who)
+
+    def test_disjoint_words(self):
+        crap, damn = _automaton(r"\bcrap\b", re.IGNORECASE, r"\bdamn\b")
+        assert not analysis.can_overlap(crap, damn)
+
+    def test_word_boundaries_are_respected(self):
+        # "ab" and "bc" share a "b" in "abc", but \b forbids both matching it.
+        ab, bc = _automaton(r"\bab\b", 0, r"\bbc\b")
+        assert not analysis.can_overlap(ab, bc)
+        ab, bc = _automaton(r"ab", 0, r"bc")
+        assert analysis.can_overlap(ab, bc)
+
+    def test_case_folding_matches_re(self):
+        for ch, lit in [("ſ", "s"), ("K", "k"), ("İ", "i"), ("ı", "i")]:
+            assert bool(re.match(lit, ch, re.IGNORECASE)) == (
+                folding.fold(ch) == folding.fold(lit)
+            )
+        assert len(folding.fold_text("İstanbul")) == len("İstanbul")
+
+
+# ---------------------------------------------------------------------------
+# 2. Layer planning
+# ---------------------------------------------------------------------------
+
+
+class TestLayers:
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    def test_layers_cover_the_sequence_in_order(self, rulesets, level):
+        ruleset = rulesets[level]
+        flattened = [i for _, indices in ruleset.layers for i in indices]
+        assert flattened == ruleset.sequence
+        assert len(ruleset.layers) < len(ruleset.sequence)
+
+    def test_interacting_rules_stay_apart(self, rulesets):
+        ruleset = rulesets["moderate"]
+        for _, indices in ruleset.layers:
+            patterns = {ruleset.rules[i].pattern for i in indices}
+            assert not {r"\bhell\b", r"\bwho the hell\b"} <= patterns
+
+    def test_merged_sources_dispatch_by_group(self, rulesets):
+        ruleset = rulesets["strict"]
+        for source, indices in ruleset.layers:
+            if source is not None:
+                assert re.compile(source).groupindex.keys() == {
+                    f"r{k}" for k in range(len(indices))
+                }
+
+    def test_opaque_rules_run_alone(self, rulesets):
+        ruleset = rulesets["light"]
+        caps = [
+            source
+            for source, indices in ruleset.layers
+            if ruleset.rules[indices[0]].id == "common/caps_normalization"
+        ]
+        assert caps == [None]
+
+    def test_layer_repr_names_rules(self, rulesets):
+        ruleset = rulesets["light"]
+        source, indices = ruleset.layers[-1]
+        layer = engine.Layer(source, [ruleset.rules[i] for i in indices])
+        assert ruleset.rules[indices[0]].id in repr(layer)
+
+
+# ---------------------------------------------------------------------------
+# 3. Same output as the rule-by-rule pipeline
+# ---------------------------------------------------------------------------
+
+
+class TestEquivalence:
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    @pytest.mark.parametrize("text", TRICKY)
+    def test_tricky_prompts(self, rulesets, level, text):
+        ruleset = rulesets[level]
+        assert ruleset.apply(text) == ruleset.apply_sequential(text)
+
+    def test_fucking_still_beats_fuck(self, rulesets):
+        assert rulesets["light"].apply("fucking fuck") == "fudging fudge"
+
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    def test_random_prompts(self, rulesets, level):
+        ruleset = rulesets[level]
+        words = []
+        for rule in ruleset.rules:
+            words += re.findall(r"[^\W\d_]+", rule.pattern.replace(r"\b", " "))
+            words += (rule.replacement or "").split()
+        words += ["!!!", "???", "....", "FUCK", "fuuuck", "\n"]
+        rng = random.Random(1)
+        for _ in range(1500):
+            parts = [rng.choice(words) for _ in range(rng.randint(1, 8))]
+            text = rng.choice([" ", "", ", ", "-", "_"]).join(parts)
+            if rng.random() < 0.3:
+                text = text.upper()
+            assert ruleset.apply(text) == ruleset.apply_sequential(text), text
+
+    def test_fewer_scans_are_faster(self, rulesets):
+        ruleset = rulesets["strict"]
+        text = (PLUGIN_ROOT / "README.md").read_text()
+        ruleset.apply(text)
+        ruleset.apply_sequential(text)
+
+        def best(fn):
+            times = []
+            for _ in range(5):
+                start = time.perf_counter()
+                fn(text)
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        assert best(ruleset.apply) < best(ruleset.apply_sequential)
+
+
+# ---------------------------------------------------------------------------
+# 4. Literal anchors
+# ---------------------------------------------------------------------------
+
+
+class TestAnchors:
+    @pytest.mark.parametrize(
+        "pattern, anchors",
+        [
+            (r"\bshut up\b", ("shut up",)),
+            (r"\bgarbage\b", ("garbage",)),
+            (r"\bf+u+c+k+\b", ("fu",)),
+            (r"\bdamn+i+t+\b", ("damn",)),
+            (r"\bwhat the f\w+", ("what the f",)),
+            (r"\bScheiße\b", ("scheiße",)),
+            (r"[!?]{2}", ("!!", "!?", "?!", "??")),
+            (r"\b\w+\b", None),
+            (r"(\w)\1{2,}", None),
+        ],
+    )
+    def test_required_literals(self, pattern, anchors):
+        rule = rules.Rule("t", "xx", None, "t", pattern, "x", re.IGNORECASE, 0)
+        assert analysis.rule_anchors(rule) == anchors
+
+    def test_clean_prompt_runs_only_anchorless_layers(self, rulesets, monkeypatch):
+        ruleset = rulesets["strict"]
+        ruleset.apply("warm up")
+        ran = []
+        original = engine.Layer.apply
+
+        def spy(layer, text, hits=None):
+            ran.append(layer)
+            return original(layer, text, hits)
+
+        monkeypatch.setattr(engine.Layer, "apply", spy)
+        prompt = "Please refactor the parser and add tests for nested brackets."
+        assert ruleset.apply(prompt) == prompt
+        assert ran and all(layer.anchors is None for layer in ran)
+        ids = {rule.id for layer in ran for rule in layer.rules}
+        assert ids == {"common/caps_normalization", "common/repeated_characters"}
+
+    def test_rewrites_can_wake_later_layers(self, rulesets):
+        # Caps normalization turns "CRAP" into "crap" before the profanity
+        # layer is gated; folding makes that invisible to the anchor check.
+        assert rulesets["light"].apply("CRAP crap") == "crud crud"
+
+    @pytest.mark.parametrize("text", ["ſhit", "İdiot you idiot", "ASS ass"])
+    def test_folded_anchors_match_like_re(self, rulesets, text):
+        ruleset = rulesets["moderate"]
+        assert ruleset.apply(text) == ruleset.apply_sequential(text)
+
+
+# ---------------------------------------------------------------------------
+# 5. Literal rules
+# ---------------------------------------------------------------------------
+
+
+class TestLiterals:
+    @pytest.mark.parametrize(
+        "pattern, flags, expected",
+        [
+            (r"\bterrible\b", re.IGNORECASE, "terrible"),
+            (r"\bshut up\b", re.IGNORECASE, "shut up"),
+            (r"\bScheiße\b", re.IGNORECASE, "scheiße"),
+            (r"\bdon't\b", re.IGNORECASE, "don't"),
+            (r"\bf+u+c+k+\b", re.IGNORECASE, None),
+            (r"\bwhat the f\w+", re.IGNORECASE, None),
+            (r"\bhell\b", 0, None),
+            (r"\bhell\.\b", re.IGNORECASE, None),
+            (r"\b-\b", re.IGNORECASE, None),
+        ],
+    )
+    def test_classification(self, pattern, flags, expected):
+        rule = rules.Rule("t", "xx", None, "t", pattern, "x", flags, 0)
+        assert engine.literal(rule) == expected
+
+    def test_most_dictionary_rules_are_literal(self, rulesets):
+        ruleset = rulesets["strict"]
+        literal = [r for r in ruleset.rules if engine.literal(r) is not None]
+        assert len(literal) > len(ruleset.rules) / 2
+
+    def test_rest_leaves_out_literal_rules(self, rulesets):
+        for layer in rulesets["strict"].compiled_layers:
+            if layer.source is None:
+                assert layer.rest is None
+                continue
+            regex = layer.rest
+            if regex is None:
+                assert all(engine.literal(rule) for rule in layer.rules)
+                continue
+            kept = {int(name[1:]) for name in regex.groupindex}
+            assert kept == {
+                k for k, rule in enumerate(layer.rules) if engine.literal(rule) is None
+            }
+
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    def test_index_finds_what_the_regexes_find(self, rulesets, level):
+        ruleset = rulesets[level]
+        literal = [r for r in ruleset.rules if engine.literal(r) is not None]
+        index = engine.LiteralIndex(ruleset.rules)
+        words = [engine.literal(r) for r in literal] + [
+            "İdiot",
+            "ſhit",
+            "xͅy",
+            "hell_yeah",
+            "shut\nup",
+            "SHUT UP",
+            "wtf",
+        ]
+        rng = random.Random(level)
+        for text in TRICKY + [
+            "".join(rng.choice(words) + rng.choice(" -_.,'\n") for _ in range(12))
+            for _ in range(300)
+        ]:
+            expected = {
+                (m.start(), m.end(), rule.id)
+                for rule in literal
+                for m in rule.regex.finditer(text)
+            }
+            found = {(s, e, rule.id) for s, e, rule in index.find(text)}
+            assert found == expected, text
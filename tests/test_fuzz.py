@@ -0,0 +1,76 @@
+"""Tests for the differential fuzzer, and the fixed-seed corpus it runs."""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import fuzz  # noqa: E402
+
+LANGS = ("en", "es", "fr", "de")
+
+
+def _corrupting(plugin_root, languages, intensity, preserve_code):
+    layers = fuzz.ENGINES["layers"](plugin_root, languages, intensity, preserve_code)
+    return lambda text: layers(text).replace("heck", "hek")
+
+
+# ---------------------------------------------------------------------------
+# 1. Fixed-seed corpus: every engine, byte for byte
+# ---------------------------------------------------------------------------
+
+
+class TestCorpus:
+    @pytest.mark.parametrize("intensity", ["light", "strict"])
+    def test_engines_match_the_reference(self, intensity):
+        assert fuzz.run(PLUGIN_ROOT, LANGS, [intensity], cases=300) == []
+
+    def test_without_code_preservation(self):
+        mismatches = fuzz.run(
+            PLUGIN_ROOT, ("en",), ["moderate"], cases=200, preserve_code=False
+        )
+        assert mismatches == []
+
+
+# ---------------------------------------------------------------------------
+# 2. Harness
+# ---------------------------------------------------------------------------
+
+
+class TestHarness:
+    def test_generator_is_deterministic(self):
+        words = fuzz.vocabulary(PLUGIN_ROOT, LANGS)
+        rng, again_rng = random.Random(3), random.Random(3)
+        first = [fuzz.generate(rng, words) for _ in range(20)]
+        again = [fuzz.generate(again_rng, words) for _ in range(20)]
+        assert first == again
+        assert any("`" in text for text in first)
+
+    def test_vocabulary_reads_the_dictionaries(self):
+        words = fuzz.vocabulary(PLUGIN_ROOT, ("en",))
+        assert "fucking" in words and "fudging" in words
+
+    def test_shrink(self):
+        assert fuzz.shrink("a b c XYZ d e", lambda t: "Y" in t) == "Y"
+        assert fuzz.shrink("HELL yes", lambda t: "ell" in t.lower()) == "ell"
+
+    def test_planted_bug_is_found_and_shrunk(self):
+        mismatches = fuzz.run(
+            PLUGIN_ROOT, ("en",), ["light"], {"corrupting": _corrupting}, cases=300
+        )
+        (mismatch,) = mismatches
+        assert mismatch.engine == "corrupting"
+        assert "heck" in mismatch.expected and "hek" in mismatch.actual
+        assert len(mismatch.text) <= len("hell")
+        assert set(mismatch.to_dict()) >= {"engine", "text", "expected", "actual"}
+
+    def test_placeholder_pipeline_differs_at_code_edges(self):
+        mismatches = fuzz.run(
+            PLUGIN_ROOT, ("en",), ["light"], ["layers"], cases=300, placeholders=True
+        )
+        (mismatch,) = mismatches
+        assert "`" in mismatch.text and len(mismatch.text) <= 8
@@ -0,0 +1,205 @@
+"""Tests for incremental re-filtering of edited prompts."""
+
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import bench, incremental, pipeline  # noqa: E402
+from tone_police.rules import RuleSet  # noqa: E402
+from tone_police.scan import scan  # noqa: E402
+
+EDITS = ["fuck ", "\n", "```\nx\n", "`a`", "damn!!!! ", "ok\n", "", "```"]
+
+
+def _prompt(kind, size=8 * 1024):
+    """A bench corpus broken into lines, as pasted prompts usually are."""
+    text = bench.corpus(kind, size)
+    return "\n".join(text[i : i + 90] for i in range(0, len(text), 90))
+
+
+def _edit(rng, text):
+    for _ in range(rng.randint(0, 3)):
+        i = rng.randrange(len(text) + 1)
+        text = text[:i] + rng.choice(EDITS) + text[i + rng.randint(0, 20) :]
+    return text
+
+
+@pytest.fixture(scope="module")
+def ruleset():
+    return pipeline.load_rules(
+        {"languages": ["en", "es"], "intensity": "strict"}, PLUGIN_ROOT
+    )
+
+
+@pytest.fixture
+def hook(tmp_path):
+    """handle() in block mode for one session of a project."""
+
+    def run(prompt, session="s1", **config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        settings = {
+            "languages": ["en"],
+            "mode": "block",
+            "incremental": True,
+            "incremental_min_chars": 0,
+        }
+        path.write_text(json.dumps({**settings, **config}))
+        environ = {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+            "TONE_POLICE_CACHE_DIR": str(tmp_path / "cache"),
+        }
+        payload = {"prompt": prompt, "session_id": session}
+        return pipeline.handle(json.dumps(payload), environ)
+
+    run.sessions = tmp_path / "cache" / "sessions"
+    return run
+
+
+# ---------------------------------------------------------------------------
+# 1. Pieces
+# ---------------------------------------------------------------------------
+
+
+class TestSplit:
+    @pytest.mark.parametrize("kind", bench.CORPORA)
+    @pytest.mark.parametrize("preserve_code", [True, False])
+    def test_pieces_join_back(self, kind, preserve_code):
+        text = _prompt(kind)
+        pieces = incremental.split(text, preserve_code, 64, 512)
+        assert "".join(pieces) == text
+        assert len(pieces) > 1
+
+    def test_fenced_blocks_are_not_cut(self):
+        text = "intro line\n" * 20 + "```\n" + "code line\n" * 50 + "```\nafter\n"
+        for piece in incremental.split(text, True, 16, 32):
+            assert piece.count("```") in (0, 2)
+
+    def test_insertion_keeps_later_pieces(self):
+        text = _prompt("hostile", 16 * 1024)
+        before = incremental.split(text)
+        middle = len(text) // 2
+        after = incremental.split(text[:middle] + "a brand new line\n" + text[middle:])
+        assert before[-3:] == after[-3:]
+        assert before[:2] == after[:2]
+
+    def test_no_newline_is_one_piece(self):
+        assert incremental.split("x" * 10000) == ["x" * 10000]
+
+
+# ---------------------------------------------------------------------------
+# 2. The record gives what a full pass gives
+# ---------------------------------------------------------------------------
+
+
+class TestRecord:
+    @pytest.mark.parametrize("kind", bench.CORPORA)
+    @pytest.mark.parametrize("preserve_code", [True, False])
+    def test_same_as_full_pass(self, ruleset, kind, preserve_code):
+        rng = random.Random(kind)
+        record = incremental.Record(min_piece=64, max_piece=512)
+        text = _prompt(kind)
+        for _ in range(15):
+            text = _edit(rng, text)
+            full_hits, hits = set(), set()
+            expected = pipeline.apply_rules(
+                text, ruleset, preserve_code, full_hits, True
+            )
+            matches = record.scan(text, ruleset, preserve_code, True)
+            assert record.filter(text, ruleset, preserve_code, True, hits) == expected
+            assert hits == full_hits
+            assert bool(matches) == bool(
+                scan(text, ruleset, preserve_code, True, first=True)
+            )
+            for m in matches:
+                assert text[m.start : m.end] == m.text
+            record.save()
+        assert record.reused > record.fresh
+
+    def test_only_last_prompt_is_kept(self, ruleset):
+        record = incremental.Record(min_piece=8, max_piece=64)
+        record.filter("what the hell\n" * 10, ruleset)
+        record.save()
+        record.filter("fine\n" * 10, ruleset)
+        record.save()
+        assert list(record.pieces) == ["fine\n" * 10]
+
+    def test_rules_spanning_lines_skip_the_record(self, ruleset):
+        spanning = RuleSet(
+            ruleset.languages,
+            ruleset.intensity,
+            ruleset.rules,
+            ruleset.passes,
+            ruleset.layers,
+            line_local=False,
+        )
+        record = incremental.Record(min_piece=8, max_piece=64)
+        text = "what the hell\n" * 10
+        assert record.filter(text, spanning) == pipeline.apply_rules(text, spanning)
+        record.save()
+        assert record.pieces == {}
+
+
+# ---------------------------------------------------------------------------
+# 3. The hook
+# ---------------------------------------------------------------------------
+
+
+class TestHook:
+    def test_same_answers(self, hook):
+        rng = random.Random(0)
+        text = _prompt("hostile")
+        for _ in range(5):
+            text = _edit(rng, text)
+            assert hook(text) == hook(text, session="other", incremental=False)
+
+    def test_record_is_reused(self, hook):
+        text = _prompt("code")
+        hook(text)
+        (path,) = hook.sessions.iterdir()
+        saved = json.loads(path.read_text())["pieces"]
+        hook(text.replace("I hate", "I love", 1))
+        pieces = json.loads(path.read_text())["pieces"]
+        assert len(set(saved) & set(pieces)) >= len(pieces) - 2
+
+    def test_record_is_private(self, hook):
+        hook(_prompt("clean"))
+        (path,) = hook.sessions.iterdir()
+        assert hook.sessions.stat().st_mode & 0o777 == 0o700
+        assert path.stat().st_mode & 0o777 == 0o600
+
+    def test_sessions_are_separate(self, hook):
+        hook(_prompt("clean"), session="a")
+        hook(_prompt("clean"), session="b")
+        assert len(list(hook.sessions.iterdir())) == 2
+
+    def test_other_settings_ignore_record(self, hook):
+        text = _prompt("hostile")
+        hook(text, intensity="light")
+        output = hook(text, intensity="strict")
+        assert output == hook(text, session="x", intensity="strict", incremental=False)
+
+    def test_short_prompts_skip_the_record(self, hook):
+        hook("what the hell", incremental_min_chars=4096)
+        assert not hook.sessions.exists()
+
+    def test_no_session_id(self, hook):
+        assert hook(_prompt("hostile"), session=None)
+        assert not hook.sessions.exists()
+
+    def test_idle_sessions_are_pruned(self, hook):
+        hook(_prompt("clean"), session="old")
+        (old,) = hook.sessions.iterdir()
+        day_ago = old.stat().st_mtime - incremental.SESSION_TTL - 1
+        os.utime(old, (day_ago, day_ago))
+        hook(_prompt("clean"), session="new")
+        assert old not in list(hook.sessions.iterdir())
+        assert len(list(hook.sessions.iterdir())) == 1
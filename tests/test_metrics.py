@@ -0,0 +1,210 @@
+"""Tests for the Prometheus textfile metrics."""
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import metrics, pipeline  # noqa: E402
+
+HOSTILE = "what the fuck is this shit"
+
+
+@pytest.fixture
+def hook(tmp_path):
+    """handle() for a project with the given config and metrics on."""
+    prom = tmp_path / "textfile" / "tone-police.prom"
+
+    def run(prompt, **config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        settings = {"languages": ["en"], "metrics": True, "metrics_path": str(prom)}
+        path.write_text(json.dumps({**settings, **config}))
+        environ = {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+            "XDG_CACHE_HOME": str(tmp_path / "cache"),
+        }
+        return pipeline.handle(json.dumps({"prompt": prompt}), environ)
+
+    run.prom = prom
+    return run
+
+
+def samples(text):
+    """{sample name with labels: value} from the exposition text."""
+    out = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            out[name] = float(value)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# 1. The hook
+# ---------------------------------------------------------------------------
+
+
+class TestHook:
+    def test_decisions_and_categories(self, hook):
+        hook("please fix the parser", mode="rewrite")
+        hook(HOSTILE, mode="rewrite")
+        hook(HOSTILE, mode="block")
+        got = samples(metrics.render(str(hook.prom)))
+        assert got['tone_police_prompts_total{decision="clean"}'] == 1
+        assert got['tone_police_prompts_total{decision="rewrite"}'] == 1
+        assert got['tone_police_prompts_total{decision="block"}'] == 1
+        assert got['tone_police_category_hits_total{category="profanity"}'] == 2
+        assert got["tone_police_hook_duration_seconds_count"] == 3
+        assert got['tone_police_stage_duration_seconds_count{stage="filter"}'] == 3
+
+    def test_cache_lookups(self, hook):
+        for _ in range(3):
+            hook(HOSTILE, mode="block", result_cache=True)
+        got = samples(metrics.render(str(hook.prom)))
+        assert got['tone_police_result_cache_lookups_total{result="miss"}'] == 1
+        assert got['tone_police_result_cache_lookups_total{result="hit"}'] == 2
+        assert got['tone_police_prompts_total{decision="block"}'] == 3
+
+    def test_no_cache_no_cache_metrics(self, hook):
+        hook(HOSTILE)
+        assert "result_cache" not in metrics.render(str(hook.prom))
+
+    def test_renders_when_due(self, hook):
+        hook(HOSTILE, metrics_interval_s=3600)
+        assert hook.prom.exists()  # first prompt: no file yet, so it is due
+        hook(HOSTILE, metrics_interval_s=3600)
+        got = samples(hook.prom.read_text())
+        assert got["tone_police_hook_duration_seconds_count"] == 1
+        hook(HOSTILE, metrics_interval_s=0)
+        got = samples(hook.prom.read_text())
+        assert got["tone_police_hook_duration_seconds_count"] == 3
+
+    def test_off_by_default(self, hook):
+        hook(HOSTILE, metrics=False)
+        assert not hook.prom.parent.exists()
+
+    def test_unwritable_path_is_ignored(self, hook, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        output = hook(HOSTILE, mode="rewrite", metrics_path=str(blocker / "x.prom"))
+        assert "Rewritten" in output
+
+
+# ---------------------------------------------------------------------------
+# 2. Journal and state
+# ---------------------------------------------------------------------------
+
+
+def _record(path, decision="clean", seconds=0.002, categories=()):
+    run = metrics.Run({"metrics_path": str(path), "metrics_interval_s": 3600})
+    run.started -= seconds
+    run.stage("filter")
+    run.finish(decision, categories)
+
+
+class TestJournal:
+    def test_histogram_is_cumulative(self, tmp_path):
+        prom = tmp_path / "m.prom"
+        for seconds in (0.00005, 0.002, 0.002, 0.3, 5.0):
+            _record(prom, seconds=seconds)
+        got = samples(metrics.render(str(prom)))
+        bucket = 'tone_police_hook_duration_seconds_bucket{le="%s"}'
+        assert got[bucket % "0.0001"] == 1
+        assert got[bucket % "0.0025"] == 3
+        assert got[bucket % "0.5"] == 4
+        assert got[bucket % "+Inf"] == 5
+        assert got["tone_police_hook_duration_seconds_count"] == 5
+        total = got["tone_police_hook_duration_seconds_sum"]
+        assert total == pytest.approx(5.30405, rel=1e-3)
+
+    def test_events_are_folded_once(self, tmp_path):
+        prom = tmp_path / "m.prom"
+        _record(prom, "rewrite", categories=["profanity"])
+        metrics.render(str(prom))
+        _record(prom, "rewrite", categories=["profanity", "negativity"])
+        metrics.render(str(prom))
+        got = samples(metrics.render(str(prom)))
+        assert got['tone_police_prompts_total{decision="rewrite"}'] == 2
+        assert got['tone_police_category_hits_total{category="profanity"}'] == 2
+        assert got['tone_police_category_hits_total{category="negativity"}'] == 1
+
+    def test_partial_line_waits(self, tmp_path):
+        prom = tmp_path / "m.prom"
+        _record(prom)
+        with open(f"{prom}.events", "a") as f:
+            f.write("rewrite\t-\t0.001")
+        got = samples(metrics.render(str(prom)))
+        assert got["tone_police_hook_duration_seconds_count"] == 1
+        with open(f"{prom}.events", "a") as f:
+            f.write("\t-\t-\nnonsense\n")
+        got = samples(metrics.render(str(prom)))
+        assert got["tone_police_hook_duration_seconds_count"] == 2
+
+    def test_journal_is_started_afresh(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(metrics, "MAX_EVENTS_BYTES", 100)
+        prom = tmp_path / "m.prom"
+        for _ in range(5):
+            _record(prom)
+        metrics.render(str(prom))
+        assert not os.path.exists(f"{prom}.events")
+        for _ in range(2):
+            _record(prom, "block")
+        got = samples(metrics.render(str(prom)))
+        assert got['tone_police_prompts_total{decision="clean"}'] == 5
+        assert got['tone_police_prompts_total{decision="block"}'] == 2
+
+    def test_counters_never_go_backwards(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(metrics, "MAX_EVENTS_BYTES", 200)
+        prom = tmp_path / "m.prom"
+        name = 'tone_police_prompts_total{decision="clean"}'
+        seen = [[] for _ in range(4)]
+
+        def work(values):
+            for _ in range(40):
+                _record(prom)
+                metrics.render(str(prom))
+                values.append(samples(prom.read_text())[name])
+
+        threads = [threading.Thread(target=work, args=(v,)) for v in seen]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        final = samples(metrics.render(str(prom)))[name]
+        for values in seen:
+            assert values == sorted(values)
+            assert values[-1] <= final
+        assert 150 <= final <= 160
+
+    def test_busy_render_is_skipped(self, tmp_path):
+        from tone_police.locks import FileLock
+
+        prom = tmp_path / "m.prom"
+        name = 'tone_police_prompts_total{decision="clean"}'
+        _record(prom)
+        with FileLock(f"{prom}.lock"):
+            _record(prom)
+            assert metrics.render(str(prom), blocking=False) is None
+        assert samples(prom.read_text())[name] == 1
+        assert samples(metrics.render(str(prom), blocking=False))[name] == 2
+
+    def test_label_escaping(self, tmp_path):
+        prom = tmp_path / "m.prom"
+        _record(prom, "rewrite", categories=['say "hi", \\o/'])
+        text = metrics.render(str(prom))
+        assert 'category="say_\\"hi\\"__\\\\o/"' in text
+
+    def test_cli(self, tmp_path, capsys):
+        prom = tmp_path / "m.prom"
+        _record(prom, "block")
+        assert metrics.main(["--path", str(prom)]) == 0
+        assert 'decision="block"} 1' in capsys.readouterr().out
+        assert prom.exists()
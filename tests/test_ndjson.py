@@ -0,0 +1,123 @@
+"""Tests for the newline-delimited JSON batch mode."""
+
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import ndjson, pipeline  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+PROMPTS = [
+    "What the FUCK is wrong with this code?!!!",
+    "Please refactor the parser.",
+    "",
+    "shut up, idiot `rm -rf shit`",
+    "this CODE is BROKEN",
+    "this is shit",
+]
+
+
+def _config(**overrides):
+    return {"intensity": "moderate", "languages": ["en"], **overrides}
+
+
+def _run(lines, config):
+    sink = io.StringIO()
+    ndjson.run(io.StringIO("".join(lines)), sink, config, PLUGIN_ROOT)
+    return [json.loads(line) for line in sink.getvalue().splitlines()]
+
+
+# ---------------------------------------------------------------------------
+# 1. Records
+# ---------------------------------------------------------------------------
+
+
+class TestRecords:
+    @pytest.mark.parametrize(
+        "overrides",
+        [
+            {"mode": "rewrite"},
+            {"mode": "block"},
+            {"mode": "block", "block_severity": "light"},
+            {"mode": "block", "block_suggestion": False},
+            {"mode": "block", "block_severity": "light", "block_suggestion": False},
+        ],
+    )
+    def test_matches_the_hook(self, overrides, tmp_path):
+        mode = overrides["mode"]
+        config = _config(**overrides)
+        results = _run([json.dumps({"prompt": p}) + "\n" for p in PROMPTS], config)
+        assert len(results) == len(PROMPTS)
+
+        override = tmp_path / ".claude" / "tone-police.config.json"
+        override.parent.mkdir()
+        override.write_text(json.dumps(config))
+        environ = {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(tmp_path),
+        }
+        for prompt, result in zip(PROMPTS, results):
+            output = pipeline.handle(json.dumps({"prompt": prompt}), environ)
+            assert result["output"] == output
+            assert result["decision"] == (mode if output else "allow")
+            if output and (mode == "rewrite" or "Suggested" in output):
+                assert result["prompt"] == pipeline.filter_text(
+                    prompt, config, PLUGIN_ROOT
+                )
+            else:
+                assert result["prompt"] == prompt
+
+    def test_ids_are_echoed(self):
+        lines = ['{"id": "a", "prompt": "shit"}\n', '{"prompt": "fine", "id": 7}\n']
+        assert [r["id"] for r in _run(lines, _config())] == ["a", 7]
+
+    def test_bad_lines_get_errors_in_place(self):
+        lines = ['{"prompt": "shit"}\n', "nope\n", "[1]\n", "\n", '{"prompt": 3}\n']
+        results = _run(lines, _config())
+        assert results[0]["decision"] == "rewrite"
+        assert results[1]["error"].startswith("invalid JSON")
+        assert results[2] == {"error": "expected a JSON object"}
+        assert results[3] == {"error": "prompt must be a string"}
+        assert len(results) == 4
+
+    def test_disabled(self):
+        results = _run(['{"prompt": "shit"}\n'], _config(enabled=False))
+        assert results == [{"decision": "allow", "prompt": "shit", "output": ""}]
+
+
+# ---------------------------------------------------------------------------
+# 2. As a pipeline stage
+# ---------------------------------------------------------------------------
+
+
+class TestProcess:
+    def test_each_record_is_flushed(self, tmp_path):
+        env = {
+            **os.environ,
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(tmp_path),
+        }
+        with subprocess.Popen(
+            [sys.executable, str(SCRIPT), "--ndjson"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            env=env,
+        ) as proc:
+            # Read each answer before sending the next prompt: a result that
+            # sat in a buffer would hang here.
+            for i, prompt in enumerate(PROMPTS):
+                proc.stdin.write(json.dumps({"id": i, "prompt": prompt}) + "\n")
+                proc.stdin.flush()
+                assert json.loads(proc.stdout.readline())["id"] == i
+            proc.stdin.close()
+            assert proc.wait(timeout=30) == 0
@@ -0,0 +1,145 @@
+"""Tests for the obfuscation-normalizing shadow pass."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import artifact, normalize, pipeline  # noqa: E402
+
+CONFIG = {"languages": ["en"], "intensity": "strict", "mode": "rewrite"}
+
+
+@pytest.fixture(scope="module")
+def ruleset():
+    return artifact.load_ruleset(PLUGIN_ROOT, ("en",), "strict").compile()
+
+
+def filtered(text, config=CONFIG):
+    return pipeline.filter_text(text, config, PLUGIN_ROOT)
+
+
+# ---------------------------------------------------------------------------
+# 1. Shadow text
+# ---------------------------------------------------------------------------
+
+
+class TestShadow:
+    def test_plain_text_has_no_shadow(self, ruleset):
+        index = ruleset.obfuscation_index
+        assert normalize.shadow_text("fix the parser", index) == (None, None)
+
+    def test_same_length_without_deletions(self, ruleset):
+        shadow, offsets = normalize.shadow_text("ｆｕｃｋ", ruleset.obfuscation_index)
+        assert shadow == "fuck"
+        assert offsets is None
+
+    def test_deletions_keep_an_offset_map(self, ruleset):
+        text = "a f​uck"
+        shadow, offsets = normalize.shadow_text(text, ruleset.obfuscation_index)
+        assert shadow == "a fuck"
+        assert [text[i] for i in offsets[:-1]] == list("a fuck")
+        assert offsets[-1] == len(text)
+
+    def test_masks_resolve_only_to_dictionary_words(self, ruleset):
+        index = ruleset.obfuscation_index
+        assert index["f*ck"] == "fuck"
+        assert index["f**k"] == "fuck"
+        assert "****" not in index
+        assert "*uck" not in index and "fuc*" not in index
+        assert normalize.shadow_text("**bold**", index) == (None, None)
+
+    def test_words_with_case_variant_letters_are_indexed(self, ruleset):
+        # ſ/s and ı/i are one letter to the scan, so "shit" and "bitch" count.
+        index = ruleset.obfuscation_index
+        assert index["sh*t"] == "shit"
+        assert index["f*cking"] == "fucking"
+        assert index["b*tch"] == "bitch"
+        assert index["a**hole"] == "asshole"
+
+
+# ---------------------------------------------------------------------------
+# 2. Rewrites
+# ---------------------------------------------------------------------------
+
+
+class TestRewrites:
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "what the f*ck",
+            "what the f**k",
+            "what the F#CK",
+            "this is sh!t",
+            "you a$$hole",
+            "ｆｕｃｋ this",
+            "fцck this",
+            "f​uck this",
+            "\U0001d41f\U0001d42e\U0001d41c\U0001d424 this",
+            "b1tch please",
+        ],
+    )
+    def test_obfuscated_words_are_caught(self, text):
+        assert filtered(text) != text
+
+    @pytest.mark.parametrize(
+        "masked, plain",
+        [
+            ("this sh*t again", "this shit again"),
+            ("f*cking parser", "fucking parser"),
+            ("you b!tch", "you bitch"),
+            ("you b*tch", "you bitch"),
+            ("what an a**hole", "what an asshole"),
+        ],
+    )
+    def test_masked_words_filter_like_the_word(self, masked, plain):
+        assert filtered(masked) == filtered(plain) != plain
+
+    def test_only_the_word_changes(self):
+        assert filtered("what the f*ck, parser?") == filtered("what the fuck, parser?")
+        assert filtered("ｆｕｃｋ this") == filtered("fuck this")
+
+    def test_invisible_overlays_are_replaced_with_the_word(self):
+        text = "".join(ch + "̶" for ch in "shit")
+        assert filtered(text) == filtered("shit")
+
+    @pytest.mark.parametrize(
+        "text",
+        ["**bold** text", "costs $100", "utf8 and x86", "see issue #42 at 3pm"],
+    )
+    def test_innocent_tokens_are_untouched(self, text):
+        assert filtered(text) == text
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "a55",
+            "%hit",
+            "cd ./h3ll",
+            "see C:\\h3ll\\x",
+            "open sh1t.py",
+            "call my_sh1t()",
+            "h3ll0 world",
+        ],
+    )
+    def test_symbols_at_edges_and_names_are_untouched(self, text):
+        assert filtered(text) == text
+
+    def test_trailing_bangs_are_not_letters(self):
+        assert filtered("hell!") == filtered("hell") + "!"
+
+    def test_code_blocks_are_untouched(self):
+        text = "look:\n```\nf*ck = 1\n```\n"
+        assert filtered(text) == text
+
+    def test_can_be_turned_off(self):
+        config = dict(CONFIG, normalize_obfuscation=False)
+        assert filtered("what the f*ck", config) == "what the f*ck"
+
+    def test_hits_are_reported(self, ruleset):
+        hits = set()
+        pipeline.apply_rules("sh!t", ruleset, hits=hits, normalize=True)
+        assert {rule.category for rule in hits}
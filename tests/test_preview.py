@@ -0,0 +1,134 @@
+"""Tests for the single-pass preview of every intensity level."""
+
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import bench, pipeline, preview  # noqa: E402
+from tone_police.artifact import load_ruleset  # noqa: E402
+from tone_police.rules import LEVELS  # noqa: E402
+
+SAMPLES = [
+    "What the fuck is wrong with this STUPID code?!",
+    "shut up, you idiot, this is garbage!!!",
+    "lgtm",
+    "",
+    "this is crap\n```\nfuck = 1\n```\nand `shit` too",
+    "f.u.c.k this sh1t",
+]
+
+
+def _expected(text, languages, preserve_code, normalize):
+    out = {}
+    for level in LEVELS:
+        ruleset = load_ruleset(PLUGIN_ROOT, languages, level)
+        hits = set()
+        filtered = pipeline.apply_rules(text, ruleset, preserve_code, hits, normalize)
+        out[level] = (filtered, sorted(rule.id for rule in hits))
+    return out
+
+
+def _ids(result):
+    return {
+        level: (text, sorted(rule.id for rule in hits))
+        for level, (text, hits) in result.items()
+    }
+
+
+# ---------------------------------------------------------------------------
+# 1. Same results as one run per level
+# ---------------------------------------------------------------------------
+
+
+class TestEvaluate:
+    @pytest.mark.parametrize("languages", [["en"], ["es"], ["en", "es", "fr", "de"]])
+    @pytest.mark.parametrize("preserve_code", [True, False])
+    @pytest.mark.parametrize("normalize", [True, False])
+    def test_samples(self, languages, preserve_code, normalize):
+        for text in SAMPLES:
+            result = preview.evaluate(
+                text, PLUGIN_ROOT, languages, preserve_code, normalize
+            )
+            assert _ids(result) == _expected(
+                text, languages, preserve_code, normalize
+            )
+
+    @pytest.mark.parametrize("kind", bench.CORPORA)
+    def test_corpora(self, kind):
+        text = bench.corpus(kind, 4096)
+        languages = ["en", "es", "fr", "de"]
+        result = preview.evaluate(text, PLUGIN_ROOT, languages)
+        assert _ids(result) == _expected(text, languages, True, True)
+
+    def test_unaligned_level_runs_on_its_own(self, monkeypatch):
+        monkeypatch.setattr(preview, "_plans", {})
+        monkeypatch.setattr(preview, "_align", lambda strict, ruleset: None)
+        text = SAMPLES[1]
+        result = preview.evaluate(text, PLUGIN_ROOT, ["en"])
+        assert _ids(result) == _expected(text, ["en"], True, True)
+
+
+# ---------------------------------------------------------------------------
+# 2. The plan
+# ---------------------------------------------------------------------------
+
+
+class TestPlan:
+    def test_levels_align(self):
+        strict, rulesets, masks = preview._rulesets(PLUGIN_ROOT, ["en"])
+        assert set(masks) == set(LEVELS)
+        assert masks["strict"] == [None] * len(strict.layers)
+        assert any(layer is not None for layer in masks["light"])
+
+    def test_masks_pick_each_level_sequence(self):
+        strict, rulesets, masks = preview._rulesets(PLUGIN_ROOT, ["en", "es"])
+        for level, layers in masks.items():
+            picked = []
+            for (_, indices), mask in zip(strict.layers, layers):
+                for keep, i in zip(mask or [True] * len(indices), indices):
+                    if keep:
+                        picked.append(strict.rules[i].key)
+            ruleset = rulesets[level]
+            assert picked == [ruleset.rules[i].key for i in ruleset.sequence]
+
+    def test_memoized(self):
+        first = preview._rulesets(PLUGIN_ROOT, ["en"])
+        assert preview._rulesets(PLUGIN_ROOT, ["en"]) is first
+
+
+# ---------------------------------------------------------------------------
+# 3. The CLI
+# ---------------------------------------------------------------------------
+
+
+class TestMain:
+    def _run(self, monkeypatch, capsys, argv, stdin=""):
+        monkeypatch.setenv("CLAUDE_PLUGIN_ROOT", str(PLUGIN_ROOT))
+        monkeypatch.setattr(sys, "stdin", io.StringIO(stdin))
+        assert preview.main(argv) == 0
+        return capsys.readouterr().out
+
+    def test_table(self, monkeypatch, capsys):
+        out = self._run(
+            monkeypatch, capsys, ["--languages", "en", "what", "the", "fuck"]
+        )
+        assert "light:     what the fudge" in out
+        assert "en/light/profanity" in out
+
+    def test_json_from_stdin(self, monkeypatch, capsys):
+        out = self._run(
+            monkeypatch, capsys, ["--json", "--languages", "en"], "shut up!!!"
+        )
+        summary = json.loads(out)
+        assert summary["original"] == "shut up!!!"
+        assert list(summary["levels"]) == list(LEVELS)
+        assert summary["levels"]["light"]["rules"]
+        assert summary["levels"]["strict"]["changed"]
+        assert "hostile_phrases" in summary["levels"]["strict"]["categories"]
+        assert "hostile_phrases" not in summary["levels"]["light"]["categories"]
@@ -0,0 +1,125 @@
+"""Tests for the ReDoS audit of dictionary rules."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import redos, rules  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+# The gate every shipped rule must pass; tighten it from the environment.
+SIZE_KB = int(os.environ.get("TONE_POLICE_REDOS_KB", redos.DEFAULT_SIZE_KB))
+BUDGET_MS = float(
+    os.environ.get("TONE_POLICE_REDOS_BUDGET_MS", redos.DEFAULT_BUDGET_MS)
+)
+
+
+@pytest.fixture(scope="module")
+def findings():
+    return redos.audit(PLUGIN_ROOT, SIZE_KB, BUDGET_MS)
+
+
+def _rule(pattern, flags=0):
+    return rules.Rule("test/0", "en", "light", "test", pattern, "", flags, 0)
+
+
+# ---------------------------------------------------------------------------
+# 1. Static scan
+# ---------------------------------------------------------------------------
+
+
+class TestStatic:
+    @pytest.mark.parametrize(
+        "pattern, finding",
+        [
+            (r"(a+)+$", redos.NESTED),
+            (r"(?:\w+\s?)*$", redos.NESTED),
+            (r"(foo|f\w)*x", redos.ALTERNATION),
+            (r"(\w|\s|a.)+x", redos.ALTERNATION),
+            (r"\w+\w+x", redos.ADJACENT),
+        ],
+    )
+    def test_flags_backtracking_shapes(self, pattern, finding):
+        assert finding in redos.static_findings(pattern)
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [r"\bf+u+c+k+\b", r"(ab|ac)*x", r"\d+\s+", r"(\w)\1{2,}", r"[!?]{3,}"],
+    )
+    def test_leaves_linear_shapes_alone(self, pattern):
+        assert redos.static_findings(pattern) == []
+
+    def test_exponential_rules_are_not_run(self, monkeypatch):
+        monkeypatch.setattr(redos, "_time_ms", pytest.fail)
+        finding = redos.audit_rule(_rule(r"(a+)+$"))
+        assert finding.worst_ms is None
+        assert finding.over_budget(redos.DEFAULT_BUDGET_MS)
+
+
+# ---------------------------------------------------------------------------
+# 2. Adversarial benchmark
+# ---------------------------------------------------------------------------
+
+
+class TestBenchmark:
+    def test_attacks_pump_each_quantifier(self):
+        attacks = redos.attacks(r"\bf+u+c+k+\b", 0, 64)
+        assert all(len(text) == 64 for text in attacks)
+        assert "f" * 63 + "!" in attacks
+        assert "f" + "u" * 62 + "!" in attacks
+
+    def test_attacks_follow_backreferences_and_case(self):
+        attacks = redos.attacks(r"(\w)\1{2,}", 0, 32)
+        assert any(len(set(text)) == 1 for text in attacks)
+        attacks = redos.attacks(r"\bdamn+\b", 2, 32)  # re.IGNORECASE
+        assert any(text.startswith("DAMN") for text in attacks)
+
+    def test_quadratic_rule_is_caught(self):
+        finding = redos.audit_rule(_rule(r"\w+x"), size_kb=4, budget_ms=1000)
+        assert finding.static == []
+        assert finding.superlinear
+
+    def test_slow_rule_fails_the_budget(self):
+        finding = redos.audit_rule(_rule(r"\w+x"), size_kb=16, budget_ms=1)
+        assert finding.over_budget(1)
+
+
+# ---------------------------------------------------------------------------
+# 3. Shipped dictionaries
+# ---------------------------------------------------------------------------
+
+
+class TestShippedRules:
+    def test_every_dictionary_is_covered(self, findings):
+        languages = {f.rule.language for f in findings}
+        assert {"common", "en", "es", "fr", "de"} <= languages
+
+    def test_no_backtracking_shapes(self, findings):
+        assert [(f.rule.id, f.static) for f in findings if f.static] == []
+
+    def test_within_budget(self, findings):
+        slow = [
+            (f.rule.id, f.rule.pattern, f.worst_ms)
+            for f in findings
+            if f.over_budget(BUDGET_MS)
+        ]
+        assert slow == []
+
+    def test_command_line(self):
+        env = {**os.environ, "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT)}
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT), "--redos", "--size-kb", "2"],
+            capture_output=True,
+            text=True,
+            env=env,
+            timeout=120,
+        )
+        assert result.returncode == 0, result.stdout
+        assert "0 over" in result.stderr
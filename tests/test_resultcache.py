@@ -0,0 +1,206 @@
+"""Tests for the persistent prompt-result cache."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import pipeline, resultcache  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+HOSTILE = "What the FUCK, this shit sucks!!!"
+
+
+@pytest.fixture
+def project(tmp_path):
+    def write(**config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {"mode": "rewrite", "languages": ["en"], "result_cache": True, **config}
+            )
+        )
+        return {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+            "TONE_POLICE_CACHE_DIR": str(tmp_path / "cache"),
+        }
+
+    return write
+
+
+def _stats(environ):
+    config, _ = pipeline.load_config(environ)
+    return resultcache.for_config(config, environ).stats()
+
+
+# ---------------------------------------------------------------------------
+# 1. Hook integration
+# ---------------------------------------------------------------------------
+
+
+class TestHook:
+    def test_repeat_is_answered_from_the_cache(self, project, monkeypatch):
+        environ = project()
+        first = pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        assert first
+        monkeypatch.setattr(pipeline, "filter_text", pytest.fail)
+        assert pipeline.handle(json.dumps({"prompt": HOSTILE}), environ) == first
+        stats = _stats(environ)
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_clean_prompts_are_cached_too(self, project, monkeypatch):
+        environ = project()
+        assert pipeline.handle(json.dumps({"prompt": "lgtm"}), environ) == ""
+        monkeypatch.setattr(pipeline, "filter_text", pytest.fail)
+        assert pipeline.handle(json.dumps({"prompt": "lgtm"}), environ) == ""
+
+    def test_config_change_misses(self, project):
+        environ = project()
+        rewrite = pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        environ = project(mode="block")
+        block = pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        assert rewrite != block
+        assert _stats(environ)["misses"] == 2
+
+    def test_dictionary_change_misses(self, project, tmp_path):
+        root = tmp_path / "plugin"
+        root.mkdir()
+        for name in ("config", "dictionaries"):
+            (root / name).symlink_to(PLUGIN_ROOT / name)
+        environ = {**project(), "CLAUDE_PLUGIN_ROOT": str(root)}
+        config, plugin_root = pipeline.load_config(environ)
+        cache = resultcache.for_config(config, environ)
+        before = cache.key(HOSTILE, config, plugin_root)
+        (root / "dictionaries").unlink()
+        (root / "dictionaries").mkdir()
+        for source in (PLUGIN_ROOT / "dictionaries").glob("*.json"):
+            (root / "dictionaries" / source.name).write_bytes(source.read_bytes())
+        assert cache.key(HOSTILE, config, plugin_root) != before
+
+    def test_disabled_and_logging_bypass_the_cache(self, project, tmp_path):
+        for environ in (
+            project(result_cache=False),
+            project(log_transforms=True, log_path=str(tmp_path / "log.jsonl")),
+        ):
+            pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+            assert not (tmp_path / "cache" / "result-cache").exists()
+
+
+# ---------------------------------------------------------------------------
+# 2. Storage, eviction and counters
+# ---------------------------------------------------------------------------
+
+
+class TestStorage:
+    def test_round_trip(self, tmp_path):
+        cache = resultcache.ResultCache(str(tmp_path))
+        assert cache.get("ab" * 20) is None
+        cache.put("ab" * 20, "block", '{"decision": "block"}\n')
+        assert cache.get("ab" * 20) == ("block", '{"decision": "block"}\n')
+        assert cache.stats()["hits"] == 1
+
+    def test_eviction_drops_least_recently_used(self, tmp_path):
+        cache = resultcache.ResultCache(str(tmp_path), max_bytes=1000)
+        keys = [f"{n:02x}" * 20 for n in range(10)]
+        for n, key in enumerate(keys):
+            cache.put(key, "allow", "x" * 194)
+            path = cache._path(key)
+            os.utime(path, ns=(n * 10**9, n * 10**9))
+        os.utime(cache._path(keys[0]))  # a recent hit
+        assert cache.evict() == 6
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[9]) is not None
+        assert cache.stats()["bytes"] <= 1000 * resultcache.EVICT_TO
+
+    def test_eviction_runs_every_few_misses(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(resultcache, "EVICT_EVERY", 4)
+        cache = resultcache.ResultCache(str(tmp_path), max_bytes=100)
+        for n in range(8):
+            key = f"{n:02x}" * 20
+            assert cache.get(key) is None
+            cache.put(key, "allow", "x" * 40)
+        assert cache.stats()["bytes"] <= 100
+
+    def test_concurrent_counters_and_writers(self, tmp_path):
+        cache = resultcache.ResultCache(str(tmp_path))
+
+        def work(n):
+            for i in range(50):
+                key = f"{i % 5:02x}" * 20
+                if cache.get(key) is None:
+                    cache.put(key, "allow", str(i % 5) * 100)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        assert stats["hits"] + stats["misses"] == 200
+        assert stats["entries"] == 5
+        for i in range(5):
+            assert cache.get(f"{i:02x}" * 20) == ("allow", str(i) * 100)
+
+    def test_entries_are_private(self, tmp_path):
+        directory = tmp_path / "cache"
+        directory.mkdir(mode=0o755)
+        cache = resultcache.ResultCache(str(directory))
+        cache.put("ab" * 20, "allow", "")
+        cache.get("ab" * 20)
+        assert directory.stat().st_mode & 0o777 == 0o700
+        assert Path(cache._path("ab" * 20)).stat().st_mode & 0o777 == 0o600
+        assert (directory / "hits").stat().st_mode & 0o777 == 0o600
+
+    def test_counters_stay_small(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(resultcache, "COMPACT_BYTES", 8)
+        cache = resultcache.ResultCache(str(tmp_path))
+        for i in range(50):
+            cache.get("ab" * 20)
+        cache.put("ab" * 20, "allow", "")
+        for i in range(30):
+            cache.get("ab" * 20)
+        assert (tmp_path / "misses").stat().st_size < 8
+        assert (tmp_path / "hits").stat().st_size < 8
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (30, 50)
+        cache.clear()
+        assert cache.counts() == {"hits": 0, "misses": 0}
+
+    def test_concurrent_counters_with_folding(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(resultcache, "COMPACT_BYTES", 16)
+        cache = resultcache.ResultCache(str(tmp_path))
+
+        def work():
+            for i in range(200):
+                cache.get("ab" * 20)
+
+        threads = [threading.Thread(target=work) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # An increment racing a fold may be lost, but never counted twice.
+        assert 790 <= cache.counts()["misses"] <= 800
+
+    def test_command_line(self, project):
+        environ = project()
+        pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        env = {**os.environ, **environ}
+        run = [sys.executable, str(SCRIPT), "--result-cache"]
+        stats = json.loads(subprocess.check_output(run, env=env, text=True))
+        assert stats["enabled"] and stats["misses"] == 1 and stats["entries"] == 1
+        stats = json.loads(
+            subprocess.check_output(run + ["--clear"], env=env, text=True)
+        )
+        assert (stats["misses"], stats["entries"]) == (0, 0)
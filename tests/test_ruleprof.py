@@ -0,0 +1,121 @@
+"""Tests for the per-rule profiler."""
+
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import ruleprof, rules  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+
+@pytest.fixture(scope="module")
+def custom_root(tmp_path_factory):
+    """Plugin root whose "xx" dictionary has one rule of every status."""
+    root = tmp_path_factory.mktemp("plugin")
+    shutil.copytree(PLUGIN_ROOT / "dictionaries", root / "dictionaries")
+    patterns = {
+        "light": {
+            "profanity": [
+                {"pattern": r"\bfoo bar\b", "replacement": "baz"},
+                {"pattern": r"\bbar\b", "replacement": "qux"},
+                {"pattern": r"\bfine\b", "replacement": "fine"},
+                {"pattern": r"\bnever\b", "replacement": "seldom"},
+                {"pattern": r"\bfoo bar again\b", "replacement": "baz"},
+            ]
+        }
+    }
+    path = root / "dictionaries" / "xx.json"
+    path.write_text(json.dumps({"language": "xx", "patterns": patterns}))
+    return root
+
+
+def _by_id(stats):
+    return {s.rule.id: s for s in stats}
+
+
+# ---------------------------------------------------------------------------
+# 1. Statuses
+# ---------------------------------------------------------------------------
+
+
+class TestProfile:
+    def test_statuses(self, custom_root):
+        ruleset = rules.build_ruleset(custom_root, ["xx"], "light")
+        stats, chars = ruleprof.profile(["foo bar is fine", "`never` foo bar"], ruleset)
+        found = _by_id(stats)
+        assert chars == len("foo bar is fine") + len(" foo bar")
+        assert found["xx/light/profanity/0"].status == "active"
+        assert found["xx/light/profanity/0"].changed == 2
+        assert found["xx/light/profanity/1"].status == "preempted"
+        assert found["xx/light/profanity/1"].original_hits == 2
+        assert found["xx/light/profanity/2"].status == "noop"
+        assert found["xx/light/profanity/3"].status == "dead"  # only in code
+        shadowed = found["xx/light/profanity/4"]
+        assert shadowed.status == "shadowed"
+        assert shadowed.shadowed_by.id == "xx/light/profanity/1"
+
+    def test_anchors_gate_the_time(self):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, ["en"], "light")
+        stats, _ = ruleprof.profile(["please fix the parser"], ruleset, repeat=1)
+        for s in stats:
+            if s.rule.anchors:
+                assert s.skipped == 1 and s.time_ns == 0 and s.ungated_ns > 0
+
+    def test_report_is_sorted_json(self):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, ["en"], "strict")
+        prompts = ["WHAT the hell, this sucks!!!", "shit shit shit"]
+        stats, chars = ruleprof.profile(prompts, ruleset, repeat=1)
+        result = ruleprof.report(stats, chars, ["en"], "strict", 2, sort="hits")
+        hits = [entry["hits"] for entry in result["rules"]]
+        assert hits == sorted(hits, reverse=True)
+        assert result["rules"][0]["hits"] == 3
+        assert sum(result["statuses"].values()) == len(result["rules"])
+        json.dumps(result)
+        table = ruleprof.format_table(result, top=5)
+        assert "Never changed the text:" in table
+
+
+# ---------------------------------------------------------------------------
+# 2. Command line
+# ---------------------------------------------------------------------------
+
+
+class TestCommandLine:
+    def test_corpus_files_and_json(self, tmp_path):
+        corpus = tmp_path / "prompts.jsonl"
+        corpus.write_text(
+            "\n".join(json.dumps({"prompt": p}) for p in ["oh shit", "lgtm"]) + "\n"
+        )
+        (tmp_path / "rant.txt").write_text("what the hell")
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT), "--profile-rules", "--languages", "en"]
+            + ["--json", "-", "--sort", "id", str(tmp_path)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        report = json.loads(result.stdout)
+        assert report["prompts"] == 3
+        ids = [entry["id"] for entry in report["rules"]]
+        assert ids == sorted(ids)
+        profanity = [e for e in report["rules"] if e["category"] == "profanity"]
+        assert any(entry["changed"] for entry in profanity)
+
+    def test_malformed_line_is_skipped(self, tmp_path, capsys):
+        corpus = tmp_path / "prompts.jsonl"
+        corpus.write_text(
+            json.dumps({"prompt": "oh shit"})
+            + '\n{"prompt": "cut off\n\n'
+            + json.dumps({"prompt": "lgtm"})
+            + "\n"
+        )
+        assert list(ruleprof.read_corpus([str(corpus)])) == ["oh shit", "lgtm"]
+        assert f"{corpus}:2: skipped, invalid JSON" in capsys.readouterr().err
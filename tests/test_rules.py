@@ -0,0 +1,150 @@
+"""Tests for the dictionary compiler: deduplication and shadowed rules."""
+
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT, tone_filter  # noqa: E402
+
+from tone_police import analysis, rules  # noqa: E402
+
+LANGS = ("en", "es", "fr", "de")
+
+
+def _reference(text, root, languages, intensity):
+    common = tone_filter.load_common_patterns(root)
+    text = tone_filter.apply_common_patterns(text, common)
+    for lang in languages:
+        dictionary = tone_filter.load_dictionary(root, lang)
+        if dictionary:
+            patterns = tone_filter.get_intensity_patterns(dictionary, intensity)
+            text = tone_filter.apply_language_patterns(text, patterns)
+    return text
+
+
+@pytest.fixture
+def custom_root(tmp_path):
+    """Plugin root with a hand-written "xx" dictionary next to the real ones."""
+    root = tmp_path / "plugin"
+    shutil.copytree(PLUGIN_ROOT / "dictionaries", root / "dictionaries")
+
+    def write(patterns):
+        path = root / "dictionaries" / "xx.json"
+        path.write_text(json.dumps({"language": "xx", "patterns": patterns}))
+        return root
+
+    return write
+
+
+def _entry(pattern, replacement):
+    return {"pattern": pattern, "replacement": replacement, "flags": "i"}
+
+
+# ---------------------------------------------------------------------------
+# 1. Cumulative levels
+# ---------------------------------------------------------------------------
+
+
+class TestDeduplication:
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    def test_no_rule_runs_twice_in_a_row(self, level):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, ("en",), level)
+        sequence = ruleset.sequence
+        assert all(a != b for a, b in zip(sequence, sequence[1:]))
+
+    def test_strict_runs_far_fewer_rules(self):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, ("en",), "strict")
+        kinds = [kind for kind, _, _ in ruleset.redundant]
+        assert kinds.count(analysis.DUPLICATE) >= 30
+        assert len(ruleset.sequence) + len(ruleset.redundant) == 78
+
+    def test_repeat_kept_when_an_earlier_rule_feeds_it(self, custom_root):
+        root = custom_root(
+            {
+                "light": {"p": [_entry(r"\bfoo\b", "bar"), _entry(r"\bbaz\b", "foo")]},
+                "moderate": {"p": [_entry(r"\bfoo\b", "bar")]},
+            }
+        )
+        ruleset = rules.build_ruleset(root, ("xx",), "moderate")
+        assert ruleset.redundant == []
+        assert ruleset.apply("baz foo") == "bar bar"
+
+    def test_repeat_dropped_when_nothing_feeds_it(self, custom_root):
+        root = custom_root(
+            {
+                "light": {"p": [_entry(r"\bfoo\b", "bar"), _entry(r"\bbaz\b", "qux")]},
+                "moderate": {"p": [_entry(r"\bfoo\b", "bar")]},
+            }
+        )
+        ruleset = rules.build_ruleset(root, ("xx",), "moderate")
+        [(kind, rule, earlier)] = ruleset.redundant
+        assert (kind, rule.id, earlier.id) == (
+            analysis.DUPLICATE,
+            "xx/moderate/p/0",
+            "xx/light/p/0",
+        )
+
+
+# ---------------------------------------------------------------------------
+# 2. Shadowed rules
+# ---------------------------------------------------------------------------
+
+
+class TestShadowing:
+    def test_who_the_hell_is_shadowed_by_hell(self):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, ("en",), "moderate")
+        shadowed = {
+            rule.pattern: earlier.pattern
+            for kind, rule, earlier in ruleset.redundant
+            if kind == analysis.SHADOWED
+        }
+        assert shadowed[r"\bwho the hell\b"] == r"\bhell\b"
+        assert r"\bwho the hell\b" not in {r.pattern for r in ruleset.rules}
+
+    def test_longer_word_is_not_shadowed(self, custom_root):
+        # \bhell\b never matches inside "hellish", so the later rule is live.
+        root = custom_root(
+            {"light": {"p": [_entry(r"\bhell\b", "heck"), _entry(r"\bhellish\b", "x")]}}
+        )
+        ruleset = rules.build_ruleset(root, ("xx",), "light")
+        assert ruleset.redundant == []
+
+    def test_shadow_needs_quiet_rules_in_between(self, custom_root):
+        root = custom_root(
+            {
+                "light": {
+                    "p": [
+                        _entry(r"\bhell\b", "heck"),
+                        _entry(r"\bheck\b", "hell"),
+                        _entry(r"\bgo to hell\b", "go away"),
+                    ]
+                }
+            }
+        )
+        ruleset = rules.build_ruleset(root, ("xx",), "light")
+        assert ruleset.redundant == []
+        assert ruleset.apply("go to hell") == "go away"
+
+
+# ---------------------------------------------------------------------------
+# 3. Output is unchanged
+# ---------------------------------------------------------------------------
+
+
+class TestSameOutput:
+    @pytest.mark.parametrize("level", rules.LEVELS)
+    def test_dropped_rules_change_nothing(self, level):
+        ruleset = rules.build_ruleset(PLUGIN_ROOT, LANGS, level)
+        prompts = [
+            "who the hell wrote this? go to hell, piss off",
+            "Quel con! quel CON, horrible, HORRIBLE",
+            "fucking fuck shit damnit dammmn asshole",
+        ]
+        for _, rule, _ in ruleset.redundant:
+            prompts.append(rule.pattern.replace(r"\b", "").replace("+", ""))
+        for text in prompts:
+            assert ruleset.apply(text) == _reference(text, PLUGIN_ROOT, LANGS, level)
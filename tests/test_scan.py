@@ -0,0 +1,157 @@
+"""Tests for detect-only scanning and the block-mode fast path."""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import artifact, pipeline, scan, service  # noqa: E402
+
+HOSTILE = "What the FUCK, this shit sucks!!!"
+LANGUAGES = ("en", "es", "fr", "de")
+
+
+@pytest.fixture(scope="module")
+def ruleset():
+    return artifact.load_ruleset(PLUGIN_ROOT, LANGUAGES, "strict").compile()
+
+
+@pytest.fixture
+def project(tmp_path):
+    def write(**config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"mode": "block", "languages": ["en"], **config}))
+        return {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+        }
+
+    return write
+
+
+# ---------------------------------------------------------------------------
+# 1. Matches
+# ---------------------------------------------------------------------------
+
+
+class TestScan:
+    def test_spans_point_into_the_prompt(self, ruleset):
+        matches = scan.scan(HOSTILE, ruleset)
+        assert matches == sorted(matches, key=lambda m: (m.start, m.end, m.rule.id))
+        for m in matches:
+            assert HOSTILE[m.start : m.end] == m.text
+        assert {"profanity", "caps_normalization"} <= {m.rule.category for m in matches}
+
+    def test_to_dict(self, ruleset):
+        match = scan.scan("oh shit", ruleset)[0]
+        assert match.to_dict() == {
+            "rule": match.rule.id,
+            "category": "profanity",
+            "level": "light",
+            "start": 3,
+            "end": 7,
+            "text": "shit",
+        }
+
+    def test_clean_prompt(self, ruleset):
+        assert scan.scan("please fix the parser", ruleset) == []
+
+    def test_code_blocks_are_skipped(self, ruleset):
+        text = "fine\n```\nshit = 1\n```\nthen `damn()` and shit"
+        matches = scan.scan(text, ruleset)
+        assert [m.start for m in matches] == [text.rindex("shit")]
+        assert scan.scan(text, ruleset, preserve_code=False)[0].start == 9
+
+    def test_obfuscated_spans(self, ruleset):
+        text = "well f*ck"
+        assert scan.scan(text, ruleset) == []
+        (match,) = scan.scan(text, ruleset, normalize=True)
+        assert (match.start, match.end, match.text) == (5, 9, "f*ck")
+
+    def test_first_stops_early(self, ruleset):
+        assert len(scan.scan(HOSTILE, ruleset, first=True)) == 1
+        assert scan.scan("lgtm", ruleset, first=True) == []
+
+    def test_severity(self, ruleset):
+        text = "this is garbage"
+        assert [m.rule.level for m in scan.scan(text, ruleset)] == ["strict"]
+        assert scan.scan(text, ruleset, severity="moderate") == []
+        assert scan.scan("WHAT!!!", ruleset, severity="strict") == []
+        assert scan.scan("WHAT!!!", ruleset)
+
+    def test_same_matches_as_each_rule_alone(self, ruleset):
+        text = "What the FUCK, shut up!!! this is shit, Scheiße, joder... crap-crap"
+        expected = {
+            (m.start(), m.end(), rule.id)
+            for rule in ruleset.rules
+            for m in rule.regex.finditer(text)
+        }
+        found = {(m.start, m.end, m.rule.id) for m in scan.scan(text, ruleset)}
+        assert found == expected
+
+    def test_verdict_matches_the_rewrite(self, ruleset):
+        words = HOSTILE.split() + "f*ck merde joder lgtm the `x` tests pass".split()
+        rng = random.Random(7)
+        for _ in range(500):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 8)))
+            hostile = pipeline.apply_rules(text, ruleset, normalize=True) != text
+            assert bool(scan.scan(text, ruleset, normalize=True, first=True)) == (
+                hostile
+            ), text
+
+
+# ---------------------------------------------------------------------------
+# 2. Hook in block mode
+# ---------------------------------------------------------------------------
+
+
+class TestBlockMode:
+    def test_same_output_as_a_full_rewrite(self, project):
+        environ = project()
+        output = pipeline.handle(json.dumps({"prompt": HOSTILE}), environ)
+        config, _ = pipeline.load_config(environ)
+        text = pipeline.filter_text(HOSTILE, config, PLUGIN_ROOT)
+        assert output == pipeline.render_response(config, text)
+        assert pipeline.handle(json.dumps({"prompt": "lgtm"}), environ) == ""
+
+    def test_clean_prompt_skips_the_rewrite(self, project, monkeypatch):
+        environ = project()
+        monkeypatch.setattr(pipeline, "filter_text", pytest.fail)
+        assert pipeline.handle(json.dumps({"prompt": "lgtm"}), environ) == ""
+
+    def test_without_suggestion(self, project, monkeypatch):
+        environ = project(block_suggestion=False)
+        monkeypatch.setattr(pipeline, "filter_text", pytest.fail)
+        output = json.loads(pipeline.handle(json.dumps({"prompt": HOSTILE}), environ))
+        assert output["decision"] == "block"
+        assert "Suggested" not in output["reason"]
+
+    def test_block_severity(self, project):
+        environ = project(intensity="strict", block_severity="light")
+        assert pipeline.handle(json.dumps({"prompt": "this is garbage"}), environ) == ""
+        assert pipeline.handle(json.dumps({"prompt": "oh shit"}), environ)
+
+
+# ---------------------------------------------------------------------------
+# 3. Embedding API
+# ---------------------------------------------------------------------------
+
+
+class TestScanResult:
+    def test_suggestion_on_demand(self, monkeypatch):
+        engine = service.ToneFilter({"mode": "block"}, PLUGIN_ROOT)
+        result = engine.scan(HOSTILE)
+        assert result.hostile and "profanity" in result.categories
+        assert result.to_dict()["matches"][0]["text"] == HOSTILE[
+            result.matches[0].start : result.matches[0].end
+        ]
+        assert result.suggestion == engine.filter(HOSTILE).text
+        monkeypatch.setattr(pipeline, "filter_text", pytest.fail)
+        assert not engine.scan("lgtm", first=True).hostile
+        assert engine.scan(HOSTILE, severity="light", first=True).rules
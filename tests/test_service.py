@@ -0,0 +1,144 @@
+"""Tests for the embeddable ToneFilter engine and the per-project registry."""
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+import tone_police  # noqa: E402
+from tone_police import pipeline, service  # noqa: E402
+
+HOSTILE = "What the FUCK, this shit sucks!!!"
+
+
+def _project(root, name, **config):
+    path = root / name / ".claude" / "tone-police.config.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"languages": ["en"], **config}))
+    return root / name
+
+
+# ---------------------------------------------------------------------------
+# 1. ToneFilter
+# ---------------------------------------------------------------------------
+
+
+class TestToneFilter:
+    def test_structured_result(self):
+        engine = tone_police.ToneFilter({"mode": "rewrite"}, PLUGIN_ROOT)
+        result = engine.filter(HOSTILE)
+        assert result.changed and result.decision == "rewrite"
+        assert result.text == pipeline.filter_text(HOSTILE, {}, PLUGIN_ROOT)
+        assert "common/caps_normalization" in result.rules
+        assert "profanity" in result.categories
+        assert result.output == pipeline.render_response({}, result.text)
+        assert set(result.to_dict()) == set(service.FilterResult.__slots__)
+
+    def test_allow_block_and_disabled(self):
+        block = service.ToneFilter({"mode": "block"}, PLUGIN_ROOT)
+        assert block.filter(HOSTILE).decision == "block"
+        assert block.filter("lgtm").decision == "allow"
+        assert block.filter("lgtm").output == ""
+        disabled = service.ToneFilter({"enabled": False}, PLUGIN_ROOT)
+        assert disabled.ruleset is None
+        assert disabled.filter(HOSTILE).text == HOSTILE
+
+    def test_config_is_copied(self):
+        config = {"mode": "rewrite"}
+        engine = service.ToneFilter(config, PLUGIN_ROOT)
+        config["mode"] = "block"
+        assert engine.filter(HOSTILE).decision == "rewrite"
+
+    def test_thread_safe(self):
+        engine = service.ToneFilter(
+            {"intensity": "strict", "languages": ["en", "es", "fr", "de"]},
+            PLUGIN_ROOT,
+        )
+        prompts = [HOSTILE, "joder, qué mierda", "Scheiße!!!", "lgtm", "go to hell"]
+        expected = [engine.filter(p).text for p in prompts]
+        errors = []
+
+        def work():
+            for _ in range(50):
+                got = [engine.filter(p).text for p in prompts]
+                if got != expected:
+                    errors.append(got)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+
+# ---------------------------------------------------------------------------
+# 2. Registry
+# ---------------------------------------------------------------------------
+
+
+class TestRegistry:
+    def test_one_engine_per_project(self, tmp_path):
+        registry = service.Registry(PLUGIN_ROOT)
+        rewrite = _project(tmp_path, "a", mode="rewrite")
+        block = _project(tmp_path, "b", mode="block")
+        assert registry.filter(HOSTILE, rewrite).decision == "rewrite"
+        assert registry.filter(HOSTILE, block).decision == "block"
+        assert registry.get(rewrite) is registry.get(rewrite)
+        assert len(registry) == 2
+
+    def test_config_edit_rebuilds(self, tmp_path):
+        registry = service.Registry(PLUGIN_ROOT)
+        project = _project(tmp_path, "a", mode="rewrite")
+        first = registry.get(project)
+        path = project / ".claude" / "tone-police.config.json"
+        path.write_text(json.dumps({"mode": "block", "languages": ["en"]}))
+        os.utime(path, ns=(0, 0))
+        second = registry.get(project)
+        assert second is not first
+        assert second.filter(HOSTILE).decision == "block"
+
+    def test_edit_during_build_rebuilds(self, tmp_path, monkeypatch):
+        registry = service.Registry(PLUGIN_ROOT)
+        project = _project(tmp_path, "a", mode="rewrite")
+        path = project / ".claude" / "tone-police.config.json"
+        build = service.ToneFilter.__init__
+
+        def edited_while_building(engine, config, plugin_root=None):
+            build(engine, config, plugin_root)
+            if "block" not in path.read_text():
+                path.write_text(json.dumps({"mode": "block", "languages": ["en"]}))
+                os.utime(path, ns=(0, 0))
+
+        monkeypatch.setattr(service.ToneFilter, "__init__", edited_while_building)
+        assert registry.get(project).config["mode"] == "rewrite"
+        assert registry.get(project).config["mode"] == "block"
+
+    def test_missing_override_uses_default_config(self, tmp_path):
+        registry = service.Registry(PLUGIN_ROOT)
+        engine = registry.get(tmp_path)
+        default = pipeline.load_config({"CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT)})[0]
+        assert engine.config == default
+        _project(tmp_path, ".", mode="rewrite", intensity="light")
+        assert registry.get(tmp_path).config["intensity"] == "light"
+
+    def test_lru_eviction(self, tmp_path):
+        registry = service.Registry(PLUGIN_ROOT, max_engines=2)
+        a, b, c = (_project(tmp_path, name) for name in "abc")
+        engine_a = registry.get(a)
+        registry.get(b)
+        registry.get(a)  # a is now the most recent
+        registry.get(c)
+        assert len(registry) == 2
+        assert registry.get(a) is engine_a
+        assert str(b) not in registry._engines
+
+    @pytest.mark.parametrize("name", ["ToneFilter", "Registry", "FilterResult"])
+    def test_package_exports(self, name):
+        assert getattr(tone_police, name) is getattr(service, name)
@@ -0,0 +1,178 @@
+"""Tests for chunked, bounded-memory filtering."""
+
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import analysis, artifact, pipeline, rules, stream  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+
+WORDS = (
+    "fuck|FUCK|fuuuck|shit|what the hell|who the hell|idiot|crap|damn|"
+    "!!!|???|....|x = 1|```|```py|`|`x`"
+).split("|")
+
+
+@pytest.fixture(scope="module")
+def ruleset():
+    return artifact.load_ruleset(PLUGIN_ROOT, ("en", "es", "fr", "de"), "strict")
+
+
+def _random_text(rng):
+    parts = []
+    for _ in range(rng.randint(0, 60)):
+        parts.append(rng.choice(WORDS))
+        parts.append(rng.choice(["", " ", "\n", "\n\n"]))
+    return "".join(parts)
+
+
+def _feed(filter_, text, rng):
+    out, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 12)
+        out.append(filter_.feed(text[i : i + n]))
+        i += n
+    out.append(filter_.close())
+    return "".join(out)
+
+
+# ---------------------------------------------------------------------------
+# 1. Where text may be cut
+# ---------------------------------------------------------------------------
+
+
+class TestCuts:
+    @pytest.mark.parametrize(
+        "pattern, flags",
+        [
+            (r"\bf+u+c+k+\b", re.IGNORECASE),
+            (r"\bwhat the f\w+", re.IGNORECASE),
+            (r"(\w)\1{2,}", 0),
+            (r"[!?]{3,}", 0),
+            (r"(?m)^crap", 0),
+        ],
+    )
+    def test_line_local_patterns(self, pattern, flags):
+        assert analysis.line_local(pattern, flags)
+
+    @pytest.mark.parametrize(
+        "pattern", [r"\s+", r"[^a]", r"\W", r"(?s)a.b", r"^crap", r"crap$", r"x*"]
+    )
+    def test_patterns_that_can_span_lines(self, pattern):
+        assert not analysis.line_local(pattern, 0)
+
+    def test_dictionaries_are_line_local(self, ruleset):
+        assert ruleset.line_local
+
+    @pytest.mark.parametrize(
+        "text, cut",
+        [
+            ("no newline", 0),
+            ("one\ntwo", 4),
+            ("a\n```\ncode\n```\nb", 15),
+            ("a\n```\ncode\n```", 2),
+            ("a\n```\nstill open\n", 2),
+            ("a\n`x` ```\nopen\n", 2),
+            ("```\nopen `x`\n", 0),
+        ],
+    )
+    def test_find_cut(self, text, cut):
+        assert stream.find_cut(text) == cut
+
+    def test_fences_are_ignored_without_code_protection(self):
+        assert stream.find_cut("a\n```\nopen\n", preserve_code=False) == 11
+
+
+# ---------------------------------------------------------------------------
+# 2. Same output as filtering the whole text
+# ---------------------------------------------------------------------------
+
+
+class TestEquivalence:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64])
+    @pytest.mark.parametrize("preserve_code", [True, False])
+    def test_random_texts(self, ruleset, chunk_size, preserve_code):
+        rng = random.Random(chunk_size)
+        for _ in range(400):
+            text = _random_text(rng)
+            expected = pipeline.apply_rules(text, ruleset, preserve_code)
+            filter_ = stream.StreamFilter(ruleset, preserve_code, chunk_size)
+            assert _feed(filter_, text, rng) == expected, text
+
+    def test_fence_spanning_many_chunks(self, ruleset):
+        text = "shit\n```\n" + "fuck = 1\n" * 500 + "```\nFUCK this\n"
+        filter_ = stream.StreamFilter(ruleset, chunk_size=16)
+        out = _feed(filter_, text, random.Random(0))
+        assert out == pipeline.apply_rules(text, ruleset)
+        assert out.count("fuck = 1") == 500
+
+    def test_rules_spanning_lines_fall_back_to_one_piece(self):
+        rule = rules.Rule("t", "xx", None, "t", r"a\s+b", "ab", 0, 0)
+        ruleset = rules.RuleSet(("xx",), "moderate", [rule], [("xx", [0])])
+        assert not ruleset.line_local
+        filter_ = stream.StreamFilter(ruleset, chunk_size=1)
+        assert filter_.feed("a\n") == ""
+        assert filter_.feed("\nb\n") == ""
+        assert filter_.close() == "ab\n"
+
+    def test_filter_text_streams_huge_prompts(self, monkeypatch):
+        config = {"intensity": "strict", "languages": ["en"]}
+        text = "What the FUCK\n```\nshit\n```\n" * 200
+        expected = pipeline.filter_text(text, config, PLUGIN_ROOT)
+        monkeypatch.setattr(pipeline, "STREAM_THRESHOLD", 100)
+        monkeypatch.setattr(stream, "CHUNK_SIZE", 50)
+        assert pipeline.filter_text(text, config, PLUGIN_ROOT) == expected
+
+
+# ---------------------------------------------------------------------------
+# 3. Bounded memory
+# ---------------------------------------------------------------------------
+
+
+class TestMemory:
+    def test_peak_stays_near_chunk_size(self, ruleset):
+        line = "2024-01-01 ERROR what the FUCK happened at Foo.java:42 shit!!!\n"
+        source = io.StringIO(line * 40000)  # ~2.5 MB
+        sink = io.StringIO()
+        sink.write = lambda text: len(text)  # discard output
+        ruleset.apply(line)
+        tracemalloc.start()
+        try:
+            stream.filter_stream(source, sink, ruleset, chunk_size=16 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 1024 * 1024
+
+    def test_command_line(self, tmp_path):
+        text = "What the FUCK\r\n`shit`\r\n" * 3000
+        env = {
+            **os.environ,
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(tmp_path),
+        }
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT), "--filter", "--chunk-size", "1000"],
+            input=text.encode(),
+            capture_output=True,
+            env=env,
+            timeout=60,
+        )
+        assert result.returncode == 0
+        default = PLUGIN_ROOT / "config" / "default-config.json"
+        config = json.loads(default.read_text())
+        expected = pipeline.filter_text(text, config, PLUGIN_ROOT)
+        assert result.stdout.decode() == expected
+        assert "what on earth" in expected
@@ -404,3 +404,34 @@ class TestMainIntegration:
             env={**os.environ, "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT)},
         )
         assert result.stdout.strip() == ""
+
+
+# ---------------------------------------------------------------------------
+# 17. Prose/code segments
+# ---------------------------------------------------------------------------
+
+
+class TestCodeSegments:
+    CONFIG = {"intensity": "moderate", "languages": ["en"]}
+
+    def _filter(self, text):
+        return tone_filter.filter_text(text, self.CONFIG, PLUGIN_ROOT)
+
+    def test_split_alternates_prose_and_code(self):
+        text = "fix `a` and ```\nb\n``` now"
+        segments = tone_filter.split_code_blocks(text)
+        assert segments == ["fix ", "`a`", " and ", "```\nb\n```", " now"]
+        assert "".join(segments) == text
+
+    def test_adjacent_blocks_survive(self):
+        # As placeholders these read "__CODE_BLOCK_0____CODE_BLOCK_1__", and
+        # the repeated-character rule shortened the underscores.
+        assert self._filter("`a``b`") == "`a``b`"
+        assert self._filter("`a````b````c`") == "`a````b````c`"
+
+    def test_placeholder_lookalikes_are_plain_text(self):
+        text = "see __CODE_BLOCK_0__ and `x`"
+        assert self._filter(text) == text
+
+    def test_prose_touching_code_is_filtered(self):
+        assert self._filter("this is shit`x`") == "this is shoot`x`"
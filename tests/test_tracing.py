@@ -0,0 +1,198 @@
+"""Tests for per-prompt tracing."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import pipeline, tracing  # noqa: E402
+
+HOSTILE = "what the FUCK is this shit!!!! `leave this shit alone` ok"
+
+
+@pytest.fixture
+def hook(tmp_path):
+    """handle() for a project with the given config and environment."""
+
+    def run(prompt, environ=None, **config):
+        path = tmp_path / "project" / ".claude" / "tone-police.config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"languages": ["en"], **config}))
+        env = {
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "CLAUDE_PROJECT_DIR": str(path.parent.parent),
+            "XDG_STATE_HOME": str(tmp_path / "state"),
+            **(environ or {}),
+        }
+        return pipeline.handle(json.dumps({"prompt": prompt}), env)
+
+    return run
+
+
+def read_trace(directory):
+    files = sorted(Path(directory).glob("trace-*.json"))
+    assert len(files) == 1
+    return json.loads(files[0].read_text())
+
+
+def spans(trace):
+    return [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"]
+
+
+# ---------------------------------------------------------------------------
+# 1. Triggers and stages
+# ---------------------------------------------------------------------------
+
+
+class TestTriggers:
+    def test_environment(self, hook, tmp_path):
+        hook(HOSTILE, {"TONE_POLICE_TRACE": str(tmp_path / "traces")})
+        trace = read_trace(tmp_path / "traces")
+        names = spans(trace)
+        for stage in ("parse", "config", "load rules", "code blocks", "filter"):
+            assert stage in names
+        assert "pass common" in names and "pass en" in names
+        assert "obfuscation" in names and "render" in names
+        assert names[-1] == "handle"
+        assert trace["otherData"]["decision"] == "rewrite"
+
+    def test_config(self, hook, tmp_path):
+        hook(HOSTILE, mode="block", trace=True)
+        trace = read_trace(tmp_path / "state" / "tone-police" / "traces")
+        names = spans(trace)
+        assert names[0] == "parse+config"
+        assert "scan" in names and "load rules" in names
+        assert trace["otherData"]["decision"] == "block"
+
+    def test_config_trace_dir(self, hook, tmp_path):
+        hook("please fix the parser", trace=True, trace_dir=str(tmp_path / "t"))
+        assert read_trace(tmp_path / "t")["otherData"]["decision"] == "clean"
+
+    def test_off_by_default(self, hook, tmp_path):
+        hook(HOSTILE)
+        assert not (tmp_path / "state").exists()
+        assert tracing.current() is None
+
+    def test_span_args(self, hook, tmp_path):
+        hook(HOSTILE, trace=True)
+        trace = read_trace(tmp_path / "state" / "tone-police" / "traces")
+        events = {e["name"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+        assert events["load rules"]["args"]["languages"] == ["en"]
+        layers = [e for e in trace["traceEvents"] if e["name"].startswith("layer ")]
+        assert any(e["args"]["changed"] for e in layers)
+        assert any(e["args"]["skipped"] for e in layers)
+
+
+# ---------------------------------------------------------------------------
+# 2. Tracing changes nothing
+# ---------------------------------------------------------------------------
+
+
+class TestSameOutput:
+    @pytest.mark.parametrize("mode", ["rewrite", "block"])
+    @pytest.mark.parametrize("intensity", ["light", "strict"])
+    def test_same_as_untraced(self, hook, tmp_path, mode, intensity):
+        prompts = [HOSTILE, "please fix the parser", "f*ck this CRAP!!!"]
+        for prompt in prompts:
+            plain = hook(prompt, mode=mode, intensity=intensity)
+            traced = hook(prompt, mode=mode, intensity=intensity, trace=True)
+            assert traced == plain
+
+    def test_same_as_ruleset_apply(self, tmp_path):
+        ruleset = pipeline.load_rules(
+            {"languages": ["en", "es"], "intensity": "strict"}, PLUGIN_ROOT
+        )
+        tracer = tracing.Tracer(str(tmp_path)).start()
+        try:
+            for text in (HOSTILE, "mierda, this is damn STUPID", "fine"):
+                plain, traced = set(), set()
+                assert tracing.apply(ruleset, text, traced) == ruleset.apply(
+                    text, plain
+                )
+                assert traced == plain
+        finally:
+            tracer.finish()
+
+    def test_hook_sees_every_layer(self):
+        ruleset = pipeline.load_rules(
+            {"languages": ["en"], "intensity": "strict"}, PLUGIN_ROOT
+        )
+        seen = []
+        out = ruleset.apply(HOSTILE, None, lambda *step: seen.append(step))
+        assert out == ruleset.apply(HOSTILE)
+        assert [layer for layer, _, _ in seen] == ruleset.compiled_layers
+        assert any(changed for _, _, changed in seen)
+        assert not any(skipped and changed for _, skipped, changed in seen)
+
+    def test_other_threads_untraced(self, tmp_path):
+        tracer = tracing.Tracer(str(tmp_path)).start()
+        seen = []
+        try:
+            thread = threading.Thread(target=lambda: seen.append(tracing.current()))
+            thread.start()
+            thread.join()
+        finally:
+            tracer.finish()
+        assert seen == [None]
+
+
+# ---------------------------------------------------------------------------
+# 3. Profiling
+# ---------------------------------------------------------------------------
+
+
+def _balanced(trace):
+    depth = 0
+    for event in trace["traceEvents"]:
+        if event["ph"] == "B":
+            depth += 1
+        elif event["ph"] == "E":
+            depth -= 1
+            assert depth >= 0
+    return depth == 0
+
+
+class TestProfile:
+    def test_calls_are_recorded(self, hook, tmp_path):
+        hook(HOSTILE, trace=True, trace_profile=True)
+        trace = read_trace(tmp_path / "state" / "tone-police" / "traces")
+        calls = [e["name"] for e in trace["traceEvents"] if e["ph"] == "B"]
+        assert any(name.startswith("apply_rules (pipeline.py:") for name in calls)
+        assert _balanced(trace)
+        assert sys.getprofile() is None
+
+    def test_truncated(self, hook, tmp_path, monkeypatch):
+        monkeypatch.setattr(tracing, "MAX_PROFILE_EVENTS", 50)
+        hook(HOSTILE, trace=True, trace_profile=True)
+        trace = read_trace(tmp_path / "state" / "tone-police" / "traces")
+        assert trace["otherData"]["truncated"] is True
+        assert _balanced(trace)
+
+    def test_cold_hook_imports(self, tmp_path):
+        script = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+        env = {
+            **os.environ,
+            "CLAUDE_PLUGIN_ROOT": str(PLUGIN_ROOT),
+            "TONE_POLICE_TRACE": str(tmp_path),
+            "TONE_POLICE_TRACE_PROFILE": "1",
+        }
+        result = subprocess.run(
+            [sys.executable, str(script)],
+            input=json.dumps({"prompt": "please fix the parser"}),
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        assert result.returncode == 0
+        trace = read_trace(tmp_path)
+        names = spans(trace)
+        assert "import pipeline" in names and names[-1] == "hook"
+        imports = [e["name"] for e in trace["traceEvents"] if e.get("cat") == "import"]
+        assert "import tone_police.pipeline" in imports
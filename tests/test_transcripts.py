@@ -0,0 +1,219 @@
+"""Tests for the offline transcript auditor."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from conftest import PLUGIN_ROOT  # noqa: E402
+
+from tone_police import transcripts  # noqa: E402
+
+SCRIPT = PLUGIN_ROOT / "hooks" / "scripts" / "tone-filter.py"
+CONFIG = {"languages": ["en"], "intensity": "moderate"}
+
+
+def _user(text, cwd="/src/app"):
+    return {"type": "user", "cwd": cwd, "message": {"role": "user", "content": text}}
+
+
+def _assistant(text):
+    content = [{"type": "text", "text": text}]
+    return {"type": "assistant", "message": {"role": "assistant", "content": content}}
+
+
+def _write(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return path
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    root = tmp_path / "projects"
+    _write(
+        root / "app" / "one.jsonl",
+        [_user("what the hell is this"), _assistant("damn, sorry"), _user("lgtm")] * 20,
+    )
+    _write(
+        root / "lib" / "two.jsonl",
+        [_user("fix the shit", cwd="/src/lib"), _user("thanks", cwd="/src/lib")] * 10,
+    )
+    return root
+
+
+def _audit(root, **kwargs):
+    return transcripts.audit([str(root)], CONFIG, PLUGIN_ROOT, jobs=1, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# 1. Records and units
+# ---------------------------------------------------------------------------
+
+
+class TestRecords:
+    def test_prompt_of(self):
+        assert transcripts.prompt_of(_user("hi")) == "hi"
+        assert transcripts.prompt_of({"prompt": "hi"}) == "hi"
+        assert transcripts.prompt_of(_assistant("hi")) is None
+        assert transcripts.prompt_of(dict(_user("hi"), isMeta=True)) is None
+        blocks = [
+            {"type": "tool_result", "content": "shit happened"},
+            {"type": "text", "text": "and then"},
+        ]
+        record = {"type": "user", "message": {"role": "user", "content": blocks}}
+        assert transcripts.prompt_of(record) == "and then"
+        blocks = blocks[:1]
+        record = {"type": "user", "message": {"role": "user", "content": blocks}}
+        assert transcripts.prompt_of(record) is None
+
+    def test_units_are_newline_aligned(self, sessions):
+        path = str(sessions / "app" / "one.jsonl")
+        data = Path(path).read_bytes()
+        ranges = transcripts.units(path, chunk_bytes=100)
+        assert len(ranges) > 1
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start and data[end - 1 : end] == b"\n"
+
+
+# ---------------------------------------------------------------------------
+# 2. Auditing
+# ---------------------------------------------------------------------------
+
+
+class TestAudit:
+    def test_counts_per_project_and_category(self, sessions):
+        projects = _audit(sessions)
+        assert projects["/src/app"]["prompts"] == 40
+        assert projects["/src/app"]["hostile"] == 20
+        assert projects["/src/lib"]["categories"] == {"profanity": 10}
+        summary = transcripts.summarize(projects)
+        assert summary["prompts"] == 60 and summary["hostile"] == 30
+        assert summary["hostility"] == 0.5
+        assert "/src/lib" in transcripts.format_table(summary)
+
+    def test_unit_size_does_not_matter(self, sessions):
+        assert _audit(sessions, chunk_bytes=64) == _audit(sessions)
+
+    def test_process_pool(self, sessions):
+        pooled = transcripts.audit(
+            [str(sessions)], CONFIG, PLUGIN_ROOT, jobs=2, chunk_bytes=256
+        )
+        assert pooled == _audit(sessions)
+
+    def test_resume(self, sessions, tmp_path, monkeypatch):
+        state = str(tmp_path / "state.jsonl")
+        first = _audit(sessions, state_path=state, chunk_bytes=256)
+        monkeypatch.setattr(transcripts, "audit_unit", pytest.fail)
+        assert _audit(sessions, state_path=state, chunk_bytes=256) == first
+
+    def test_resume_redoes_only_what_changed(self, sessions, tmp_path, monkeypatch):
+        state = str(tmp_path / "state.jsonl")
+        _audit(sessions, state_path=state)
+        two = sessions / "lib" / "two.jsonl"
+        size = two.stat().st_size
+        _write(two, [_user("oh hell", cwd="/src/lib")])
+        audited = []
+        real = transcripts.audit_unit
+        monkeypatch.setattr(
+            transcripts,
+            "audit_unit",
+            lambda *unit: audited.append(unit) or real(*unit),
+        )
+        projects = _audit(sessions, state_path=state)
+        # Only the appended tail is read again.
+        assert audited == [(str(two), size, two.stat().st_size)]
+        assert projects["/src/lib"]["hostile"] == 11
+        assert projects == _audit(sessions)
+
+    def test_line_cut_short_is_read_again(self, sessions, tmp_path):
+        state = str(tmp_path / "state.jsonl")
+        two = sessions / "lib" / "two.jsonl"
+        with open(two, "a") as f:
+            f.write('{"type": "user", "cwd": "/src/lib", "message": {"content": "oh')
+        assert _audit(sessions, state_path=state)["/src/lib"]["hostile"] == 10
+        with open(two, "a") as f:
+            f.write(' hell"}}\n')
+        assert _audit(sessions, state_path=state)["/src/lib"]["hostile"] == 11
+
+    def test_rewritten_transcript_is_audited_again(self, sessions, tmp_path):
+        state = str(tmp_path / "state.jsonl")
+        _audit(sessions, state_path=state, chunk_bytes=256)
+        two = sessions / "lib" / "two.jsonl"
+        two.write_text(two.read_text().replace("fix the shit", "fix the bugs"))
+        projects = _audit(sessions, state_path=state, chunk_bytes=256)
+        assert projects["/src/lib"]["hostile"] == 0
+
+    def test_rewrite_during_the_audit_is_audited_again(
+        self, sessions, tmp_path, monkeypatch
+    ):
+        state = str(tmp_path / "state.jsonl")
+        two = sessions / "lib" / "two.jsonl"
+        real = transcripts.audit_unit
+
+        def rewritten_after_scanning(path, start, end):
+            result = real(path, start, end)
+            if path == str(two):
+                two.write_text(two.read_text().replace("fix the shit", "fix the bugs"))
+            return result
+
+        monkeypatch.setattr(transcripts, "audit_unit", rewritten_after_scanning)
+        assert _audit(sessions, state_path=state)["/src/lib"]["hostile"] == 10
+        monkeypatch.setattr(transcripts, "audit_unit", real)
+        assert _audit(sessions, state_path=state)["/src/lib"]["hostile"] == 0
+
+    def test_state_is_pruned(self, sessions, tmp_path):
+        state = tmp_path / "state.jsonl"
+        _audit(sessions, state_path=str(state), chunk_bytes=256)
+        two = sessions / "lib" / "two.jsonl"
+        one = sessions / "app" / "one.jsonl"
+        units = len(state.read_text().splitlines())
+        two.unlink()
+        _write(one, [_user("and again")])
+        for _ in range(3):
+            _write(one, [_user("and again")])
+            _audit(sessions, state_path=str(state), chunk_bytes=256)
+        lines = [json.loads(line) for line in state.read_text().splitlines()]
+        assert {entry["path"] for entry in lines} == {str(one)}
+        assert len(lines) < units
+        starts = [entry["start"] for entry in lines]
+        assert len(starts) == len(set(starts))
+
+    def test_other_transcripts_are_kept(self, sessions, tmp_path):
+        state = tmp_path / "state.jsonl"
+        _audit(sessions, state_path=str(state))
+        _audit(sessions / "app", state_path=str(state))
+        paths = {json.loads(line)["path"] for line in state.read_text().splitlines()}
+        assert str(sessions / "lib" / "two.jsonl") in paths
+
+    def test_interrupted_state_line_is_ignored(self, sessions, tmp_path):
+        state = tmp_path / "state.jsonl"
+        first = _audit(sessions, state_path=str(state))
+        with open(state, "a") as f:
+            f.write('{"unit": "trunc')
+        assert _audit(sessions, state_path=str(state)) == first
+
+
+# ---------------------------------------------------------------------------
+# 3. Command line
+# ---------------------------------------------------------------------------
+
+
+class TestCommandLine:
+    def test_json_report(self, sessions, tmp_path):
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT), "--audit-transcripts", str(sessions)]
+            + ["--state", str(tmp_path / "state.jsonl"), "--json", "-"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        report = json.loads(result.stdout)
+        assert set(report["projects"]) == {"/src/app", "/src/lib"}
+        assert report["categories"]["profanity"] >= 10